@@ -24,10 +24,43 @@ const NotificationDropdown = ({ isOpen, onClose, onToggle }) => {
   const dropdownRef = useRef(null)
 
   useEffect(() => {
-    fetchNotifications()
-    // Set up polling for new notifications
-    const interval = setInterval(fetchNotifications, 30000) // Poll every 30 seconds
-    return () => clearInterval(interval)
+    let source = null
+    let closed = false
+
+    fetchNotifications().then((loaded) => {
+      const token = localStorage.getItem('token')
+      if (closed || !token) return
+
+      // Live updates instead of polling, resuming after the newest notification we already have.
+      // EventSource reconnects by itself and resends the last event id it received.
+      const params = new URLSearchParams({ token })
+      const ids = loaded.map(notif => notif.id).filter(Number.isInteger)
+      if (ids.length > 0) {
+        params.set('last_event_id', Math.max(...ids))
+      }
+      source = new EventSource(`${api.defaults.baseURL}/notifications/stream?${params}`)
+
+      source.addEventListener('notification', (event) => {
+        const notification = JSON.parse(event.data)
+        setNotifications(prev => prev.some(notif => notif.id === notification.id)
+          ? prev
+          : [notification, ...prev]
+        )
+      })
+      source.addEventListener('notification_updated', (event) => {
+        // Coalesced events ("Amina and 12 others replied") move the merged notification back to the top
+        const notification = JSON.parse(event.data)
+        setNotifications(prev => [notification, ...prev.filter(notif => notif.id !== notification.id)])
+      })
+      source.addEventListener('unread_count', (event) => {
+        setUnreadCount(JSON.parse(event.data).unread_count)
+      })
+    })
+
+    return () => {
+      closed = true
+      source?.close()
+    }
   }, [])
 
   useEffect(() => {
@@ -49,8 +82,12 @@ const NotificationDropdown = ({ isOpen, onClose, onToggle }) => {
   const fetchNotifications = async () => {
     try {
       const response = await api.get('/notifications')
-      setNotifications(response.data.notifications || [])
-      setUnreadCount(response.data.unread_count || 0)
+      const loaded = Array.isArray(response.data) ? response.data : (response.data.notifications || [])
+      setNotifications(loaded)
+      if (response.data.unread_count !== undefined) {
+        setUnreadCount(response.data.unread_count)
+      }
+      return loaded
     } catch (error) {
       console.error('Failed to fetch notifications:', error)
       // Fallback to mock data
@@ -117,6 +154,7 @@ const NotificationDropdown = ({ isOpen, onClose, onToggle }) => {
         }
       ])
       setUnreadCount(2)
+      return []
     }
   }
 
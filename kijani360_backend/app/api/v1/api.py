@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from app.api.v1.endpoints import (
-    simple_forum, analytics, notifications, chatbot, trees, auth, social, dashboard, frontend_analytics, profile, calendar, community_features
+    simple_forum, analytics, notifications, chatbot, trees, auth, social, dashboard, frontend_analytics, profile, calendar, community_features, nurseries, media
 )
 
 api_router = APIRouter()
@@ -78,6 +78,18 @@ api_router.include_router(
     tags=["Community Features"]
 )
 
+api_router.include_router(
+    nurseries.router,
+    prefix="/nurseries",
+    tags=["Nursery Marketplace"]
+)
+
+api_router.include_router(
+    media.router,
+    prefix="/media",
+    tags=["Media Uploads"]
+)
+
 # Health check endpoint
 @api_router.get("/health")
 def health_check():
@@ -11,6 +11,7 @@ from app.core.security import (
 )
 from app.core.config import settings
 from app.core.dependencies import get_current_user
+from app.services.points_service import PointsService, level_for_points
 
 router = APIRouter()
 
@@ -99,6 +100,8 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     user.last_login = datetime.utcnow()
     db.commit()
     
+    points = PointsService(db).get_balance(user.id)
+    
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -120,14 +123,18 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
             is_verified=user.is_verified,
             total_trees_planted=user.total_trees_planted,
             current_streak=user.current_streak,
-            points=user.points,
-            level=user.level
+            points=points,
+            level=level_for_points(points)
         )
     )
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """Get current user information"""
+    points = PointsService(db).get_balance(current_user.id)
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
@@ -139,8 +146,8 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
         is_verified=current_user.is_verified,
         total_trees_planted=current_user.total_trees_planted,
         current_streak=current_user.current_streak,
-        points=current_user.points,
-        level=current_user.level
+        points=points,
+        level=level_for_points(points)
     )
 
 @router.post("/logout")
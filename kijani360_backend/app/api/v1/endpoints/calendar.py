@@ -100,6 +100,8 @@ def create_calendar_event(
             description=event_data.get("description", ""),
             event_date=datetime.fromisoformat(event_data["date"]),
             location=event_data.get("location", ""),
+            latitude=event_data.get("latitude"),
+            longitude=event_data.get("longitude"),
             organizer_id=current_user.id,
             tree_planting_goal=event_data.get("tree_goal", 50)
         )
@@ -10,6 +10,10 @@ from app.models.social import (
     CommunityEvent, EventAttendee, CollaborativeStreak, CollaborativeStreakMember
 )
 from app.core.dependencies import get_current_user
+from app.services.leaderboard_service import LeaderboardService
+from app.services.challenge_service import ChallengeService
+from app.services.geo_index import GeoIndexService
+from app.services.media_uploads import MediaService
 
 router = APIRouter()
 
@@ -75,11 +79,16 @@ def create_post(
     db: Session = Depends(get_db)
 ):
     """Create a new community post"""
+    image_url = post_data.get("image_url")
+    if post_data.get("media_id") is not None:
+        image_url = MediaService(db).urls([post_data["media_id"]]).get(post_data["media_id"])
+        if image_url is None:
+            raise HTTPException(status_code=404, detail="Uploaded photo not found")
     
     post = UserPost(
         user_id=current_user.id,
         content=post_data["content"],
-        image_url=post_data.get("image_url"),
+        image_url=image_url,
         post_type=post_data.get("post_type", "general"),
         tags=post_data.get("tags"),
         location=post_data.get("location"),
@@ -87,6 +96,9 @@ def create_post(
     )
     
     db.add(post)
+    
+    ChallengeService(db).record_event(current_user.id, "community_posts")
+    
     db.commit()
     db.refresh(post)
     
@@ -186,6 +198,50 @@ def get_community_events(
     
     return result
 
+@router.get("/events/nearby")
+def get_nearby_events(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get upcoming community events around a point, closest first"""
+    nearby = GeoIndexService(db).nearby(
+        CommunityEvent, lat, lon, radius_km,
+        CommunityEvent.is_active == True,
+        CommunityEvent.is_public == True,
+        CommunityEvent.event_date >= datetime.utcnow(),
+        limit=limit
+    )
+    
+    event_ids = [event.id for event, _ in nearby]
+    attendee_counts = dict(db.query(EventAttendee.event_id, func.count(EventAttendee.id)).filter(
+        EventAttendee.event_id.in_(event_ids)
+    ).group_by(EventAttendee.event_id).all())
+    attending = {event_id for (event_id,) in db.query(EventAttendee.event_id).filter(
+        EventAttendee.event_id.in_(event_ids),
+        EventAttendee.user_id == current_user.id
+    ).all()}
+    
+    return [
+        {
+            "id": event.id,
+            "title": event.title,
+            "event_date": event.event_date.isoformat(),
+            "location": event.location,
+            "latitude": event.latitude,
+            "longitude": event.longitude,
+            "distance_km": round(distance, 3),
+            "max_attendees": event.max_attendees,
+            "tree_planting_goal": event.tree_planting_goal,
+            "attendee_count": attendee_counts.get(event.id, 0),
+            "is_attending": event.id in attending
+        }
+        for event, distance in nearby
+    ]
+
 @router.post("/events/{event_id}/join")
 def join_event(
     event_id: int,
@@ -232,63 +288,13 @@ def join_event(
 def get_community_leaderboard(
     db: Session = Depends(get_db),
     metric: str = Query("trees", regex="^(trees|streak|points)$"),
-    limit: int = Query(10, le=50)
+    limit: int = Query(10, le=50),
+    window: str = Query("all", regex="^(all|week|month)$"),
+    county: Optional[str] = Query(None)
 ):
     """Get community leaderboard"""
     
-    if metric == "trees":
-        users = db.query(User).order_by(desc(User.total_trees_planted)).limit(limit).all()
-        
-        result = []
-        for i, user in enumerate(users):
-            result.append({
-                "rank": i + 1,
-                "user_id": user.id,
-                "username": user.username,
-                "avatar": user.profile_image,
-                "trees_planted": user.total_trees_planted,
-                "current_streak": user.current_streak,
-                "points": user.points,
-                "location": user.location
-            })
-        
-        return result
-    
-    elif metric == "points":
-        users = db.query(User).order_by(desc(User.points)).limit(limit).all()
-        
-        result = []
-        for i, user in enumerate(users):
-            result.append({
-                "rank": i + 1,
-                "user_id": user.id,
-                "username": user.username,
-                "avatar": user.profile_image,
-                "trees_planted": user.total_trees_planted,
-                "current_streak": user.current_streak,
-                "points": user.points,
-                "location": user.location
-            })
-        
-        return result
-    
-    else:  # streak
-        users = db.query(User).order_by(desc(User.current_streak)).limit(limit).all()
-        
-        result = []
-        for i, user in enumerate(users):
-            result.append({
-                "rank": i + 1,
-                "user_id": user.id,
-                "username": user.username,
-                "avatar": user.profile_image,
-                "trees_planted": user.total_trees_planted,
-                "current_streak": user.current_streak,
-                "points": user.points,
-                "location": user.location
-            })
-        
-        return result
+    return LeaderboardService(db).get_entries(metric, limit, window=window, county=county)
 
 @router.get("/stats")
 def get_community_stats(db: Session = Depends(get_db)):
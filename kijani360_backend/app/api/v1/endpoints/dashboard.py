@@ -14,9 +14,13 @@ from app.models.forum import TreePlantingStreak, UserAchievement, Achievement
 from app.schemas.social import (
     UserDashboard, TreePlantingStreakResponse, StreakActivityResponse,
     UserAchievementResponse, AchievementResponse, CollaborativeStreakResponse,
-    CommunityEventResponse
+    CommunityEventResponse, ChallengeProgressResponse
 )
 from app.core.dependencies import get_current_user
+from app.services.collaborative_streak_service import CollaborativeStreakService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.points_service import PointsService, level_for_points
+from app.services.challenge_service import ChallengeService
 
 router = APIRouter()
 
@@ -28,10 +32,11 @@ def get_user_dashboard(
     """Get comprehensive user dashboard with all social features"""
     
     # User Statistics
+    points = PointsService(db).get_balance(current_user.id)
     user_stats = {
         "trees_planted": current_user.total_trees_planted,
-        "points": current_user.points,
-        "level": current_user.level,
+        "points": points,
+        "level": level_for_points(points),
         "member_since": current_user.created_at.strftime("%B %Y"),
         "last_activity": None
     }
@@ -84,6 +89,8 @@ def get_user_dashboard(
         CollaborativeStreakMember.user_id == current_user.id
     ).order_by(desc(CollaborativeStreak.current_streak)).limit(5).all()
     
+    collab_totals = CollaborativeStreakService(db).get_totals([streak.id for streak in collab_streaks])
+    
     collab_streaks_response = []
     for streak in collab_streaks:
         member_count = db.query(CollaborativeStreakMember).filter(
@@ -91,6 +98,7 @@ def get_user_dashboard(
         ).count()
         
         streak_dict = streak.__dict__.copy()
+        streak_dict['total_trees_planted'] = collab_totals.get(streak.id, streak.total_trees_planted)
         streak_dict['member_count'] = member_count
         streak_dict['is_member'] = True
         collab_streaks_response.append(CollaborativeStreakResponse(**streak_dict))
@@ -119,15 +127,33 @@ def get_user_dashboard(
         event_dict['is_attending'] = is_attending
         events_response.append(CommunityEventResponse(**event_dict))
     
+    # Active challenges (cached definitions plus one keyed progress lookup)
+    challenges_response = [
+        ChallengeProgressResponse(**challenge)
+        for challenge in ChallengeService(db).get_user_challenges(current_user.id)
+    ]
+    
     return UserDashboard(
         user_stats=user_stats,
         streak_info=streak_info,
         recent_activities=activities_response,
         achievements=achievements_response,
         collaborative_streaks=collab_streaks_response,
-        upcoming_events=events_response
+        upcoming_events=events_response,
+        challenges=challenges_response
     )
 
+@router.get("/dashboard/challenges", response_model=List[ChallengeProgressResponse])
+def get_dashboard_challenges(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get active challenges with the user's progress"""
+    return [
+        ChallengeProgressResponse(**challenge)
+        for challenge in ChallengeService(db).get_user_challenges(current_user.id)
+    ]
+
 @router.get("/dashboard/stats")
 def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
@@ -156,10 +182,7 @@ def get_dashboard_stats(
     ).scalar() or 0
     
     # Rank in community
-    users_with_more_trees = db.query(User).filter(
-        User.total_trees_planted > current_user.total_trees_planted
-    ).count()
-    community_rank = users_with_more_trees + 1
+    community_rank = LeaderboardService(db).get_rank(current_user.id, "trees") or 1
     
     # Following stats
     from app.models.social import UserFollow
@@ -17,6 +17,8 @@ from app.schemas.forum import (
     ForumStats, CommunityLeaderboard
 )
 from app.api.v1.endpoints.auth import get_current_user
+from app.services.challenge_service import ChallengeService
+from app.services.notification_service import NotificationService
 
 router = APIRouter()
 
@@ -175,8 +177,19 @@ def create_post(
     topic.last_reply_at = db_post.created_at
     topic.last_reply_by = current_user.id
     
+    ChallengeService(db).record_event(current_user.id, "forum_posts")
+    
     db.commit()
     db.refresh(db_post)
+    
+    if topic.author_id != current_user.id:
+        NotificationService(db).send_forum_reply_notification(
+            topic.author_id,
+            topic_title=topic.title,
+            replier_username=current_user.username,
+            topic_id=topic.id,
+            replier_id=current_user.id
+        )
     return db_post
 
 @router.put("/posts/{post_id}", response_model=ForumPostSchema)
@@ -231,6 +244,15 @@ def like_post(
         post.like_count = like_count
     
     db.commit()
+    
+    if liked and post and post.author_id != current_user.id:
+        NotificationService(db).send_like_notification(
+            post.author_id,
+            liker_id=current_user.id,
+            liker_username=current_user.username,
+            target_type="forum_post",
+            target_id=post.id
+        )
     return {"liked": liked, "like_count": post.like_count if post else 0}
 
 # Tree Planting Streaks
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from app.database.session import get_db
 from app.models.user import User
 from app.models.forum import TreePlantingStreak
+from app.services.points_service import PointsService
 
 router = APIRouter()
 
@@ -104,6 +105,9 @@ def get_community_statistics(db: Session = Depends(get_db)):
         User.total_trees_planted.desc()
     ).limit(5).all()
     
+    # users.points only holds compacted credits, the ledger tail is added on read
+    balances = PointsService(db).get_balances([user.id for user in top_users])
+    
     top_planters = []
     for i, user in enumerate(top_users):
         streak = db.query(TreePlantingStreak).filter(
@@ -116,7 +120,7 @@ def get_community_statistics(db: Session = Depends(get_db)):
             "avatar": user.profile_image,
             "trees_planted": user.total_trees_planted,
             "current_streak": streak.current_streak if streak else 0,
-            "points": user.points,
+            "points": balances.get(user.id, 0),
             "rank": i + 1
         })
     
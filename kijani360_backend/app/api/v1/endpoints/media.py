@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from app.database.session import get_db
+from app.models.user import User
+from app.models.media import MediaUpload
+from app.schemas.media import MediaUploadResponse
+from app.core.dependencies import get_current_user
+from app.services.media_uploads import MediaService, UploadError, media_url, receive_upload
+
+router = APIRouter()
+
+def _upload_response(upload: MediaUpload, deduplicated: bool = False) -> MediaUploadResponse:
+    return MediaUploadResponse(
+        id=upload.id,
+        url=media_url(upload.path),
+        content_type=upload.content_type,
+        size_bytes=upload.size_bytes,
+        width=upload.width,
+        height=upload.height,
+        variants={width: media_url(path) for width, path in (upload.variants or {}).items()},
+        deduplicated=deduplicated,
+        created_at=upload.created_at
+    )
+
+@router.post("/uploads", response_model=MediaUploadResponse)
+async def upload_image(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upload a photo as the multipart field "file", pass the returned id as media_id when posting"""
+    try:
+        received = await receive_upload(request)
+        upload, deduplicated = await MediaService(db).store(received, current_user.id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    return _upload_response(upload, deduplicated)
@@ -1,21 +1,39 @@
+import asyncio
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Header, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from datetime import datetime, timedelta
-from app.database.session import get_db
+from app.database.session import get_db, SessionLocal
 from app.models.user import User
 from app.models.notifications import Notification, NotificationPreference
 from app.schemas.notifications import (
     NotificationCreate, Notification as NotificationSchema,
     NotificationPreference as NotificationPreferenceSchema,
-    NotificationUpdate, BulkNotificationCreate
+    NotificationUpdate, BulkNotificationCreate, BulkNotificationResult
 )
-from app.core.dependencies import get_current_user
+from app.core.dependencies import get_current_user, get_user_from_token
 from app.services.notification_service import NotificationService
+from app.services.notification_stream import NotificationStream, notification_broker, format_sse
+from app.services.notification_counters import NotificationCounterService
+from app.services.notification_partitions import NotificationPartitionService
+from app.services.notification_preferences import NotificationPreferenceResolver, PREFERENCE_FLAGS
 
 router = APIRouter()
 
+# Browser reconnect delay sent to EventSource clients
+STREAM_RETRY_MS = 3000
+
+def _authenticate_stream(token: str) -> Optional[int]:
+    """Resolve a stream token to a user id without holding a session for the stream's lifetime"""
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(token, db)
+        return user.id if user else None
+    finally:
+        db.close()
+
 @router.get("/", response_model=List[NotificationSchema])
 def get_user_notifications(
     current_user: User = Depends(get_current_user),
@@ -25,7 +43,8 @@ def get_user_notifications(
 ):
     """Get notifications for current user"""
     query = db.query(Notification).filter(
-        Notification.user_id == current_user.id
+        Notification.user_id == current_user.id,
+        *NotificationPartitionService(db).recent_criteria()
     )
     
     if unread_only:
@@ -40,7 +59,6 @@ def get_user_notifications(
 @router.post("/", response_model=NotificationSchema)
 def create_notification(
     notification_data: NotificationCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Create a new notification"""
@@ -53,12 +71,9 @@ def create_notification(
         data=notification_data.data
     )
     
-    # Send push notification in background
+    # Push is sent by the job queue
     if notification_data.send_push:
-        background_tasks.add_task(
-            notification_service.send_push_notification,
-            notification.id
-        )
+        notification_service.send_push_notification(notification.id)
     
     return notification
 
@@ -77,9 +92,18 @@ def mark_notification_read(
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
-    notification.is_read = True
-    notification.read_at = datetime.utcnow()
+    # Conditional update so concurrent requests decrement the unread counter once
+    marked = db.query(Notification).filter(
+        Notification.id == notification_id,
+        Notification.is_read == False
+    ).update({
+        "is_read": True,
+        "read_at": datetime.utcnow()
+    }, synchronize_session=False)
+    if marked:
+        NotificationCounterService(db).record({current_user.id: (-1, 0)})
     db.commit()
+    notification_broker.publish([current_user.id])
     
     return {"message": "Notification marked as read"}
 
@@ -96,7 +120,9 @@ def mark_all_notifications_read(
         "is_read": True,
         "read_at": datetime.utcnow()
     })
+    NotificationCounterService(db).reset_unread(current_user.id)
     db.commit()
+    notification_broker.publish([current_user.id])
     
     return {"message": "All notifications marked as read"}
 
@@ -116,7 +142,9 @@ def delete_notification(
         raise HTTPException(status_code=404, detail="Notification not found")
     
     db.delete(notification)
+    NotificationCounterService(db).record({current_user.id: (0 if notification.is_read else -1, -1)})
     db.commit()
+    notification_broker.publish([current_user.id])
     
     return {"message": "Notification deleted"}
 
@@ -163,10 +191,11 @@ def update_notification_preferences(
         db.add(preferences)
     
     for field, value in preferences_data.items():
-        if hasattr(preferences, field):
+        if field in PREFERENCE_FLAGS:
             setattr(preferences, field, value)
     
     db.commit()
+    NotificationPreferenceResolver(db).invalidate(current_user.id)
     db.refresh(preferences)
     return preferences
 
@@ -176,51 +205,106 @@ def get_unread_count(
     db: Session = Depends(get_db)
 ):
     """Get count of unread notifications"""
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
+    count = NotificationCounterService(db).get_unread_count(current_user.id)
     
     return {"unread_count": count}
 
-@router.post("/bulk", response_model=List[NotificationSchema])
+@router.get("/stream")
+async def stream_notifications(
+    token: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-sent events with new notifications and unread-count changes (token in the query, EventSource cannot set headers)"""
+    user_id = await asyncio.to_thread(_authenticate_stream, token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    
+    # EventSource resends the last id it saw when it reconnects
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    
+    stream = NotificationStream(user_id, last_event_id)
+    
+    async def event_source():
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        async for event in stream.events():
+            yield format_sse(event)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def notifications_websocket(
+    websocket: WebSocket,
+    token: str,
+    last_event_id: Optional[int] = None
+):
+    """WebSocket carrying the same events as /stream, as JSON messages"""
+    user_id = await asyncio.to_thread(_authenticate_stream, token)
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    events = NotificationStream(user_id, last_event_id).events()
+    
+    async def send_events():
+        async for event in events:
+            await websocket.send_json(event)
+    
+    async def wait_for_disconnect():
+        # Incoming messages are ignored, reading them is how a closed socket is noticed
+        while True:
+            await websocket.receive_text()
+    
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await events.aclose()
+
+@router.post("/bulk", response_model=BulkNotificationResult)
 def create_bulk_notifications(
     bulk_data: BulkNotificationCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Create notifications for multiple users"""
     notification_service = NotificationService(db)
-    notifications = []
-    
-    for user_id in bulk_data.user_ids:
-        notification = notification_service.create_notification(
-            user_id=user_id,
-            title=bulk_data.title,
-            message=bulk_data.message,
-            notification_type=bulk_data.type,
-            data=bulk_data.data
+    result = notification_service.create_notifications_bulk(
+        bulk_data.user_ids,
+        title=bulk_data.title,
+        message=bulk_data.message,
+        notification_type=bulk_data.type,
+        data=bulk_data.data
+    )
+    
+    # Push is sent by the job queue, one job per chunk of users
+    if bulk_data.send_push and bulk_data.user_ids:
+        notification_service.send_push_notifications_bulk(
+            bulk_data.user_ids,
+            bulk_data.title,
+            bulk_data.message
         )
-        notifications.append(notification)
-        
-        # Send push notifications in background
-        if bulk_data.send_push:
-            background_tasks.add_task(
-                notification_service.send_push_notification,
-                notification.id
-            )
     
-    return notifications
+    return BulkNotificationResult(
+        requested=len(bulk_data.user_ids),
+        created=result["created"],
+        push_scheduled=bool(bulk_data.send_push and bulk_data.user_ids)
+    )
 
 @router.post("/watering-reminders")
 def schedule_watering_reminders(
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Schedule watering reminders for all users with active trees"""
     notification_service = NotificationService(db)
-    background_tasks.add_task(
-        notification_service.send_watering_reminders
-    )
+    job_id = notification_service.send_watering_reminders()
     
-    return {"message": "Watering reminders scheduled"}
\ No newline at end of file
+    return {"message": "Watering reminders scheduled", "job_id": job_id}
\ No newline at end of file
@@ -9,9 +9,11 @@ from app.schemas.nursery import (
     SeedlingListingCreate, SeedlingListing as SeedlingListingSchema,
     OrderCreate, Order as OrderSchema,
     NurseryReviewCreate, NurseryReview as NurseryReviewSchema,
-    NurserySearchFilters, SeedlingSearchResponse
+    NurserySearchFilters, SeedlingSearchResponse, NurseryNearby
 )
 from app.api.v1.endpoints.auth import get_current_user
+from app.services.geo_index import GeoIndexService
+from app.services.media_uploads import MediaService
 
 router = APIRouter()
 
@@ -36,7 +38,7 @@ def get_nurseries(
     db: Session = Depends(get_db),
     county: Optional[str] = Query(None),
     verified_only: bool = Query(False),
-    limit: int = Query(20, le=100)
+    limit: int = Query(20, ge=1, le=100)
 ):
     """Get list of nurseries with filters"""
     query = db.query(Nursery).filter(Nursery.is_active == True)
@@ -49,6 +51,26 @@ def get_nurseries(
     
     return query.limit(limit).all()
 
+@router.get("/nearby", response_model=List[NurseryNearby])
+def get_nearby_nurseries(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=200),
+    verified_only: bool = Query(False),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get nurseries around a point, closest first"""
+    criteria = [Nursery.is_active == True]
+    if verified_only:
+        criteria.append(Nursery.is_verified == True)
+    
+    nearby = GeoIndexService(db).nearby(Nursery, lat, lon, radius_km, *criteria, limit=limit)
+    return [
+        NurseryNearby(**NurserySchema.model_validate(nursery).model_dump(), distance_km=round(distance, 3))
+        for nursery, distance in nearby
+    ]
+
 @router.get("/{nursery_id}", response_model=NurserySchema)
 def get_nursery(nursery_id: int, db: Session = Depends(get_db)):
     """Get nursery details"""
@@ -103,9 +125,15 @@ def create_seedling_listing(
     if not nursery:
         raise HTTPException(status_code=404, detail="Nursery not found or not owned by user")
     
+    listing = listing_data.dict(exclude={"media_id"})
+    if listing_data.media_id is not None:
+        listing["primary_image"] = MediaService(db).urls([listing_data.media_id]).get(listing_data.media_id)
+        if listing["primary_image"] is None:
+            raise HTTPException(status_code=404, detail="Uploaded photo not found")
+    
     db_listing = SeedlingListing(
         nursery_id=nursery_id,
-        **listing_data.dict()
+        **listing
     )
     db.add(db_listing)
     db.commit()
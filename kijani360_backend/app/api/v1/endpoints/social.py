@@ -1,8 +1,9 @@
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_, or_
-from datetime import datetime, timedelta, date
+from sqlalchemy import desc, func, and_, or_, insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, date, timezone
 
 from app.database.session import get_db
 from app.models.user import User
@@ -15,6 +16,7 @@ from app.models.forum import TreePlantingStreak, Achievement, UserAchievement
 from app.schemas.social import (
     UserFollowCreate, UserFollowResponse, FollowStats,
     StreakActivityCreate, StreakActivityResponse, TreePlantingStreakResponse,
+    StreakActivityBulkCreate, StreakActivityBulkResponse,
     CollaborativeStreakCreate, CollaborativeStreakResponse, CollaborativeStreakMemberResponse,
     UserPostCreate, UserPostResponse, PostCommentCreate, PostCommentResponse,
     AchievementResponse, UserAchievementResponse,
@@ -22,6 +24,13 @@ from app.schemas.social import (
     UserDashboard, LeaderboardEntry, CommunityStats
 )
 from app.core.dependencies import get_current_user
+from app.services.collaborative_streak_service import CollaborativeStreakService
+from app.services.achievement_engine import AchievementEngine
+from app.services.leaderboard_service import LeaderboardService
+from app.services.challenge_service import ChallengeService, ACTIVITY_METRICS
+from app.services.notification_service import NotificationService
+from app.services.map_clusters import MapClusterService
+from app.services.media_uploads import MediaService
 
 router = APIRouter()
 
@@ -122,6 +131,8 @@ def log_streak_activity(
     db: Session = Depends(get_db)
 ):
     """Log a tree planting activity to maintain streak"""
+    photo_url = _media_urls(db, [activity]).get(activity.media_id, activity.photo_url)
+    
     # Create activity record
     streak_activity = StreakActivity(
         user_id=current_user.id,
@@ -130,60 +141,39 @@ def log_streak_activity(
         location=activity.location,
         latitude=activity.latitude,
         longitude=activity.longitude,
-        photo_url=activity.photo_url,
+        photo_url=photo_url,
         description=activity.description,
         collaborative_streak_id=activity.collaborative_streak_id
     )
     db.add(streak_activity)
     
     # Update or create user streak
-    user_streak = db.query(TreePlantingStreak).filter(
-        TreePlantingStreak.user_id == current_user.id
-    ).first()
-    
-    if not user_streak:
-        user_streak = TreePlantingStreak(user_id=current_user.id)
-        db.add(user_streak)
-    
-    # Update streak logic
-    today = datetime.utcnow().date()
-    last_activity = user_streak.last_activity_date.date() if user_streak.last_activity_date else None
-    
-    if last_activity == today:
-        # Already logged today, just update trees count
-        pass
-    elif last_activity == today - timedelta(days=1):
-        # Consecutive day, increment streak
-        user_streak.current_streak += 1
-        user_streak.longest_streak = max(user_streak.longest_streak, user_streak.current_streak)
-    elif last_activity is None or last_activity < today - timedelta(days=1):
-        # Streak broken or first activity, reset to 1
-        user_streak.current_streak = 1
-        user_streak.streak_start_date = datetime.utcnow()
-    
-    user_streak.last_activity_date = datetime.utcnow()
+    user_streak = _get_or_create_user_streak(current_user.id, db)
+    _advance_streak(user_streak, datetime.utcnow())
     
     # Update user total trees
     current_user.total_trees_planted += activity.trees_count
     
-    # Update collaborative streak if applicable
+    LeaderboardService(db).record_activity(
+        current_user.id,
+        trees=activity.trees_count,
+        streak=user_streak.current_streak
+    )
+    
+    if activity.activity_type in ACTIVITY_METRICS:
+        ChallengeService(db).record_event(
+            current_user.id,
+            ACTIVITY_METRICS[activity.activity_type],
+            activity.trees_count
+        )
+    
+    # Update collaborative streak if applicable (sharded, no hot-row update)
     if activity.collaborative_streak_id:
-        collab_streak = db.query(CollaborativeStreak).filter(
-            CollaborativeStreak.id == activity.collaborative_streak_id
-        ).first()
-        if collab_streak:
-            collab_streak.total_trees_planted += activity.trees_count
-            
-            # Update member contribution
-            member = db.query(CollaborativeStreakMember).filter(
-                and_(
-                    CollaborativeStreakMember.streak_id == activity.collaborative_streak_id,
-                    CollaborativeStreakMember.user_id == current_user.id
-                )
-            ).first()
-            if member:
-                member.trees_contributed += activity.trees_count
-                member.last_contribution = datetime.utcnow()
+        CollaborativeStreakService(db).add_contribution(
+            streak_id=activity.collaborative_streak_id,
+            user_id=current_user.id,
+            trees_count=activity.trees_count
+        )
     
     db.commit()
     db.refresh(streak_activity)
@@ -191,8 +181,140 @@ def log_streak_activity(
     # Check for achievements
     _check_achievements(current_user, db)
     
+    LeaderboardService(db).sync_user(current_user.id)
+    
     return streak_activity
 
+@router.post("/streak/activity/bulk", response_model=StreakActivityBulkResponse)
+def sync_streak_activities(
+    payload: StreakActivityBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk ingest activities queued offline by the mobile client"""
+    # Deduplicate within the batch and against client ids already synced
+    batch = {}
+    for item in payload.activities:
+        batch.setdefault(item.client_id, item)
+    
+    synced_ids = {
+        client_id for (client_id,) in db.query(StreakActivity.client_id).filter(
+            StreakActivity.user_id == current_user.id,
+            StreakActivity.client_id.in_(list(batch.keys()))
+        ).all()
+    }
+    
+    new_items = sorted(
+        (item for client_id, item in batch.items() if client_id not in synced_ids),
+        key=lambda item: _to_utc(item.activity_date)
+    )
+    
+    user_streak = _get_or_create_user_streak(current_user.id, db)
+    
+    if new_items:
+        now = datetime.utcnow()
+        photo_urls = _media_urls(db, new_items)
+        rows = [
+            {
+                "user_id": current_user.id,
+                "client_id": item.client_id,
+                "activity_type": item.activity_type,
+                "trees_count": item.trees_count,
+                "activity_date": _to_utc(item.activity_date),
+                "location": item.location,
+                "latitude": item.latitude,
+                "longitude": item.longitude,
+                "photo_url": photo_urls.get(item.media_id, item.photo_url),
+                "description": item.description,
+                "collaborative_streak_id": item.collaborative_streak_id,
+                "created_at": now
+            }
+            for item in new_items
+        ]
+        
+        # One multi-row insert for the whole batch, less any client ids a concurrent sync got in first
+        rows = _insert_activities(db, current_user.id, rows, synced_ids)
+        new_items = [item for item in new_items if item.client_id not in synced_ids]
+    
+    if new_items:
+        MapClusterService(db).mark_points("activities", rows)
+        
+        # Replay streak state once, in chronological order
+        last_activity = user_streak.last_activity_date
+        if last_activity and rows[0]["activity_date"].date() < last_activity.date():
+            # Activities landed before the current streak head, rebuild from history
+            history = db.query(StreakActivity.activity_date).filter(
+                StreakActivity.user_id == current_user.id
+            ).order_by(StreakActivity.activity_date).all()
+            
+            user_streak.current_streak = 0
+            user_streak.last_activity_date = None
+            for (activity_date,) in history:
+                _advance_streak(user_streak, activity_date)
+        else:
+            for row in rows:
+                _advance_streak(user_streak, row["activity_date"])
+        
+        # Apply totals in aggregate
+        current_user.total_trees_planted += sum(row["trees_count"] for row in rows)
+        
+        # Weekly/monthly buckets get one upsert each, the streak is credited to the latest activity
+        events = [(row["activity_date"], row["trees_count"], 0, None) for row in rows]
+        latest = max(range(len(events)), key=lambda i: events[i][0])
+        events[latest] = events[latest][:3] + (user_streak.current_streak,)
+        LeaderboardService(db).record_activities(current_user.id, events)
+        
+        # Challenge progress, one event per metric and day
+        challenge_totals = {}
+        for row in rows:
+            metric = ACTIVITY_METRICS.get(row["activity_type"])
+            if metric:
+                key = (metric, row["activity_date"].date())
+                challenge_totals[key] = challenge_totals.get(key, 0) + row["trees_count"]
+        
+        challenge_service = ChallengeService(db)
+        for (metric, day), trees in challenge_totals.items():
+            challenge_service.record_event(
+                current_user.id,
+                metric,
+                trees,
+                occurred_at=datetime.combine(day, datetime.min.time())
+            )
+        
+        collaborative_totals = {}
+        for row in rows:
+            streak_id = row["collaborative_streak_id"]
+            if streak_id:
+                trees, latest = collaborative_totals.get(streak_id, (0, row["activity_date"]))
+                collaborative_totals[streak_id] = (
+                    trees + row["trees_count"],
+                    max(latest, row["activity_date"])
+                )
+        
+        collab_service = CollaborativeStreakService(db)
+        for streak_id, (trees, latest) in collaborative_totals.items():
+            collab_service.add_contribution(
+                streak_id=streak_id,
+                user_id=current_user.id,
+                trees_count=trees,
+                contributed_at=latest
+            )
+    
+    db.commit()
+    
+    # Check for achievements once per batch
+    if new_items:
+        _check_achievements(current_user, db)
+        LeaderboardService(db).sync_user(current_user.id)
+    
+    return StreakActivityBulkResponse(
+        received=len(payload.activities),
+        created=len(new_items),
+        duplicates=sorted(synced_ids),
+        current_streak=user_streak.current_streak or 0,
+        longest_streak=user_streak.longest_streak or 0
+    )
+
 @router.get("/streak/my", response_model=TreePlantingStreakResponse)
 def get_my_streak(
     current_user: User = Depends(get_current_user),
@@ -313,6 +435,9 @@ def get_collaborative_streaks(
     
     streaks = query.order_by(desc(CollaborativeStreak.created_at)).limit(limit).all()
     
+    # Group totals live in counter shards
+    totals = CollaborativeStreakService(db).get_totals([streak.id for streak in streaks])
+    
     # Add member count and membership status
     result = []
     for streak in streaks:
@@ -328,6 +453,7 @@ def get_collaborative_streaks(
         ).first() is not None
         
         streak_dict = streak.__dict__.copy()
+        streak_dict['total_trees_planted'] = totals.get(streak.id, streak.total_trees_planted)
         streak_dict['member_count'] = member_count
         streak_dict['is_member'] = is_member
         result.append(CollaborativeStreakResponse(**streak_dict))
@@ -346,7 +472,7 @@ def create_post(
     post = UserPost(
         user_id=current_user.id,
         content=post_data.content,
-        image_url=post_data.image_url,
+        image_url=_media_urls(db, [post_data]).get(post_data.media_id, post_data.image_url),
         post_type=post_data.post_type,
         tags=post_data.tags,
         location=post_data.location
@@ -432,6 +558,15 @@ def like_post(
         action = "liked"
     
     db.commit()
+    
+    if action == "liked" and post.user_id != current_user.id:
+        NotificationService(db).send_like_notification(
+            post.user_id,
+            liker_id=current_user.id,
+            liker_username=current_user.username,
+            target_type="post",
+            target_id=post.id
+        )
     return {"message": f"Post {action} successfully", "likes_count": post.likes_count}
 
 @router.get("/posts/my-posts", response_model=List[UserPostResponse])
@@ -585,56 +720,13 @@ def send_message(
 def get_leaderboard(
     db: Session = Depends(get_db),
     limit: int = Query(10, le=50),
-    metric: str = Query("trees", regex="^(trees|streak|points)$")
+    metric: str = Query("trees", regex="^(trees|streak|points)$"),
+    window: str = Query("all", regex="^(all|week|month)$"),
+    county: Optional[str] = Query(None)
 ):
     """Get community leaderboard"""
-    if metric == "trees":
-        order_by = desc(User.total_trees_planted)
-        value_field = "total_trees_planted"
-    elif metric == "streak":
-        # Join with streak table
-        users = db.query(
-            User, TreePlantingStreak.current_streak
-        ).outerjoin(TreePlantingStreak).order_by(
-            desc(TreePlantingStreak.current_streak)
-        ).limit(limit).all()
-        
-        result = []
-        for i, (user, streak) in enumerate(users):
-            result.append(LeaderboardEntry(
-                user_id=user.id,
-                username=user.username,
-                avatar=user.profile_image,
-                trees_planted=user.total_trees_planted,
-                current_streak=streak or 0,
-                points=user.points,
-                rank=i + 1
-            ))
-        return result
-    else:  # points
-        order_by = desc(User.points)
-        value_field = "points"
-    
-    users = db.query(User).order_by(order_by).limit(limit).all()
-    
-    result = []
-    for i, user in enumerate(users):
-        # Get user's streak
-        streak = db.query(TreePlantingStreak).filter(
-            TreePlantingStreak.user_id == user.id
-        ).first()
-        
-        result.append(LeaderboardEntry(
-            user_id=user.id,
-            username=user.username,
-            avatar=user.profile_image,
-            trees_planted=user.total_trees_planted,
-            current_streak=streak.current_streak if streak else 0,
-            points=user.points,
-            rank=i + 1
-        ))
-    
-    return result
+    entries = LeaderboardService(db).get_entries(metric, limit, window=window, county=county)
+    return [LeaderboardEntry(**entry) for entry in entries]
 
 @router.get("/stats/community", response_model=CommunityStats)
 def get_community_stats(db: Session = Depends(get_db)):
@@ -647,25 +739,10 @@ def get_community_stats(db: Session = Depends(get_db)):
     total_events = db.query(CommunityEvent).count()
     
     # Top 5 planters
-    top_users = db.query(User).order_by(
-        desc(User.total_trees_planted)
-    ).limit(5).all()
-    
-    top_planters = []
-    for i, user in enumerate(top_users):
-        streak = db.query(TreePlantingStreak).filter(
-            TreePlantingStreak.user_id == user.id
-        ).first()
-        
-        top_planters.append(LeaderboardEntry(
-            user_id=user.id,
-            username=user.username,
-            avatar=user.profile_image,
-            trees_planted=user.total_trees_planted,
-            current_streak=streak.current_streak if streak else 0,
-            points=user.points,
-            rank=i + 1
-        ))
+    top_planters = [
+        LeaderboardEntry(**entry)
+        for entry in LeaderboardService(db).get_entries("trees", 5)
+    ]
     
     return CommunityStats(
         total_users=total_users,
@@ -677,37 +754,82 @@ def get_community_stats(db: Session = Depends(get_db)):
 
 # ============ HELPER FUNCTIONS ============
 
+def _media_urls(db: Session, items) -> dict:
+    """URLs of the uploads items reference by media_id, 404 when one does not exist"""
+    media_ids = {item.media_id for item in items if item.media_id is not None}
+    urls = MediaService(db).urls(media_ids)
+    if len(urls) < len(media_ids):
+        raise HTTPException(status_code=404, detail="Uploaded photo not found")
+    return urls
+
+def _insert_activities(db: Session, user_id: int, rows: List[dict], synced_ids: set) -> List[dict]:
+    """Insert activity rows, skipping client ids that turn out to be synced already, returns the rows inserted"""
+    while rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(StreakActivity), rows)
+            return rows
+        except IntegrityError:
+            # Another sync of the same client ids committed first, those are duplicates now
+            raced = {
+                client_id for (client_id,) in db.query(StreakActivity.client_id).filter(
+                    StreakActivity.user_id == user_id,
+                    StreakActivity.client_id.in_([row["client_id"] for row in rows])
+                ).all()
+            }
+            if not raced:
+                raise
+            synced_ids |= raced
+            rows = [row for row in rows if row["client_id"] not in raced]
+    return rows
+
+def _get_or_create_user_streak(user_id: int, db: Session) -> TreePlantingStreak:
+    """Get the user's planting streak, creating it if needed"""
+    user_streak = db.query(TreePlantingStreak).filter(
+        TreePlantingStreak.user_id == user_id
+    ).first()
+    
+    if not user_streak:
+        user_streak = TreePlantingStreak(user_id=user_id, current_streak=0, longest_streak=0)
+        db.add(user_streak)
+    
+    return user_streak
+
+def _advance_streak(user_streak: TreePlantingStreak, activity_time: datetime):
+    """Apply one activity to the user's daily streak"""
+    activity_day = activity_time.date()
+    last_activity = user_streak.last_activity_date.date() if user_streak.last_activity_date else None
+    
+    if last_activity == activity_day:
+        # Already logged that day, streak unchanged
+        pass
+    elif last_activity == activity_day - timedelta(days=1):
+        # Consecutive day, increment streak
+        user_streak.current_streak = (user_streak.current_streak or 0) + 1
+    else:
+        # Streak broken or first activity, reset to 1
+        user_streak.current_streak = 1
+        user_streak.streak_start_date = activity_time
+    
+    user_streak.longest_streak = max(user_streak.longest_streak or 0, user_streak.current_streak)
+    user_streak.last_activity_date = activity_time
+
+def _to_utc(value: datetime) -> datetime:
+    """Normalize a client timestamp to naive UTC like the rest of the database"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 def _check_achievements(user: User, db: Session):
     """Check and award achievements to user"""
-    # Get all achievements user hasn't earned yet
-    earned_achievement_ids = db.query(UserAchievement.achievement_id).filter(
-        UserAchievement.user_id == user.id
-    ).subquery()
-    
-    available_achievements = db.query(Achievement).filter(
-        ~Achievement.id.in_(earned_achievement_ids)
-    ).all()
+    streak = db.query(TreePlantingStreak).filter(
+        TreePlantingStreak.user_id == user.id
+    ).first()
     
-    for achievement in available_achievements:
-        earned = False
-        
-        if achievement.criteria_type == "trees_planted":
-            earned = user.total_trees_planted >= achievement.criteria_value
-        elif achievement.criteria_type == "streak_days":
-            streak = db.query(TreePlantingStreak).filter(
-                TreePlantingStreak.user_id == user.id
-            ).first()
-            earned = streak and streak.longest_streak >= achievement.criteria_value
-        
-        if earned:
-            # Award achievement
-            user_achievement = UserAchievement(
-                user_id=user.id,
-                achievement_id=achievement.id
-            )
-            db.add(user_achievement)
-            
-            # Award points
-            user.points += achievement.points_reward
+    AchievementEngine(db).evaluate(user.id, {
+        "trees_planted": user.total_trees_planted or 0,
+        "streak_days": streak.longest_streak if streak else 0
+    })
     
     db.commit()
\ No newline at end of file
@@ -1,18 +1,29 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from app.database.session import get_db
 from app.models.user import User
-from app.models.tree import UserTree, TreeSpecies, WateringLog
+from app.models.tree import UserTree, WateringLog
 from app.schemas.tree import (
     UserTreeCreate, UserTree as UserTreeSchema, UserTreeUpdate,
     WateringLogCreate, WateringLog as WateringLogSchema,
-    CareCalendar, TreeCareStats, CareReminder
+    CareCalendar, TreeCareStats, CareReminder,
+    UserTreeBulkCreate, UserTreeBulkResult,
+    TreeMeasurementCreate, TreeMeasurementSeries, GrowthCurve, GrowthCurvePoint,
+    WateringDay
 )
+from app.core.config import settings
 from app.core.dependencies import get_current_user
 from app.services.tree_care import TreeCareService
 from app.services.streak_service import StreakService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.challenge_service import ChallengeService
+from app.services.species_catalog import species_catalog
+from app.services.geo_index import GeoIndexService
+from app.services.map_clusters import LAYERS, MapClusterService
+from app.services.tree_growth import TreeGrowthService
+from app.services.watering_history import WateringHistoryService
 
 router = APIRouter()
 
@@ -24,7 +35,8 @@ def plant_tree(
 ):
     """Plant a new tree and start tracking it"""
     # Get species info for watering schedule
-    species = db.query(TreeSpecies).filter(TreeSpecies.id == tree_data.species_id).first()
+    species_catalog.ensure_loaded(db)
+    species = species_catalog.get(tree_data.species_id)
     if not species:
         raise HTTPException(status_code=404, detail="Tree species not found")
     
@@ -46,16 +58,49 @@ def plant_tree(
     
     # Update user stats
     current_user.total_trees_planted += 1
+    TreeCareService(db).invalidate_stats(current_user.id)
     
     # Update streak
     streak_service = StreakService(db)
     streak_service.update_planting_streak(current_user.id)
     
+    ChallengeService(db).record_event(
+        current_user.id,
+        "trees_planted",
+        attributes={"native_species": bool(species.is_native)}
+    )
+    
     db.commit()
     db.refresh(db_tree)
     
+    LeaderboardService(db).sync_user(current_user.id)
+    
     return db_tree
 
+@router.post("/plant/bulk", response_model=UserTreeBulkResult)
+def plant_trees_bulk(
+    bulk_data: UserTreeBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Plant many trees at once (school and community events)"""
+    species_catalog.ensure_loaded(db)
+    unknown = sorted({tree.species_id for tree in bulk_data.trees if species_catalog.get(tree.species_id) is None})
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Tree species not found: {unknown}")
+    
+    result = TreeCareService(db).plant_trees(current_user.id, bulk_data.trees)
+    
+    LeaderboardService(db).sync_user(current_user.id)
+    
+    db.refresh(current_user)
+    return UserTreeBulkResult(
+        planted=len(result["tree_ids"]),
+        tree_ids=result["tree_ids"],
+        points_awarded=result["points_awarded"],
+        current_streak=current_user.current_streak or 0
+    )
+
 @router.get("/my-trees", response_model=List[UserTreeSchema])
 def get_my_trees(
     current_user: User = Depends(get_current_user),
@@ -70,8 +115,9 @@ def get_my_trees(
     trees = query.all()
     
     # Add species information
+    species_catalog.ensure_loaded(db)
     for tree in trees:
-        tree.species = db.query(TreeSpecies).filter(TreeSpecies.id == tree.species_id).first()
+        tree.species = species_catalog.get(tree.species_id)
     
     return trees
 
@@ -92,8 +138,9 @@ def get_care_calendar(
     
     now = datetime.utcnow()
     
+    species_catalog.ensure_loaded(db)
     for tree in trees:
-        species = db.query(TreeSpecies).filter(TreeSpecies.id == tree.species_id).first()
+        species = species_catalog.get(tree.species_id)
         days_overdue = 0
         
         if tree.next_watering_due and tree.next_watering_due <= now:
@@ -139,20 +186,23 @@ def water_tree(
     if not tree:
         raise HTTPException(status_code=404, detail="Tree not found")
     
-    species = db.query(TreeSpecies).filter(TreeSpecies.id == tree.species_id).first()
+    species_catalog.ensure_loaded(db)
+    species = species_catalog.get(tree.species_id)
     
     # Create watering log
+    now = datetime.utcnow()
     watering_log = WateringLog(
         user_tree_id=tree.id,
         user_id=current_user.id,
+        watered_at=now,
         amount=watering_data.amount,
         method=watering_data.method,
         notes=watering_data.notes
     )
     db.add(watering_log)
+    WateringHistoryService(db).add_to_rollup(current_user.id, tree.id, now, watering_data.amount)
     
     # Update tree
-    now = datetime.utcnow()
     tree.last_watered = now
     tree.next_watering_due = now + timedelta(days=species.watering_frequency)
     tree.total_waterings += 1
@@ -162,9 +212,17 @@ def water_tree(
         tree.watering_streak += 1
     else:
         tree.watering_streak = 1
+    TreeCareService(db).invalidate_stats(current_user.id)
+    
+    challenge_service = ChallengeService(db)
+    completed = challenge_service.record_event(current_user.id, "trees_watered")
+    completed += challenge_service.record_event(current_user.id, "watering_streak", tree.watering_streak)
     
     db.commit()
     
+    if completed:
+        LeaderboardService(db).sync_user(current_user.id)
+    
     return {
         "message": "Tree watered successfully",
         "streak": tree.watering_streak,
@@ -177,45 +235,104 @@ def get_tree_species(
     region: Optional[str] = Query(None)
 ):
     """Get available tree species with regional data"""
-    species = db.query(TreeSpecies).all()
+    species_catalog.ensure_loaded(db)
+    
+    # Serialized once per region by the catalog, returned as-is
+    return Response(content=species_catalog.species_json(region), media_type="application/json")
+
+@router.get("/nearby", response_model=List[dict])
+def get_nearby_trees(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=50),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get active trees around a point, closest first"""
+    species_catalog.ensure_loaded(db)
+    nearby = GeoIndexService(db).nearby(UserTree, lat, lon, radius_km, UserTree.is_active == True, limit=limit)
     
     result = []
-    for s in species:
-        species_data = {
-            "id": s.id,
-            "name": s.name,
-            "scientific_name": s.scientific_name,
-            "local_name": s.local_name,
-            "growth_rate": s.growth_rate,
-            "mature_height": s.mature_height,
-            "water_requirements": s.water_requirements,
-            "watering_frequency": s.watering_frequency,
-            "benefits": {
-                "timber_value": s.timber_value,
-                "fruit_bearing": s.fruit_bearing,
-                "medicinal_uses": s.medicinal_uses,
-                "erosion_control": s.erosion_control
-            }
-        }
-        
-        # Add regional survival rates
-        if region:
-            survival_rate = getattr(s, f"survival_rate_{region.lower()}", None)
-            species_data["survival_rate"] = survival_rate
-        else:
-            species_data["regional_survival"] = {
-                "coast": s.survival_rate_coast,
-                "central": s.survival_rate_central,
-                "western": s.survival_rate_western,
-                "eastern": s.survival_rate_eastern,
-                "northern": s.survival_rate_northern,
-                "rift_valley": s.survival_rate_rift_valley
-            }
-        
-        result.append(species_data)
+    for tree, distance in nearby:
+        species = species_catalog.get(tree.species_id)
+        result.append({
+            "id": tree.id,
+            "species_id": tree.species_id,
+            "species_name": species.name if species else None,
+            "latitude": tree.latitude,
+            "longitude": tree.longitude,
+            "distance_km": round(distance, 3),
+            "planting_date": tree.planting_date,
+            "health_status": tree.health_status,
+            "is_mine": tree.user_id == current_user.id
+        })
     
     return result
 
+@router.get("/map")
+def get_map_clusters(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=22),
+    layer: str = Query("trees"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get pre-aggregated tree or activity clusters for a map viewport"""
+    if layer not in LAYERS:
+        raise HTTPException(status_code=400, detail=f"Unknown layer, use one of: {', '.join(LAYERS)}")
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="Viewport must have south <= north and west <= east")
+    
+    return MapClusterService(db).clusters(layer, (south, west, north, east), zoom)
+
+@router.get("/species/{species_id}/growth-curve", response_model=GrowthCurve)
+def get_species_growth_curve(
+    species_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the average height and girth of a species' trees by age, from everyone's measurements"""
+    rows = TreeGrowthService(db).growth_curve(species_id)
+    
+    return GrowthCurve(
+        species_id=species_id,
+        bucket_days=rows[0].bucket_days if rows else settings.GROWTH_CURVE_BUCKET_DAYS,
+        computed_at=rows[0].computed_at if rows else None,
+        points=[
+            GrowthCurvePoint(
+                age_days=row.age_bucket * row.bucket_days,
+                tree_count=row.tree_count,
+                mean_height=row.mean_height,
+                std_height=row.std_height,
+                girth_tree_count=row.girth_tree_count,
+                mean_girth=row.mean_girth,
+                std_girth=row.std_girth
+            )
+            for row in rows
+        ]
+    )
+
+@router.get("/waterings/daily", response_model=List[WateringDay])
+def get_daily_waterings(
+    start: Optional[date] = Query(None, description="Defaults to 30 days ago"),
+    end: Optional[date] = Query(None, description="Defaults to today"),
+    tree_id: Optional[int] = Query(None, description="Only this tree"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the user's waterings per day"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="At most a year of days at once")
+    
+    return WateringHistoryService(db).daily(current_user.id, start, end, tree_id)
+
 @router.get("/stats", response_model=TreeCareStats)
 def get_tree_stats(
     current_user: User = Depends(get_current_user),
@@ -225,6 +342,84 @@ def get_tree_stats(
     tree_service = TreeCareService(db)
     return tree_service.get_user_stats(current_user.id)
 
+@router.post("/{tree_id}/measurements", response_model=UserTreeSchema)
+def record_measurement(
+    tree_id: int,
+    measurement: TreeMeasurementCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Record a height, girth and/or health reading for a tree"""
+    tree = db.query(UserTree).filter(
+        UserTree.id == tree_id,
+        UserTree.user_id == current_user.id
+    ).first()
+    
+    if not tree:
+        raise HTTPException(status_code=404, detail="Tree not found")
+    if measurement.height is None and measurement.girth is None and measurement.health_status is None:
+        raise HTTPException(status_code=400, detail="Give at least one of height, girth or health_status")
+    if measurement.measured_at and measurement.measured_at.replace(tzinfo=None) > datetime.utcnow() + timedelta(days=1):
+        raise HTTPException(status_code=400, detail="measured_at is in the future")
+    
+    TreeGrowthService(db).record(tree, [measurement.dict()])
+    TreeCareService(db).invalidate_stats(current_user.id)
+    
+    db.commit()
+    db.refresh(tree)
+    
+    return tree
+
+@router.get("/{tree_id}/measurements", response_model=TreeMeasurementSeries)
+def get_measurements(
+    tree_id: int,
+    start: Optional[datetime] = Query(None, description="Defaults to the planting date"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    points: int = Query(200, ge=1, le=2000, description="Most points returned, readings are averaged down to fit"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a tree's growth and health history"""
+    tree = db.query(UserTree).filter(
+        UserTree.id == tree_id,
+        UserTree.user_id == current_user.id
+    ).first()
+    
+    if not tree:
+        raise HTTPException(status_code=404, detail="Tree not found")
+    
+    start = (start or tree.planting_date).replace(tzinfo=None)
+    end = (end or datetime.utcnow()).replace(tzinfo=None)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    return TreeGrowthService(db).series(tree.id, start, end, points)
+
+@router.get("/{tree_id}/waterings", response_model=List[WateringLogSchema])
+def get_tree_waterings(
+    tree_id: int,
+    start: Optional[datetime] = Query(None, description="Defaults to the planting date"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a tree's watering logs, newest first, including archived ones"""
+    tree = db.query(UserTree).filter(
+        UserTree.id == tree_id,
+        UserTree.user_id == current_user.id
+    ).first()
+    
+    if not tree:
+        raise HTTPException(status_code=404, detail="Tree not found")
+    
+    start = (start or tree.planting_date).replace(tzinfo=None)
+    end = (end or datetime.utcnow()).replace(tzinfo=None)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    return WateringHistoryService(db).logs(tree.id, start, end, limit)
+
 @router.put("/{tree_id}", response_model=UserTreeSchema)
 def update_tree(
     tree_id: int,
@@ -245,6 +440,13 @@ def update_tree(
     for field, value in update_data.items():
         setattr(tree, field, value)
     
+    # Height and health edits are also kept as a reading, not only overwritten
+    TreeGrowthService(db).record(tree, [{
+        "height": update_data.get("height"),
+        "health_status": update_data.get("health_status")
+    }])
+    TreeCareService(db).invalidate_stats(current_user.id)
+    
     db.commit()
     db.refresh(tree)
     
@@ -266,6 +468,7 @@ def delete_tree(
         raise HTTPException(status_code=404, detail="Tree not found")
     
     tree.is_active = False
+    TreeCareService(db).invalidate_stats(current_user.id)
     db.commit()
     
     return {"message": "Tree removed from tracking"}
\ No newline at end of file
@@ -0,0 +1,48 @@
+import logging
+import time
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# How often a process compares its cached catalog with the current stamp
+CATALOG_VERSION_CHECK_SECONDS = 30
+
+class CatalogVersion:
+    """Version stamp of a table cached per process: a Redis counter and the table's row count and max id"""
+    
+    # bump() moves the Redis counter so every process reloads after an edit, the SQL half of the
+    # stamp catches rows added out of band (or anywhere, when Redis is not available).
+    
+    def __init__(self, name: str, model, check_seconds: float = CATALOG_VERSION_CHECK_SECONDS):
+        self.key = f"{name}:catalog:version"
+        self.model = model
+        self.check_seconds = check_seconds
+        self._checked_at = 0.0
+    
+    def due(self) -> bool:
+        """True when the stamp has not been read for check_seconds"""
+        return time.monotonic() - self._checked_at >= self.check_seconds
+    
+    def current(self, db: Session) -> str:
+        bumped = "0"
+        client = get_redis()
+        if client is not None:
+            try:
+                bumped = client.get(self.key) or "0"
+            except Exception as e:
+                logger.warning(f"Catalog version read failed for {self.key}: {e}")
+        
+        count, max_id = db.query(func.count(self.model.id), func.max(self.model.id)).one()
+        self._checked_at = time.monotonic()
+        return f"{bumped}:{count}:{max_id}"
+    
+    def bump(self):
+        """Tell every process to reload, call after changing the table"""
+        client = get_redis()
+        if client is not None:
+            try:
+                client.incr(self.key)
+            except Exception as e:
+                logger.warning(f"Catalog version bump failed for {self.key}: {e}")
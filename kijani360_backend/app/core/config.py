@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -30,14 +30,67 @@ class Settings(BaseSettings):
     # File uploads
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "static/uploads")
+    UPLOAD_URL: str = os.getenv("UPLOAD_URL", "/static/uploads")  # Where UPLOAD_DIR is served from
+    IMAGE_VARIANT_WIDTHS: List[int] = [320, 640, 1280]  # WebP variants, only those narrower than the original
+    IMAGE_WORKERS: int = 2  # Processes decoding and resizing uploaded images
+    IMAGE_MAX_PIXELS: int = 40_000_000  # Larger images are refused rather than decoded
     
     # Notifications
     ENABLE_PUSH_NOTIFICATIONS: bool = True
     ENABLE_EMAIL_NOTIFICATIONS: bool = True
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: int = 25  # Keep-alive interval for SSE/WebSocket streams
+    NOTIFICATION_COUNTER_RECONCILE_SECONDS: int = 60 * 60  # How often counters are rebuilt from notifications
+    WATERING_REMINDER_INTERVAL_MINUTES: int = 15  # Scheduler run interval, reminders go out at most this late
+    WATERING_REMINDER_CATCHUP_HOURS: int = 3  # Still send reminders whose time passed this recently (missed runs)
+    NOTIFICATION_COALESCE_WINDOW_MINUTES: int = 6 * 60  # Unread notifications keep absorbing events this long after the last one
+    NOTIFICATION_DIGEST_INTERVAL_MINUTES: int = 60  # How often finished days are sent as digests
+    NOTIFICATION_RETENTION_DAYS: int = 180  # Monthly partitions entirely older than this are dropped
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = 5000  # Rows per DELETE where partitions cannot be dropped
+    NOTIFICATION_PARTITIONS_AHEAD: int = 2  # Future monthly partitions kept ready
+    NOTIFICATION_PARTITION_MAINTENANCE_SECONDS: int = 60 * 60
+    NOTIFICATION_LIST_MONTHS: int = 3  # Notification listings only read this many recent monthly partitions
+    
+    # Watering schedule
+    WATERING_SCHEDULE_INTERVAL_HOURS: int = 24  # Due dates are recomputed for all active trees this often
+    WATERING_SCHEDULE_CHUNK_SIZE: int = 50000  # Trees loaded, computed and written back at a time
+    WATERING_WEATHER_GRID_DEGREES: float = 0.25  # Trees in the same grid cell share rainfall
+    WATERING_FORECAST_GRID_DEGREES: float = 1.0  # Rain forecasts are fetched per cell of this coarser grid
+    OPENWEATHER_REQUESTS_PER_MINUTE: int = 50  # Stay under the free tier's 60 calls a minute
+    WATERING_RAIN_FORECAST_DAYS: int = 3  # Forecast rain this far ahead delays watering
+    WATERING_MAX_RAIN_DELAY_DAYS: int = 7
+    
+    # Watering history
+    WATERING_LOG_HOT_DAYS: int = 90  # Raw watering logs older than this move to the archive files, daily rollups stay
+    WATERING_ARCHIVE_DIR: str = os.getenv("WATERING_ARCHIVE_DIR", "archive/watering_logs")
+    WATERING_ARCHIVE_SHARDS: int = 64  # Archive files per month, by tree id
+    WATERING_ARCHIVE_INTERVAL_HOURS: int = 24
+    WATERING_ARCHIVE_BATCH_SIZE: int = 50000  # Logs archived and deleted per transaction
+    
+    # Tree growth
+    GROWTH_CURVE_INTERVAL_HOURS: int = 24  # Species growth curves are recomputed from all measurements this often
+    GROWTH_CURVE_BUCKET_DAYS: int = 30  # Age resolution of growth curves
+    GROWTH_CURVE_MAX_AGE_YEARS: int = 30  # Readings of older trees are left out of the curves
+    GROWTH_CURVE_BATCH_SIZE: int = 5000  # Trees whose measurements are aggregated at a time
+    
+    # Map clusters
+    MAP_CLUSTER_MAX_PRECISION: int = 7  # Finest precomputed geohash level, cells of about 150m
+    MAP_CLUSTER_MAX_CELLS: int = 256  # Most clusters in one response, coarser levels are used for big viewports
+    MAP_CLUSTER_POINT_LIMIT: int = 200  # At the finest level, viewports with this few points get the points instead
+    MAP_CLUSTER_REFRESH_SECONDS: int = 5 * 60
+    
+    # Background jobs
+    JOB_QUEUE_BACKEND: str = os.getenv("JOB_QUEUE_BACKEND", "auto")  # auto (Redis when reachable) or local
+    JOB_QUEUE_CONCURRENCY: Dict[str, int] = {"default": 2, "notifications": 4, "push": 2}  # Batches run at once per queue
+    JOB_QUEUE_POLL_SECONDS: float = 2.0
     
     # Gamification
     ENABLE_ACHIEVEMENTS: bool = True
     ENABLE_LEADERBOARDS: bool = True
+    COLLABORATIVE_STREAK_COUNTER_SHARDS: int = 16  # Counter rows per group total
+    LEADERBOARD_BUCKET_RETENTION_DAYS: int = 7  # Keep weekly/monthly buckets this long after they close
+    TREE_STATS_SNAPSHOT_SECONDS: int = 60 * 60  # Tree care stats snapshots are recomputed at least this often (rolling watering windows)
+    POINTS_LEDGER_SETTLE_SECONDS: int = 60  # Only compact ledger entries older than this
+    POINTS_LEDGER_GAP_HOURS: int = 24  # Ids skipped by compaction are watched this long for a late commit
     
     # Development Settings
     DEBUG: bool = False
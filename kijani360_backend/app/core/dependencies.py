@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -32,13 +33,26 @@ def get_current_user(
             )
         
         return user
-        
+    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
 
+def get_user_from_token(token: str, db: Session) -> Optional[User]:
+    """Resolve a raw JWT (e.g. from a query parameter) to an active user, or None"""
+    try:
+        user_id = verify_token(token).get("sub")
+    except HTTPException:
+        return None
+    
+    if user_id is None:
+        return None
+    
+    user = db.query(User).filter(User.id == int(user_id)).first()
+    return user if user and user.is_active else None
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user"""
     if not current_user.is_active:
@@ -0,0 +1,127 @@
+import math
+from typing import List, Optional, Tuple
+from sqlalchemy import event, inspect
+
+# Stored geohash length, 9 characters is a cell of about 5m x 5m
+GEOHASH_PRECISION = 9
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Most cells a query covers, lower precision (bigger cells) is used until the area fits
+MAX_COVER_CELLS = 32
+
+# (south, west, north, east) in degrees
+Bounds = Tuple[float, float, float, float]
+
+def coordinate(value) -> Optional[float]:
+    """Float from a Float or String coordinate column, None when missing or unparseable"""
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+def _bits(precision: int) -> Tuple[int, int]:
+    """(latitude bits, longitude bits) of a geohash, longitude takes the extra odd bit"""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+def _index(value: float, low: float, span: float, bits: int) -> int:
+    return min(max(int((value - low) / span * (1 << bits)), 0), (1 << bits) - 1)
+
+def _cell(lat_index: int, lon_index: int, precision: int) -> str:
+    lat_bits, lon_bits = _bits(precision)
+    code = 0
+    for bit in range(5 * precision):
+        # Bits alternate starting with longitude, most significant first
+        if bit % 2 == 0:
+            lon_bits -= 1
+            code = (code << 1) | ((lon_index >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            code = (code << 1) | ((lat_index >> lat_bits) & 1)
+    return "".join(BASE32[(code >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+def encode(lat, lon, precision: int = GEOHASH_PRECISION) -> Optional[str]:
+    """Geohash of a point, None when either coordinate is missing or out of range"""
+    lat, lon = coordinate(lat), coordinate(lon)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    lat_bits, lon_bits = _bits(precision)
+    return _cell(_index(lat, -90, 180, lat_bits), _index(lon, -180, 360, lon_bits), precision)
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_bounds(lat: float, lon: float, radius_km: float) -> Bounds:
+    """Bounding box of a circle, clamped to valid coordinates"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return max(lat - dlat, -90), max(lon - dlon, -180), min(lat + dlat, 90), min(lon + dlon, 180)
+
+def _ranges(bounds: Bounds, precision: int) -> Tuple[range, range]:
+    """Latitude and longitude cell indexes a bounding box spans"""
+    south, west, north, east = bounds
+    lat_bits, lon_bits = _bits(precision)
+    return (
+        range(_index(south, -90, 180, lat_bits), _index(north, -90, 180, lat_bits) + 1),
+        range(_index(west, -180, 360, lon_bits), _index(east, -180, 360, lon_bits) + 1)
+    )
+
+def cell_count(bounds: Bounds, precision: int) -> int:
+    """Number of geohash cells of this precision a bounding box touches"""
+    lat_range, lon_range = _ranges(bounds, precision)
+    return len(lat_range) * len(lon_range)
+
+def cell_width(precision: int) -> float:
+    """Longitude span of a geohash cell in degrees"""
+    return 360 / (1 << _bits(precision)[1])
+
+def cell_bounds(cell: str) -> Bounds:
+    """(south, west, north, east) of a geohash cell"""
+    code = 0
+    for char in cell:
+        code = (code << 5) | BASE32.index(char)
+    lat_bits, lon_bits = _bits(len(cell))
+    lat_index = lon_index = 0
+    for bit in range(5 * len(cell) - 1, -1, -1):
+        # Counting down from the most significant bit, even positions from the top are longitude
+        if (5 * len(cell) - 1 - bit) % 2 == 0:
+            lon_index = (lon_index << 1) | ((code >> bit) & 1)
+        else:
+            lat_index = (lat_index << 1) | ((code >> bit) & 1)
+    lat_size, lon_size = 180 / (1 << lat_bits), 360 / (1 << lon_bits)
+    south, west = -90 + lat_index * lat_size, -180 + lon_index * lon_size
+    return south, west, south + lat_size, west + lon_size
+
+def cover(bounds: Bounds) -> List[str]:
+    """Geohash prefixes whose cells together cover a bounding box, at most MAX_COVER_CELLS of them"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if cell_count(bounds, precision) <= MAX_COVER_CELLS or precision == 1:
+            lat_range, lon_range = _ranges(bounds, precision)
+            return sorted(_cell(i, j, precision) for i in lat_range for j in lon_range)
+    return []
+
+def geohash_default(lat_column: str = "latitude", lon_column: str = "longitude"):
+    """Column default computing the geohash from the inserted coordinates, applies to bulk inserts too"""
+    def default(context):
+        parameters = context.get_current_parameters()
+        return encode(parameters.get(lat_column), parameters.get(lon_column))
+    return default
+
+def track_geohash(model, lat_column: str = "latitude", lon_column: str = "longitude"):
+    """Keep model.geohash in step when an ORM update changes the coordinates"""
+    @event.listens_for(model, "before_update")
+    def update_geohash(mapper, connection, target):
+        attrs = inspect(target).attrs
+        if attrs[lat_column].history.has_changes() or attrs[lon_column].history.has_changes():
+            target.geohash = encode(getattr(target, lat_column), getattr(target, lon_column))
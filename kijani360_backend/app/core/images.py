@@ -0,0 +1,70 @@
+import os
+from typing import Any, Dict, List
+from PIL import Image, ImageOps
+
+# Formats accepted as uploads -> (extension, content type)
+FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+}
+
+WEBP_QUALITY = 80
+
+def render_variants(source: str, directory: str, stem: str, widths: List[int], max_pixels: int) -> Dict[str, Any]:
+    """Move an uploaded image into place and write its WebP variants, runs in a worker process"""
+    # Only Pillow and the standard library here, worker processes import this module on their own
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        image = Image.open(source)
+        image_format = image.format
+    except Image.DecompressionBombError:
+        raise ValueError("Image has too many pixels")
+    except OSError:
+        raise ValueError("Not a readable image")
+    if image_format not in FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    
+    # open() reads the header only, truncated or corrupt data fails while decoding (PNG reads its EXIF then too)
+    try:
+        width, height = image.size
+        if image.getexif().get(ImageOps.ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        
+        # Variants narrower than the original only, or a single one at its own width
+        targets = sorted({w for w in widths if w < width}) or [width]
+        if image_format == "JPEG":
+            # Decode at the smallest JPEG scale still covering the widest variant, in either orientation
+            image.draft("RGB", (targets[-1], targets[-1]))
+        image.load()
+    except OSError:
+        image.close()
+        raise ValueError("Image data is truncated or corrupt")
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    
+    os.makedirs(directory, exist_ok=True)
+    variants = {}
+    for target in targets:
+        name = f"{stem}_{target}.webp"
+        resized = image if target >= image.width else image.resize(
+            (target, max(1, round(image.height * target / image.width))), Image.LANCZOS
+        )
+        # Written aside and renamed, a concurrent upload of the same content never sees half a file
+        partial = os.path.join(directory, name + ".part")
+        resized.save(partial, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(partial, os.path.join(directory, name))
+        variants[str(target)] = name
+    image.close()
+    
+    extension, content_type = FORMATS[image_format]
+    original = f"{stem}.{extension}"
+    os.replace(source, os.path.join(directory, original))
+    return {
+        "original": original,
+        "content_type": content_type,
+        "width": width,
+        "height": height,
+        "variants": variants,
+    }
@@ -0,0 +1,434 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Modules whose @job handlers must be registered before jobs run
+JOB_MODULES = (
+    "app.services.notification_service",
+    "app.services.notification_counters",
+    "app.services.notification_digest",
+    "app.services.notification_partitions",
+    "app.services.watering_schedule",
+    "app.services.map_clusters",
+    "app.services.tree_growth",
+    "app.services.watering_history",
+)
+
+# Redis keys, {queue} is a queue name such as "notifications"
+READY_KEY = "jobs:{queue}"
+DELAYED_KEY = "jobs:{queue}:delayed"
+DEAD_KEY = "jobs:{queue}:dead"
+PROCESSING_KEY = "jobs:{queue}:processing:{consumer}"
+WORKER_KEY = "jobs:workers:{worker}"
+SCHEDULE_KEY = "jobs:schedule:{name}"
+
+WORKER_HEARTBEAT_TTL = 60
+SCHEDULER_TICK_SECONDS = 10
+DEAD_LETTER_LIMIT = 10000
+
+class JobSpec(NamedTuple):
+    name: str
+    handler: Callable
+    queue: str
+    max_retries: int
+    backoff_seconds: float
+    batch_size: int
+    every_seconds: Optional[float]
+
+_registry: Dict[str, JobSpec] = {}
+
+def job(
+    name: str,
+    queue: str = "default",
+    max_retries: int = 3,
+    backoff_seconds: float = 5.0,
+    batch_size: int = 1,
+    every_seconds: Optional[float] = None
+):
+    """Register handler(db, payloads) for a job name, payloads is a list of up to batch_size job payloads"""
+    # Jobs with every_seconds are also enqueued, with an empty payload, on that interval
+    def decorator(handler: Callable) -> Callable:
+        _registry[name] = JobSpec(name, handler, queue, max_retries, backoff_seconds, batch_size, every_seconds)
+        return handler
+    return decorator
+
+def load_job_modules():
+    """Import every module that registers job handlers"""
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+def queue_concurrency(queue: str) -> int:
+    return max(1, settings.JOB_QUEUE_CONCURRENCY.get(queue, 1))
+
+def run_batch(spec: JobSpec, envelopes: List[Dict[str, Any]]):
+    """Run one handler call in its own session, raises if the handler fails"""
+    from app.database.session import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        spec.handler(db, [envelope["payload"] for envelope in envelopes])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _new_envelope(name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": uuid.uuid4().hex,
+        "name": name,
+        "payload": payload,
+        "attempts": 0,
+        "enqueued_at": time.time()
+    }
+
+def _batches(envelopes: List[Dict[str, Any]]):
+    """Group claimed jobs into (spec, envelopes) handler calls, unknown jobs get spec None"""
+    by_name: Dict[str, List[Dict[str, Any]]] = {}
+    for envelope in envelopes:
+        by_name.setdefault(envelope["name"], []).append(envelope)
+    
+    for name, group in by_name.items():
+        spec = _registry.get(name)
+        if spec is None:
+            yield None, group
+            continue
+        for i in range(0, len(group), spec.batch_size):
+            yield spec, group[i:i + spec.batch_size]
+
+def _queue_batch_size(queue: str) -> int:
+    return max([spec.batch_size for spec in _registry.values() if spec.queue == queue] or [1])
+
+def _scheduled_specs() -> List[JobSpec]:
+    return [spec for spec in _registry.values() if spec.every_seconds]
+
+def _retry_delay(spec: JobSpec, attempts: int) -> float:
+    """Exponential backoff, attempts counts the failed runs so far"""
+    return spec.backoff_seconds * (2 ** (attempts - 1))
+
+class RedisJobBackend:
+    """Durable queues in Redis: a ready list, a delayed sorted set and a dead-letter list per queue"""
+    
+    def __init__(self, client):
+        self.redis = client
+    
+    def push(self, queue: str, envelope: Dict[str, Any], delay: float = 0):
+        data = json.dumps(envelope)
+        if delay > 0:
+            self.redis.zadd(DELAYED_KEY.format(queue=queue), {data: time.time() + delay})
+        else:
+            self.redis.lpush(READY_KEY.format(queue=queue), data)
+    
+    def promote_due(self, queue: str, limit: int = 500) -> int:
+        """Move delayed jobs that are due onto the ready list"""
+        delayed_key = DELAYED_KEY.format(queue=queue)
+        promoted = 0
+        for data in self.redis.zrangebyscore(delayed_key, "-inf", time.time(), start=0, num=limit):
+            # Only the consumer whose ZREM succeeds moves the job
+            if self.redis.zrem(delayed_key, data):
+                self.redis.lpush(READY_KEY.format(queue=queue), data)
+                promoted += 1
+        return promoted
+    
+    def claim(self, queue: str, processing_key: str, limit: int, timeout: float) -> List[str]:
+        """Atomically move up to limit jobs onto this consumer's processing list"""
+        ready_key = READY_KEY.format(queue=queue)
+        first = self.redis.blmove(ready_key, processing_key, timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        
+        claimed = [first]
+        while len(claimed) < limit:
+            data = self.redis.lmove(ready_key, processing_key, "RIGHT", "LEFT")
+            if data is None:
+                break
+            claimed.append(data)
+        return claimed
+    
+    def claim_schedule(self, spec: JobSpec) -> bool:
+        """True for exactly one caller per interval across all workers"""
+        return bool(self.redis.set(
+            SCHEDULE_KEY.format(name=spec.name),
+            int(time.time()),
+            nx=True,
+            ex=max(1, int(spec.every_seconds))
+        ))
+    
+    def acknowledge(self, processing_key: str, data: str):
+        self.redis.lrem(processing_key, 1, data)
+    
+    def dead_letter(self, queue: str, envelope: Dict[str, Any]):
+        dead_key = DEAD_KEY.format(queue=queue)
+        self.redis.lpush(dead_key, json.dumps(envelope))
+        self.redis.ltrim(dead_key, 0, DEAD_LETTER_LIMIT - 1)
+    
+    def recover_orphans(self) -> int:
+        """Requeue jobs claimed by workers whose heartbeat has expired"""
+        recovered = 0
+        for processing_key in self.redis.scan_iter(match=PROCESSING_KEY.format(queue="*", consumer="*")):
+            # jobs:{queue}:processing:{host}:{pid}:{n}
+            parts = processing_key.split(":")
+            queue, worker_id = parts[1], ":".join(parts[3:-1])
+            if self.redis.exists(WORKER_KEY.format(worker=worker_id)):
+                continue
+            
+            ready_key = READY_KEY.format(queue=queue)
+            while self.redis.lmove(processing_key, ready_key, "RIGHT", "RIGHT") is not None:
+                recovered += 1
+        return recovered
+
+class LocalJobBackend:
+    """In-process asyncio queues, used when Redis is not available, jobs do not survive a restart"""
+    
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.tasks: List[asyncio.Task] = []
+        self.dead: deque = deque(maxlen=DEAD_LETTER_LIMIT)
+    
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        for queue in settings.JOB_QUEUE_CONCURRENCY:
+            self._ensure_queue(queue)
+        self.tasks.append(self.loop.create_task(self._schedule()))
+    
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queues = {}
+        self.loop = None
+    
+    def push(self, queue: str, envelope: Dict[str, Any], delay: float = 0):
+        if self.loop is None:
+            # Not running inside the API (scripts, shells), run the job right away
+            self._run_inline(envelope)
+            return
+        self.loop.call_soon_threadsafe(self._put, queue, envelope, delay)
+    
+    def _put(self, queue: str, envelope: Dict[str, Any], delay: float = 0):
+        if self.loop is None:
+            return
+        if delay > 0:
+            self.loop.call_later(delay, self._put, queue, envelope)
+        else:
+            self._ensure_queue(queue).put_nowait(envelope)
+    
+    def _ensure_queue(self, queue: str) -> asyncio.Queue:
+        if queue not in self.queues:
+            self.queues[queue] = asyncio.Queue()
+            # One consumer per concurrency slot caps how many batches of this queue run at once
+            for _ in range(queue_concurrency(queue)):
+                self.tasks.append(self.loop.create_task(self._consume(queue)))
+        return self.queues[queue]
+    
+    async def _schedule(self):
+        """Enqueue periodic jobs, first runs one interval after startup"""
+        last_run = {spec.name: time.time() for spec in _scheduled_specs()}
+        while True:
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+            now = time.time()
+            for spec in _scheduled_specs():
+                if now - last_run.get(spec.name, now) >= spec.every_seconds:
+                    last_run[spec.name] = now
+                    self._put(spec.queue, _new_envelope(spec.name, {}))
+                last_run.setdefault(spec.name, now)
+    
+    async def _consume(self, queue: str):
+        pending = self.queues[queue]
+        while True:
+            envelopes = [await pending.get()]
+            limit = _queue_batch_size(queue)
+            while len(envelopes) < limit and not pending.empty():
+                envelopes.append(pending.get_nowait())
+            
+            for spec, batch in _batches(envelopes):
+                if spec is None:
+                    self._fail(queue, None, batch, "no handler registered")
+                    continue
+                try:
+                    await asyncio.to_thread(run_batch, spec, batch)
+                except Exception as e:
+                    self._fail(queue, spec, batch, e)
+    
+    def _fail(self, queue: str, spec: Optional[JobSpec], envelopes: List[Dict[str, Any]], error):
+        for envelope in envelopes:
+            envelope["attempts"] += 1
+            envelope["error"] = str(error)
+            if spec is not None and envelope["attempts"] <= spec.max_retries:
+                self._put(queue, envelope, _retry_delay(spec, envelope["attempts"]))
+            else:
+                logger.error(f"Job {envelope['name']} ({envelope['id']}) dead-lettered: {error}")
+                self.dead.append(envelope)
+    
+    def _run_inline(self, envelope: Dict[str, Any]):
+        spec = _registry[envelope["name"]]
+        try:
+            run_batch(spec, [envelope])
+        except Exception as e:
+            logger.error(f"Job {envelope['name']} ({envelope['id']}) failed: {e}")
+
+class JobQueue:
+    """Enqueue side effects to run outside the request, on Redis workers or in-process"""
+    
+    def __init__(self):
+        self._backend = None
+        self._local = LocalJobBackend()
+    
+    @property
+    def backend(self):
+        if self._backend is None:
+            client = get_redis() if settings.JOB_QUEUE_BACKEND != "local" else None
+            self._backend = RedisJobBackend(client) if client is not None else self._local
+        return self._backend
+    
+    @property
+    def is_durable(self) -> bool:
+        return isinstance(self.backend, RedisJobBackend)
+    
+    def enqueue(self, name: str, payload: Optional[Dict[str, Any]] = None, delay: float = 0) -> str:
+        """Queue a registered job, returns the job id"""
+        load_job_modules()
+        spec = _registry.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown job: {name}")
+        
+        envelope = _new_envelope(name, payload or {})
+        try:
+            self.backend.push(spec.queue, envelope, delay)
+        except Exception as e:
+            if self.backend is self._local:
+                raise
+            logger.warning(f"Redis enqueue failed, running {name} in-process: {e}")
+            self._local.push(spec.queue, envelope, delay)
+        return envelope["id"]
+    
+    async def start(self):
+        """Start in-process consumers when there is no Redis for worker processes to use"""
+        load_job_modules()
+        if not self.is_durable:
+            await self._local.start()
+    
+    async def stop(self):
+        await self._local.stop()
+
+# Global instance
+job_queue = JobQueue()
+
+class JobWorker:
+    """Worker process consuming Redis queues, see run_worker.py"""
+    
+    def __init__(self, queues: Optional[List[str]] = None, poll_seconds: Optional[float] = None):
+        load_job_modules()
+        client = get_redis()
+        if client is None:
+            raise RuntimeError("The job worker needs Redis, check REDIS_URL")
+        
+        self.backend = RedisJobBackend(client)
+        self.queues = queues or list(settings.JOB_QUEUE_CONCURRENCY)
+        self.poll_seconds = poll_seconds or settings.JOB_QUEUE_POLL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+    
+    def run(self):
+        """Consume until stop() is called, one thread per concurrency slot"""
+        self._heartbeat()
+        recovered = self.backend.recover_orphans()
+        if recovered:
+            logger.info(f"Requeued {recovered} jobs from stopped workers")
+        
+        threads = []
+        for queue in self.queues:
+            for slot in range(queue_concurrency(queue)):
+                thread = threading.Thread(
+                    target=self._consume,
+                    args=(queue, PROCESSING_KEY.format(queue=queue, consumer=f"{self.worker_id}:{slot}")),
+                    name=f"job-{queue}-{slot}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        
+        self._schedule()
+        while not self._stopping.wait(SCHEDULER_TICK_SECONDS):
+            self._heartbeat()
+            self._schedule()
+        
+        for thread in threads:
+            thread.join()
+        self.backend.redis.delete(WORKER_KEY.format(worker=self.worker_id))
+    
+    def stop(self):
+        self._stopping.set()
+    
+    def _heartbeat(self):
+        self.backend.redis.set(WORKER_KEY.format(worker=self.worker_id), int(time.time()), ex=WORKER_HEARTBEAT_TTL)
+    
+    def _schedule(self):
+        """Enqueue periodic jobs whose interval has elapsed, whichever worker gets there first"""
+        for spec in _scheduled_specs():
+            try:
+                if self.backend.claim_schedule(spec):
+                    self.backend.push(spec.queue, _new_envelope(spec.name, {}))
+            except Exception as e:
+                logger.error(f"Could not schedule {spec.name}: {e}")
+    
+    def _consume(self, queue: str, processing_key: str):
+        limit = _queue_batch_size(queue)
+        while not self._stopping.is_set():
+            try:
+                self.backend.promote_due(queue)
+                claimed = self.backend.claim(queue, processing_key, limit, self.poll_seconds)
+            except Exception as e:
+                logger.error(f"Job queue {queue} unavailable: {e}")
+                self._stopping.wait(self.poll_seconds)
+                continue
+            
+            if claimed:
+                self.process(queue, processing_key, claimed)
+    
+    def process(self, queue: str, processing_key: str, claimed: List[str]):
+        """Run claimed jobs, then acknowledge, reschedule or dead-letter each one"""
+        raw_by_id = {}
+        envelopes = []
+        for data in claimed:
+            envelope = json.loads(data)
+            raw_by_id[envelope["id"]] = data
+            envelopes.append(envelope)
+        
+        for spec, batch in _batches(envelopes):
+            error = "no handler registered"
+            if spec is not None:
+                try:
+                    run_batch(spec, batch)
+                    error = None
+                except Exception as e:
+                    error = e
+            
+            for envelope in batch:
+                if error is not None:
+                    self._fail(queue, spec, envelope, error)
+                self.backend.acknowledge(processing_key, raw_by_id[envelope["id"]])
+    
+    def _fail(self, queue: str, spec: Optional[JobSpec], envelope: Dict[str, Any], error):
+        envelope["attempts"] += 1
+        envelope["error"] = str(error)
+        if spec is not None and envelope["attempts"] <= spec.max_retries:
+            self.backend.push(queue, envelope, _retry_delay(spec, envelope["attempts"]))
+        else:
+            logger.error(f"Job {envelope['name']} ({envelope['id']}) dead-lettered: {error}")
+            self.backend.dead_letter(queue, envelope)
@@ -0,0 +1,41 @@
+import logging
+import threading
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # Redis is optional, callers fall back to SQL
+    redis = None
+
+_client = None
+_checked = False
+_lock = threading.Lock()
+
+def get_redis():
+    """Get the shared Redis client, or None when Redis is not installed or not reachable"""
+    global _client, _checked
+    
+    if _checked:
+        return _client
+    
+    with _lock:
+        if _checked:
+            return _client
+        
+        if redis is not None and settings.REDIS_URL:
+            try:
+                client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=1
+                )
+                client.ping()
+                _client = client
+            except Exception as e:
+                logger.warning(f"Redis unavailable, using SQL fallbacks: {e}")
+        
+        _checked = True
+    
+    return _client
@@ -6,9 +6,12 @@ import os
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.database.session import engine, Base
+from app.core.job_queue import job_queue
+from app.services.notification_stream import notification_broker
+from app.services.media_uploads import image_pool
 
 # Import all models to ensure they're registered with SQLAlchemy
-from app.models import user, social, tree, forum, notifications, nursery
+from app.models import user, social, tree, forum, notifications, nursery, maps, media
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -22,10 +25,23 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Database initialization warning: {e}")
     
+    # Background jobs run on worker processes with Redis, in-process otherwise
+    await job_queue.start()
+    if job_queue.is_durable:
+        print("✅ Job queue: Redis (start workers with run_worker.py)")
+    else:
+        print("⚠️  Job queue: in-process fallback, Redis not available")
+    
+    # Live notification streams, fanned out across workers with Redis pub/sub
+    await notification_broker.start()
+    
     yield
     
     # Shutdown
     print("🌳 Shutting down KijaniCare360 API...")
+    await notification_broker.stop()
+    await job_queue.stop()
+    image_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index
 from datetime import datetime
 from app.database.session import Base
 
@@ -144,6 +144,46 @@ class UserAchievement(Base):
     
     earned_at = Column(DateTime, default=datetime.utcnow)
     is_displayed = Column(Boolean, default=True)
+    
+    __table_args__ = (Index('ix_user_achievements_user_achievement', 'user_id', 'achievement_id'),)
+
+class Challenge(Base):
+    """Time-boxed challenge defined as data (metric, target, window, filters)"""
+    __tablename__ = "challenges"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    icon = Column(String, nullable=True)
+    
+    # Progress rules
+    metric = Column(String, nullable=False)  # trees_planted, trees_watered, watering_streak, forum_posts, community_posts
+    progress_type = Column(String, default="count")  # count (sum of events), max (highest value seen)
+    target = Column(Integer, nullable=False)
+    period = Column(String, default="week")  # week, month
+    filters = Column(Text, nullable=True)  # JSON object matched against event attributes, e.g. {"native_species": true}
+    
+    reward_points = Column(Integer, default=50)
+    
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class UserChallengeProgress(Base):
+    """A user's progress on a challenge within one window"""
+    __tablename__ = "user_challenge_progress"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    challenge_id = Column(Integer, ForeignKey("challenges.id"), nullable=False)
+    bucket = Column(String, nullable=False)  # e.g. 2024-W07, 2024-02
+    
+    progress = Column(Integer, default=0)
+    completed_at = Column(DateTime, nullable=True)  # Set once, when the reward is credited
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Leading user_id serves the dashboard lookup
+    __table_args__ = (UniqueConstraint('user_id', 'bucket', 'challenge_id', name='unique_user_challenge_bucket'),)
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, UniqueConstraint, Index
+from datetime import datetime
+from app.database.session import Base
+
+class MapClusterCell(Base):
+    """Points of one map layer inside one geohash cell, a cluster at every precision up to the finest"""
+    __tablename__ = "map_cluster_cells"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    layer = Column(String(20), nullable=False)  # trees, activities
+    cell = Column(String(9), nullable=False)  # geohash prefix
+    precision = Column(Integer, nullable=False)  # len(cell)
+    point_count = Column(Integer, default=0, nullable=False)
+    
+    # Centroid is lat_sum / point_count, sums let parents add up their children
+    lat_sum = Column(Float, default=0.0, nullable=False)
+    lon_sum = Column(Float, default=0.0, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('layer', 'cell', name='unique_map_cluster_cell'),
+        Index('ix_map_cluster_cells_layer_precision_cell', 'layer', 'precision', 'cell'),
+    )
+
+class MapClusterDirtyCell(Base):
+    """A finest-level cell whose points changed since its clusters were last recomputed"""
+    __tablename__ = "map_cluster_dirty_cells"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    layer = Column(String(20), nullable=False)
+    cell = Column(String(9), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey
+from datetime import datetime
+from app.database.session import Base
+
+class MediaUpload(Base):
+    """An uploaded image, stored once per distinct content however many times it is uploaded"""
+    __tablename__ = "media_uploads"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)  # First uploader
+    
+    # Original file, path relative to UPLOAD_DIR
+    path = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    
+    variants = Column(JSON, nullable=True)  # WebP width -> path relative to UPLOAD_DIR
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.session import Base
@@ -16,8 +16,24 @@ class Notification(Base):
     read_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Coalescing: events sharing a group key merge into one notification ("Amina and 12 others replied")
+    group_key = Column(String(100), nullable=True)
+    actor_count = Column(Integer, default=1, server_default=text("1"))
+    updated_at = Column(DateTime, nullable=True)  # Last merge, None when never merged
+    
     # Relationships
     # user = relationship("User", back_populates="notifications")
+    
+    __table_args__ = (
+        Index('ix_notifications_user_id_id', 'user_id', 'id'),
+        # One open (unread, grouped) notification per user and group, concurrent first events cannot both insert
+        Index(
+            'ix_notifications_open_group', 'user_id', 'group_key',
+            unique=True,
+            postgresql_where=text("is_read = false AND group_key IS NOT NULL"),
+            sqlite_where=text("is_read = 0 AND group_key IS NOT NULL")
+        ),
+    )
 
 class NotificationPreference(Base):
     __tablename__ = "notification_preferences"
@@ -30,8 +46,43 @@ class NotificationPreference(Base):
     community_updates = Column(Boolean, default=True)
     push_notifications = Column(Boolean, default=True)
     email_notifications = Column(Boolean, default=True)
+    daily_digest = Column(Boolean, default=False)  # Low-priority types arrive once a day as one notification
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    # user = relationship("User", back_populates="notification_preferences")
\ No newline at end of file
+    # user = relationship("User", back_populates="notification_preferences")
+
+class NotificationCounter(Base):
+    """Per-user notification counts, kept in step with writes and reconciled periodically"""
+    __tablename__ = "notification_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    total_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class NotificationPartition(Base):
+    """One month of notifications: a real partition on Postgres, an id range on other databases"""
+    __tablename__ = "notification_partitions"
+    
+    name = Column(String(63), primary_key=True)
+    starts_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=False)
+    first_id = Column(Integer, nullable=True)  # Simulated layout: first notification id of the month, set once it starts
+    is_native = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class NotificationDigestEntry(Base):
+    """Events held back for a user's daily digest, one counting row per day and type"""
+    __tablename__ = "notification_digest_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(String(10), nullable=False)  # UTC date, YYYY-MM-DD
+    type = Column(String(50), nullable=False)
+    event_count = Column(Integer, default=0, nullable=False)
+    last_actor = Column(String(100), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('user_id', 'day', 'type', name='unique_digest_entry'),)
@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey
 from datetime import datetime
+from app.core.geo import geohash_default, track_geohash
 from app.database.session import Base
 
 class Nursery(Base):
@@ -20,6 +21,7 @@ class Nursery(Base):
     address = Column(Text, nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(9), nullable=True, default=geohash_default(), index=True)
     
     # Business details
     established_year = Column(Integer, nullable=True)
@@ -38,6 +40,8 @@ class Nursery(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+track_geohash(Nursery)
+
 class SeedlingListing(Base):
     __tablename__ = "seedling_listings"
     
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
+from app.core.geo import geohash_default, track_geohash
 from app.database.session import Base
 
 # Import existing models to avoid conflicts
@@ -68,6 +69,22 @@ class CollaborativeStreakMember(Base):
     # Ensure unique membership
     __table_args__ = (UniqueConstraint('streak_id', 'user_id', name='unique_streak_membership'),)
 
+class CollaborativeStreakCounterShard(Base):
+    """Sharded tree counter for a collaborative streak - summed on read"""
+    __tablename__ = "collaborative_streak_counter_shards"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    streak_id = Column(Integer, ForeignKey("collaborative_streaks.id"), nullable=False, index=True)
+    shard = Column(Integer, nullable=False)
+    
+    # Trees added through this shard (on top of CollaborativeStreak.total_trees_planted)
+    trees_planted = Column(Integer, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One row per (streak, shard)
+    __table_args__ = (UniqueConstraint('streak_id', 'shard', name='unique_streak_counter_shard'),)
+
 class StreakActivity(Base):
     """Track daily activities that contribute to streaks"""
     __tablename__ = "streak_activities"
@@ -85,6 +102,7 @@ class StreakActivity(Base):
     location = Column(String, nullable=True)
     latitude = Column(String, nullable=True)
     longitude = Column(String, nullable=True)
+    geohash = Column(String(9), nullable=True, default=geohash_default(), index=True)
     
     # Verification
     is_verified = Column(Boolean, default=False)
@@ -94,7 +112,39 @@ class StreakActivity(Base):
     photo_url = Column(String, nullable=True)
     description = Column(Text, nullable=True)
     
+    # Offline sync - id generated by the mobile client for idempotent retries
+    client_id = Column(String, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('user_id', 'client_id', name='unique_activity_client_id'),)
+
+track_geohash(StreakActivity)
+
+class LeaderboardPeriodScore(Base):
+    """A user's scores within one weekly or monthly leaderboard bucket"""
+    __tablename__ = "leaderboard_period_scores"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # Bucket
+    period = Column(String, nullable=False)  # week, month
+    bucket = Column(String, nullable=False)  # e.g. 2024-W07, 2024-02
+    county = Column(String, nullable=True)  # Normalized county at the latest event
+    
+    # Scores earned within the bucket
+    trees_planted = Column(Integer, default=0)
+    points = Column(Integer, default=0)
+    best_streak = Column(Integer, default=0)
+    
+    expires_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'period', 'bucket', name='unique_leaderboard_period_score'),
+        Index('ix_leaderboard_period_scores_bucket', 'period', 'bucket', 'county'),
+    )
 
 class UserPost(Base):
     """Social posts for the community feed"""
@@ -166,6 +216,7 @@ class CommunityEvent(Base):
     location = Column(String, nullable=False)
     latitude = Column(String, nullable=True)
     longitude = Column(String, nullable=True)
+    geohash = Column(String(9), nullable=True, default=geohash_default(), index=True)
     
     # Capacity and goals
     max_attendees = Column(Integer, nullable=True)
@@ -182,6 +233,8 @@ class CommunityEvent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+track_geohash(CommunityEvent)
+
 class EventAttendee(Base):
     """Event attendees"""
     __tablename__ = "event_attendees"
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Text, ForeignKey, Index, JSON, LargeBinary, UniqueConstraint
 from datetime import datetime
+from app.core.geo import geohash_default, track_geohash
 from app.database.session import Base
 
 class TreeSpecies(Base):
@@ -23,6 +24,7 @@ class TreeSpecies(Base):
     medicinal_uses = Column(Boolean, default=False)
     erosion_control = Column(Boolean, default=False)
     carbon_sequestration = Column(Float, nullable=True)  # kg CO2/year
+    is_native = Column(Boolean, default=False)  # Indigenous to Kenya
     
     # Care instructions
     watering_frequency = Column(Integer, default=3)  # days
@@ -52,6 +54,7 @@ class UserTree(Base):
     location = Column(String, nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(9), nullable=True, default=geohash_default(), index=True)
     
     # Care tracking
     last_watered = Column(DateTime, nullable=True)
@@ -69,6 +72,10 @@ class UserTree(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (Index('ix_user_trees_next_watering_due', 'next_watering_due'),)
+
+track_geohash(UserTree)
 
 class WateringLog(Base):
     __tablename__ = "watering_logs"
@@ -86,6 +93,79 @@ class WateringLog(Base):
     temperature = Column(Float, nullable=True)
     humidity = Column(Float, nullable=True)
     rainfall = Column(Float, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_watering_logs_user_watered_at', 'user_id', 'watered_at'),
+        Index('ix_watering_logs_tree_watered_at', 'user_tree_id', 'watered_at'),
+    )
+
+class WateringDailyRollup(Base):
+    """Waterings of one tree on one UTC day, kept after the raw logs move to the archive"""
+    __tablename__ = "watering_daily_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_tree_id = Column(Integer, ForeignKey("user_trees.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    
+    waterings = Column(Integer, default=0, nullable=False)
+    liters = Column(Float, default=0.0, nullable=False)  # Sum of the logged amounts
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'user_tree_id', 'day', name='unique_watering_daily_rollup'),
+        Index('ix_watering_daily_rollups_user_day', 'user_id', 'day'),
+    )
+
+class TreeMeasurementChunk(Base):
+    """A tree's measurements within one calendar month, packed as delta-encoded arrays"""
+    __tablename__ = "tree_measurement_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_tree_id = Column(Integer, ForeignKey("user_trees.id"), nullable=False)
+    month = Column(DateTime, nullable=False)  # First instant of the month (UTC)
+    
+    reading_count = Column(Integer, default=0, nullable=False)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+    
+    # zlib of time, height, girth and health arrays, see app.services.tree_growth
+    data = Column(LargeBinary, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('user_tree_id', 'month', name='unique_tree_measurement_chunk'),)
+
+class SpeciesGrowthCurve(Base):
+    """Average size of a species' trees at one age, recomputed from all measurements by a periodic job"""
+    __tablename__ = "species_growth_curves"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    species_id = Column(Integer, ForeignKey("tree_species.id"), nullable=False)
+    age_bucket = Column(Integer, nullable=False)  # Age in days // bucket_days
+    bucket_days = Column(Integer, nullable=False)
+    
+    # Each tree counts once per age bucket, with the mean of its readings in it
+    tree_count = Column(Integer, default=0, nullable=False)
+    mean_height = Column(Float, nullable=True)  # cm
+    std_height = Column(Float, nullable=True)
+    girth_tree_count = Column(Integer, default=0, nullable=False)
+    mean_girth = Column(Float, nullable=True)  # cm
+    std_girth = Column(Float, nullable=True)
+    
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('species_id', 'age_bucket', name='unique_species_growth_curve_bucket'),)
+
+class TreeCareStatsSnapshot(Base):
+    """Last computed tree care statistics of a user, cleared whenever their trees change"""
+    __tablename__ = "tree_care_stats_snapshots"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    stats = Column(JSON, nullable=True)  # None once invalidated
+    version = Column(Integer, default=0, nullable=False)  # Bumped by invalidation, a stale computation cannot overwrite it
+    computed_at = Column(DateTime, nullable=True)
 
 class TreeTip(Base):
     __tablename__ = "tree_tips"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.session import Base
@@ -25,7 +25,7 @@ class User(Base):
     total_trees_planted = Column(Integer, default=0)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
-    points = Column(Integer, default=0)
+    points = Column(Integer, default=0)  # Compacted balance, see PointsLedgerEntry
     level = Column(Integer, default=1)
     
     # Timestamps
@@ -53,6 +53,38 @@ class UserPreferences(Base):
     # Reminder timing
     reminder_time = Column(String, default="08:00")  # HH:MM format
     timezone = Column(String, default="Africa/Nairobi")
+    last_watering_reminder_at = Column(DateTime, nullable=True)  # UTC, at most one reminder per local day
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (Index('ix_user_preferences_user_id', 'user_id'),)
+
+class PointsLedgerEntry(Base):
+    """Append-only record of every points change, folded into users.points by compaction"""
+    __tablename__ = "points_ledger"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    delta = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)  # tree_planted, streak_bonus, achievement, ...
+    source_id = Column(Integer, nullable=True)  # Id of the tree, achievement, ... that earned it
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index('ix_points_ledger_user_entry', 'user_id', 'id'),)
+
+class PointsLedgerWatermark(Base):
+    """Last ledger entry folded into users.points (single row)"""
+    __tablename__ = "points_ledger_watermark"
+    
+    id = Column(Integer, primary_key=True)
+    last_entry_id = Column(Integer, default=0)
+    compacted_at = Column(DateTime, nullable=True)
+
+class PointsLedgerGap(Base):
+    """Ledger id at or below the watermark that was not visible when compaction passed it"""
+    __tablename__ = "points_ledger_gaps"
+    
+    # Its transaction was still open (or rolled back), an entry committing later is folded in then
+    entry_id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
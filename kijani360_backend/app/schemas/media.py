@@ -0,0 +1,14 @@
+from typing import Dict, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+class MediaUploadResponse(BaseModel):
+    id: int
+    url: str
+    content_type: str
+    size_bytes: int
+    width: Optional[int]
+    height: Optional[int]
+    variants: Dict[str, str]  # WebP width -> URL, for srcset
+    deduplicated: bool = False  # The same file had been uploaded before
+    created_at: datetime
@@ -10,6 +10,8 @@ class NotificationType(str, Enum):
     STREAK_MILESTONE = "streak_milestone"
     COMMUNITY_UPDATE = "community_update"
     SYSTEM_ALERT = "system_alert"
+    POST_LIKE = "post_like"
+    DAILY_DIGEST = "daily_digest"
 
 class NotificationBase(BaseModel):
     title: str
@@ -30,6 +32,8 @@ class Notification(NotificationBase):
     is_read: bool = False
     read_at: Optional[datetime] = None
     created_at: datetime
+    actor_count: int = 1
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -41,6 +45,7 @@ class NotificationPreferenceBase(BaseModel):
     community_updates: bool = True
     push_notifications: bool = True
     email_notifications: bool = True
+    daily_digest: bool = False
 
 class NotificationPreference(NotificationPreferenceBase):
     id: int
@@ -51,4 +56,9 @@ class NotificationPreference(NotificationPreferenceBase):
 
 class BulkNotificationCreate(NotificationBase):
     user_ids: List[int]
-    send_push: bool = True
\ No newline at end of file
+    send_push: bool = True
+
+class BulkNotificationResult(BaseModel):
+    requested: int
+    created: int
+    push_scheduled: bool
\ No newline at end of file
@@ -46,6 +46,9 @@ class Nursery(NurseryBase):
     class Config:
         from_attributes = True
 
+class NurseryNearby(Nursery):
+    distance_km: float
+
 # Seedling Listing schemas
 class SeedlingListingBase(BaseModel):
     species_id: int
@@ -63,6 +66,7 @@ class SeedlingListingCreate(SeedlingListingBase):
     delivery_cost: Optional[float] = None
     delivery_radius_km: Optional[int] = None
     seasonal_availability: Optional[str] = None
+    media_id: Optional[int] = None  # Id from POST /media/uploads, sets primary_image
 
 class SeedlingListingUpdate(BaseModel):
     title: Optional[str] = None
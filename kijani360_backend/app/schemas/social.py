@@ -28,6 +28,7 @@ class StreakActivityCreate(BaseModel):
     latitude: Optional[str] = None
     longitude: Optional[str] = None
     photo_url: Optional[str] = None
+    media_id: Optional[int] = Field(default=None, description="Id from POST /media/uploads, sets photo_url")
     description: Optional[str] = None
     collaborative_streak_id: Optional[int] = None
 
@@ -45,6 +46,20 @@ class StreakActivityResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class StreakActivitySync(StreakActivityCreate):
+    client_id: str = Field(..., min_length=1, max_length=64, description="Client-generated id for idempotent retries")
+    activity_date: datetime = Field(..., description="When the activity happened on the device")
+
+class StreakActivityBulkCreate(BaseModel):
+    activities: List[StreakActivitySync] = Field(..., min_length=1, max_length=500)
+
+class StreakActivityBulkResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: List[str]  # client ids that were already synced
+    current_streak: int
+    longest_streak: int
+
 class TreePlantingStreakResponse(BaseModel):
     id: int
     user_id: int
@@ -99,6 +114,7 @@ class CollaborativeStreakMemberResponse(BaseModel):
 class UserPostCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000)
     image_url: Optional[str] = None
+    media_id: Optional[int] = Field(default=None, description="Id from POST /media/uploads, sets image_url")
     post_type: str = Field(default="general")
     tags: Optional[str] = None
     location: Optional[str] = None
@@ -190,6 +206,18 @@ class CommunityEventResponse(BaseModel):
         from_attributes = True
 
 # Dashboard Schemas
+class ChallengeProgressResponse(BaseModel):
+    id: int
+    title: str
+    description: Optional[str]
+    icon: Optional[str]
+    reward_points: int
+    progress_type: str
+    target: int
+    progress: int
+    completed: bool
+    expires_at: datetime
+
 class UserDashboard(BaseModel):
     user_stats: dict
     streak_info: TreePlantingStreakResponse
@@ -197,6 +225,7 @@ class UserDashboard(BaseModel):
     achievements: List[UserAchievementResponse]
     collaborative_streaks: List[CollaborativeStreakResponse]
     upcoming_events: List[CommunityEventResponse]
+    challenges: List[ChallengeProgressResponse] = []
 
 class LeaderboardEntry(BaseModel):
     user_id: int
@@ -1,6 +1,6 @@
 from typing import Optional, List
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import date, datetime
 
 # Tree Species schemas
 class TreeSpeciesBase(BaseModel):
@@ -13,6 +13,7 @@ class TreeSpeciesBase(BaseModel):
     soil_type: Optional[str] = None
     climate_zones: Optional[str] = None
     watering_frequency: int = 3
+    is_native: bool = False
 
 class TreeSpeciesCreate(TreeSpeciesBase):
     pass
@@ -47,6 +48,15 @@ class UserTreeBase(BaseModel):
 class UserTreeCreate(UserTreeBase):
     pass
 
+class UserTreeBulkCreate(BaseModel):
+    trees: List[UserTreeCreate] = Field(..., min_length=1, max_length=5000)
+
+class UserTreeBulkResult(BaseModel):
+    planted: int
+    tree_ids: List[int]
+    points_awarded: int
+    current_streak: int
+
 class UserTreeUpdate(BaseModel):
     name: Optional[str] = None
     location: Optional[str] = None
@@ -97,6 +107,47 @@ class WateringLog(WateringLogBase):
     class Config:
         from_attributes = True
 
+class WateringDay(BaseModel):
+    day: date
+    waterings: int
+    liters: float
+
+# Measurement schemas
+class TreeMeasurementCreate(BaseModel):
+    height: Optional[float] = Field(None, ge=0, description="cm")
+    girth: Optional[float] = Field(None, ge=0, description="Trunk circumference in cm")
+    health_status: Optional[str] = Field(None, pattern="^(healthy|sick|dead)$")
+    measured_at: Optional[datetime] = None  # Defaults to now
+
+class TreeMeasurementPoint(BaseModel):
+    measured_at: datetime
+    height: Optional[float]
+    girth: Optional[float]
+    health_status: Optional[str]
+    readings: int  # Readings averaged into this point
+
+class TreeMeasurementSeries(BaseModel):
+    tree_id: int
+    start: datetime
+    end: datetime
+    resolution_seconds: int  # Bucket width, 0 when every reading is returned as is
+    readings: List[TreeMeasurementPoint]
+
+class GrowthCurvePoint(BaseModel):
+    age_days: int  # Start of the age bucket
+    tree_count: int
+    mean_height: Optional[float]
+    std_height: Optional[float]
+    girth_tree_count: int
+    mean_girth: Optional[float]
+    std_girth: Optional[float]
+
+class GrowthCurve(BaseModel):
+    species_id: int
+    bucket_days: int
+    computed_at: Optional[datetime]
+    points: List[GrowthCurvePoint]
+
 # Tree Tips schemas
 class TreeTipBase(BaseModel):
     title: str
@@ -0,0 +1,178 @@
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, literal, and_, exists, true, false, JSON
+from datetime import datetime
+from app.models.user import User, PointsLedgerEntry
+from app.models.forum import Achievement, UserAchievement, TreePlantingStreak, ForumPost
+from app.models.notifications import Notification, NotificationPreference
+from app.schemas.notifications import NotificationType
+from app.services.notification_counters import NotificationCounterService
+from app.services.leaderboard_service import LeaderboardService
+
+def _metric_queries() -> Dict[str, object]:
+    """Per-user (user_id, value) selects for each criteria type the engine evaluates"""
+    return {
+        "trees_planted": select(
+            User.id.label("user_id"),
+            func.coalesce(User.total_trees_planted, 0).label("value")
+        ),
+        "streak_days": select(
+            TreePlantingStreak.user_id.label("user_id"),
+            func.max(TreePlantingStreak.longest_streak).label("value")
+        ).group_by(TreePlantingStreak.user_id),
+        "forum_posts": select(
+            ForumPost.author_id.label("user_id"),
+            func.count(ForumPost.id).label("value")
+        ).group_by(ForumPost.author_id)
+    }
+
+class AchievementBackfill:
+    """Award achievements to every already-qualifying user with set-based statements"""
+    
+    def __init__(self, db: Session, report: Callable[[str], None] = print):
+        self.db = db
+        self.report = report
+    
+    def run(self, achievement_ids: Optional[List[int]] = None, chunk_size: int = 50000) -> int:
+        """Backfill the given (or all active) achievements, returns the number of awards"""
+        query = self.db.query(Achievement).filter(Achievement.is_active == True)
+        if achievement_ids:
+            query = query.filter(Achievement.id.in_(achievement_ids))
+        
+        by_type: Dict[str, List[Achievement]] = {}
+        for achievement in query.all():
+            by_type.setdefault(achievement.criteria_type or achievement.requirement_type, []).append(achievement)
+        
+        metric_queries = _metric_queries()
+        unsupported = [criteria_type for criteria_type in by_type if criteria_type not in metric_queries]
+        for criteria_type in unsupported:
+            self.report(f"Skipping {len(by_type.pop(criteria_type))} achievement(s) with criteria '{criteria_type}' (not evaluated)")
+        
+        if not by_type:
+            return 0
+        
+        low, high = self.db.query(func.min(User.id), func.max(User.id)).one()
+        if low is None:
+            return 0
+        
+        total = 0
+        for start in range(low, high + 1, chunk_size):
+            end = start + chunk_size
+            awarded = 0
+            for criteria_type, achievements in by_type.items():
+                awarded += self._backfill_chunk(metric_queries[criteria_type], achievements, start, end)
+            
+            self.db.commit()
+            total += awarded
+            self.report(f"Users {start}-{min(end - 1, high)}: {awarded} awarded ({total} total)")
+        
+        return total
+    
+    def _backfill_chunk(self, metric_query, achievements: List[Achievement], start: int, end: int) -> int:
+        """Award, credit and notify one criteria type for users in [start, end)"""
+        # Rows written by this call share one earned_at, which is how the
+        # ledger and notification statements find exactly the new awards
+        awarded_at = datetime.utcnow()
+        achievement_ids = [achievement.id for achievement in achievements]
+        
+        metric = metric_query.subquery()
+        threshold = func.coalesce(Achievement.criteria_value, Achievement.requirement_value)
+        qualifying = select(
+            metric.c.user_id,
+            Achievement.id,
+            literal(awarded_at),
+            true()
+        ).join(
+            Achievement, and_(Achievement.id.in_(achievement_ids), metric.c.value >= threshold)
+        ).where(
+            metric.c.user_id >= start,
+            metric.c.user_id < end,
+            ~exists().where(
+                UserAchievement.user_id == metric.c.user_id,
+                UserAchievement.achievement_id == Achievement.id
+            )
+        )
+        
+        result = self.db.execute(
+            insert(UserAchievement).from_select(
+                ["user_id", "achievement_id", "earned_at", "is_displayed"], qualifying
+            )
+        )
+        if not result.rowcount:
+            return 0
+        
+        in_chunk = (
+            UserAchievement.earned_at == awarded_at,
+            UserAchievement.user_id >= start,
+            UserAchievement.user_id < end
+        )
+        
+        # Points, one ledger row per award
+        self.db.execute(
+            insert(PointsLedgerEntry).from_select(
+                ["user_id", "delta", "reason", "source_id", "created_at"],
+                select(
+                    UserAchievement.user_id,
+                    Achievement.points_reward,
+                    literal("achievement"),
+                    Achievement.id,
+                    literal(awarded_at)
+                ).join(
+                    Achievement, Achievement.id == UserAchievement.achievement_id
+                ).where(
+                    *in_chunk,
+                    UserAchievement.achievement_id.in_(achievement_ids),
+                    Achievement.points_reward > 0
+                )
+            )
+        )
+        
+        # The same points in the current weekly and monthly leaderboard buckets, as the engine credits them
+        LeaderboardService(self.db).record_points_bulk(
+            select(
+                PointsLedgerEntry.user_id,
+                func.sum(PointsLedgerEntry.delta).label("points")
+            ).where(
+                PointsLedgerEntry.created_at == awarded_at,
+                PointsLedgerEntry.reason == "achievement",
+                PointsLedgerEntry.user_id >= start,
+                PointsLedgerEntry.user_id < end
+            ).group_by(PointsLedgerEntry.user_id),
+            awarded_at
+        )
+        
+        # Notifications, one statement per achievement so the payload is a bound literal
+        for achievement in achievements:
+            self.db.execute(
+                insert(Notification).from_select(
+                    ["user_id", "title", "message", "type", "data", "is_read", "created_at"],
+                    select(
+                        UserAchievement.user_id,
+                        literal("🏆 Achievement Unlocked!"),
+                        literal(f"Congratulations! You've earned: {achievement.name}"),
+                        literal(NotificationType.ACHIEVEMENT_UNLOCKED.value),
+                        literal({
+                            "achievement_name": achievement.name,
+                            "description": achievement.description
+                        }, type_=JSON),
+                        false(),
+                        literal(awarded_at)
+                    ).outerjoin(
+                        NotificationPreference, NotificationPreference.user_id == UserAchievement.user_id
+                    ).where(
+                        *in_chunk,
+                        UserAchievement.achievement_id == achievement.id,
+                        # Users without a preferences row get the default, which is on
+                        func.coalesce(NotificationPreference.achievement_unlocked, True) == True
+                    )
+                )
+            )
+        
+        notified = self.db.query(Notification.user_id, func.count(Notification.id)).filter(
+            Notification.created_at == awarded_at,
+            Notification.user_id >= start,
+            Notification.user_id < end
+        ).group_by(Notification.user_id).all()
+        NotificationCounterService(self.db).record({user_id: (count, count) for user_id, count in notified})
+        
+        return result.rowcount
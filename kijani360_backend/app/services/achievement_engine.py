@@ -0,0 +1,157 @@
+import bisect
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from datetime import datetime
+from app.core.catalog_version import CatalogVersion
+from app.models.forum import Achievement, UserAchievement
+from app.services.leaderboard_service import LeaderboardService
+from app.services.points_service import PointsService
+
+class CatalogEntry(NamedTuple):
+    threshold: int
+    id: int
+    name: str
+    description: str
+    points_reward: int
+
+class AchievementCatalog:
+    """Process-wide cache of active achievements, keyed by criteria type and sorted by threshold"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (entries by type, thresholds by type, (type, entry) by id), swapped as one unit
+        self._state: Optional[Tuple[Dict[str, List[CatalogEntry]], Dict[str, List[int]], Dict[int, Tuple[str, CatalogEntry]]]] = None
+        self._loaded_version: Optional[str] = None
+        self.version = CatalogVersion("achievements", Achievement)
+    
+    def ensure_loaded(self, db: Session):
+        """Load on first use, reload when the version stamp has moved (checked at most every 30s)"""
+        if self._state is not None and not self.version.due():
+            return
+        
+        version = self.version.current(db)
+        if self._state is None or self._loaded_version != version:
+            self.load(db, version)
+    
+    def load(self, db: Session, version: Optional[str] = None):
+        """(Re)load the catalog from the achievements table"""
+        version = version or self.version.current(db)
+        achievements = db.query(Achievement).filter(Achievement.is_active == True).all()
+        
+        entries: Dict[str, List[CatalogEntry]] = {}
+        by_id = {}
+        for achievement in achievements:
+            criteria_type = achievement.criteria_type or achievement.requirement_type
+            threshold = achievement.criteria_value
+            if threshold is None:
+                threshold = achievement.requirement_value
+            if not criteria_type or threshold is None:
+                continue
+            
+            entry = CatalogEntry(
+                threshold=threshold,
+                id=achievement.id,
+                name=achievement.name,
+                description=achievement.description,
+                points_reward=achievement.points_reward or 0
+            )
+            entries.setdefault(criteria_type, []).append(entry)
+            by_id[achievement.id] = (criteria_type, entry)
+        
+        for type_entries in entries.values():
+            type_entries.sort()
+        
+        thresholds = {
+            criteria_type: [entry.threshold for entry in type_entries]
+            for criteria_type, type_entries in entries.items()
+        }
+        
+        with self._lock:
+            self._state = (entries, thresholds, by_id)
+            self._loaded_version = version
+    
+    def invalidate(self):
+        """Drop the cached catalog here and tell other processes to reload, call after changing achievements"""
+        self.version.bump()
+        with self._lock:
+            self._state = None
+    
+    def lookup(self, achievement_id: int) -> Optional[Tuple[str, CatalogEntry]]:
+        """Get (criteria_type, entry) for an achievement id"""
+        state = self._state
+        return state[2].get(achievement_id) if state else None
+    
+    def crossed(self, criteria_type: str, last_threshold: Optional[int], value: int) -> List[CatalogEntry]:
+        """Entries with last_threshold <= threshold <= value"""
+        state = self._state
+        entries = state[0].get(criteria_type) if state else None
+        if not entries:
+            return []
+        
+        thresholds = state[1][criteria_type]
+        start = 0 if last_threshold is None else bisect.bisect_left(thresholds, last_threshold)
+        end = bisect.bisect_right(thresholds, value)
+        return entries[start:end]
+
+# Global instance
+achievement_catalog = AchievementCatalog()
+
+class AchievementEngine:
+    def __init__(self, db: Session):
+        self.db = db
+        self.catalog = achievement_catalog
+    
+    def evaluate(self, user_id: int, metrics: Dict[str, int]) -> List[CatalogEntry]:
+        """Award achievements whose threshold the user has newly reached"""
+        # metrics maps a criteria type (trees_planted, streak_days, ...) to the
+        # user's current value. Only catalog entries between the last awarded
+        # threshold and that value are visited, so cost follows new awards.
+        self.catalog.ensure_loaded(self.db)
+        
+        earned_ids = {
+            achievement_id for (achievement_id,) in self.db.query(UserAchievement.achievement_id).filter(
+                UserAchievement.user_id == user_id
+            ).all()
+        }
+        
+        # Highest threshold already awarded per criteria type
+        last_thresholds: Dict[str, int] = {}
+        for achievement_id in earned_ids:
+            found = self.catalog.lookup(achievement_id)
+            if not found:
+                continue
+            criteria_type, entry = found
+            if entry.threshold > last_thresholds.get(criteria_type, -1):
+                last_thresholds[criteria_type] = entry.threshold
+        
+        new_awards = []
+        for criteria_type, value in metrics.items():
+            if value is None:
+                continue
+            for entry in self.catalog.crossed(criteria_type, last_thresholds.get(criteria_type), value):
+                if entry.id not in earned_ids:
+                    new_awards.append(entry)
+        
+        if new_awards:
+            self._award(user_id, new_awards)
+        
+        return new_awards
+    
+    def _award(self, user_id: int, entries: List[CatalogEntry]):
+        """Write all awards and their ledger credits in batched statements"""
+        now = datetime.utcnow()
+        self.db.execute(insert(UserAchievement), [
+            {"user_id": user_id, "achievement_id": entry.id, "earned_at": now, "is_displayed": True}
+            for entry in entries
+        ])
+        
+        PointsService(self.db).credit_many([
+            (user_id, entry.points_reward, "achievement", entry.id)
+            for entry in entries
+        ])
+        
+        total_points = sum(entry.points_reward for entry in entries)
+        if total_points:
+            LeaderboardService(self.db).record_activity(user_id, points=total_points, occurred_at=now)
@@ -8,7 +8,7 @@ from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from app.models.tree import TreeSpecies
+from app.services.species_catalog import species_catalog, Species
 from app.models.forum import ChatHistory
 from datetime import datetime
 
@@ -20,8 +20,9 @@ class KenyaTreeExpertBot:
         
     def _load_tree_knowledge(self) -> str:
         """Load comprehensive tree knowledge from database and static data"""
-        # Get tree data from database
-        trees = self.db.query(TreeSpecies).all()
+        # Get tree data from the shared species catalog
+        species_catalog.ensure_loaded(self.db)
+        trees = species_catalog.all()
         
         db_knowledge = "\n".join([
             f"- {tree.name} ({tree.local_name}): "
@@ -410,10 +411,12 @@ class KenyaTreeExpertBot:
         """Get personalized tree recommendations"""
         recommendations = []
         
-        # Query database for suitable trees
-        suitable_trees = self.db.query(TreeSpecies).filter(
-            TreeSpecies.climate_zones.ilike(f"%{region}%")
-        ).all()
+        # Filter the species catalog for suitable trees
+        species_catalog.ensure_loaded(self.db)
+        suitable_trees = [
+            tree for tree in species_catalog.all()
+            if tree.climate_zones and region.lower() in tree.climate_zones.lower()
+        ]
         
         for tree in suitable_trees:
             score = self._calculate_suitability_score(tree, region, rainfall, farming_system)
@@ -430,7 +433,7 @@ class KenyaTreeExpertBot:
         recommendations.sort(key=lambda x: x["suitability_score"], reverse=True)
         return recommendations[:5]  # Top 5 recommendations
     
-    def _calculate_suitability_score(self, tree: TreeSpecies, region: str, rainfall: int, farming_system: str) -> float:
+    def _calculate_suitability_score(self, tree: Species, region: str, rainfall: int, farming_system: str) -> float:
         """Calculate suitability score for a tree based on conditions"""
         base_score = self._get_regional_survival_rate(tree, region)
         
@@ -451,7 +454,7 @@ class KenyaTreeExpertBot:
         
         return min(100, max(0, base_score))  # Clamp between 0-100
     
-    def _get_regional_survival_rate(self, tree: TreeSpecies, region: str) -> float:
+    def _get_regional_survival_rate(self, tree: Species, region: str) -> float:
         """Get survival rate for specific region"""
         region_lower = region.lower()
         if "central" in region_lower and tree.survival_rate_central:
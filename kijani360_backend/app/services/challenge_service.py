@@ -0,0 +1,237 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import update, case
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from app.core.catalog_version import CatalogVersion
+from app.models.forum import Challenge, UserChallengeProgress
+from app.services.leaderboard_service import LeaderboardService, period_window
+from app.services.points_service import PointsService
+
+logger = logging.getLogger(__name__)
+
+# Streak activity types that feed challenge metrics
+ACTIVITY_METRICS = {
+    "planted": "trees_planted",
+    "watered": "trees_watered"
+}
+
+class ChallengeDefinition(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    icon: Optional[str]
+    metric: str
+    progress_type: str
+    target: int
+    window: str
+    filters: Dict[str, Any]
+    reward_points: int
+
+class ChallengeCatalog:
+    """Process-wide cache of active challenge definitions, keyed by metric"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (definitions by metric, all definitions), swapped as one unit
+        self._state = None
+        self._loaded_version: Optional[str] = None
+        self.version = CatalogVersion("challenges", Challenge)
+    
+    def ensure_loaded(self, db: Session):
+        """Load on first use, reload when the version stamp has moved (checked at most every 30s)"""
+        if self._state is not None and not self.version.due():
+            return
+        
+        version = self.version.current(db)
+        if self._state is None or self._loaded_version != version:
+            self.load(db, version)
+    
+    def load(self, db: Session, version: Optional[str] = None):
+        """(Re)load the catalog from the challenges table"""
+        version = version or self.version.current(db)
+        challenges = db.query(Challenge).filter(Challenge.is_active == True).order_by(Challenge.id).all()
+        
+        definitions = []
+        for challenge in challenges:
+            try:
+                filters = json.loads(challenge.filters) if challenge.filters else {}
+            except ValueError:
+                logger.warning(f"Skipping challenge {challenge.id}: filters are not valid JSON")
+                continue
+            
+            definitions.append(ChallengeDefinition(
+                id=challenge.id,
+                title=challenge.title,
+                description=challenge.description,
+                icon=challenge.icon,
+                metric=challenge.metric,
+                progress_type=challenge.progress_type or "count",
+                target=challenge.target,
+                window=challenge.period or "week",
+                filters=filters,
+                reward_points=challenge.reward_points or 0
+            ))
+        
+        by_metric: Dict[str, List[ChallengeDefinition]] = {}
+        for definition in definitions:
+            by_metric.setdefault(definition.metric, []).append(definition)
+        
+        with self._lock:
+            self._state = (by_metric, definitions)
+            self._loaded_version = version
+    
+    def invalidate(self):
+        """Drop the cached catalog here and tell other processes to reload, call after changing challenges"""
+        self.version.bump()
+        with self._lock:
+            self._state = None
+    
+    def for_metric(self, metric: str) -> List[ChallengeDefinition]:
+        state = self._state
+        return state[0].get(metric, []) if state else []
+    
+    def all(self) -> List[ChallengeDefinition]:
+        state = self._state
+        return state[1] if state else []
+
+# Global instance
+challenge_catalog = ChallengeCatalog()
+
+class ChallengeService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.catalog = challenge_catalog
+    
+    def record_event(
+        self,
+        user_id: int,
+        metric: str,
+        value: int = 1,
+        attributes: Optional[Dict[str, Any]] = None,
+        occurred_at: Optional[datetime] = None
+    ) -> List[ChallengeDefinition]:
+        """Apply an activity event to matching challenges, returns the ones it completed"""
+        # count challenges add value, max challenges keep the highest value seen
+        self.catalog.ensure_loaded(self.db)
+        if not value:
+            return []
+        
+        occurred_at = occurred_at or datetime.utcnow()
+        attributes = attributes or {}
+        
+        completed = []
+        for definition in self.catalog.for_metric(metric):
+            if any(attributes.get(key) != expected for key, expected in definition.filters.items()):
+                continue
+            
+            bucket = period_window(definition.window, occurred_at)[0]
+            self._upsert_progress(user_id, definition, bucket, value)
+            if self._mark_completed(user_id, definition, bucket):
+                completed.append(definition)
+        
+        if completed:
+            PointsService(self.db).credit_many([
+                (user_id, definition.reward_points, "challenge", definition.id)
+                for definition in completed
+            ])
+            LeaderboardService(self.db).record_activity(
+                user_id,
+                points=sum(definition.reward_points for definition in completed)
+            )
+        
+        return completed
+    
+    def get_user_challenges(self, user_id: int) -> List[Dict[str, Any]]:
+        """Current challenges with the user's progress, read with one keyed query"""
+        self.catalog.ensure_loaded(self.db)
+        definitions = self.catalog.all()
+        if not definitions:
+            return []
+        
+        now = datetime.utcnow()
+        windows = {definition.window: period_window(definition.window, now) for definition in definitions}
+        
+        progress = {
+            (row.challenge_id, row.bucket): row
+            for row in self.db.query(UserChallengeProgress).filter(
+                UserChallengeProgress.user_id == user_id,
+                UserChallengeProgress.bucket.in_([bucket for bucket, _ in windows.values()])
+            ).all()
+        }
+        
+        challenges = []
+        for definition in definitions:
+            bucket, closes_at = windows[definition.window]
+            row = progress.get((definition.id, bucket))
+            challenges.append({
+                "id": definition.id,
+                "title": definition.title,
+                "description": definition.description,
+                "icon": definition.icon,
+                "reward_points": definition.reward_points,
+                "progress_type": definition.progress_type,
+                "target": definition.target,
+                "progress": min(row.progress, definition.target) if row else 0,
+                "completed": bool(row and row.completed_at),
+                "expires_at": closes_at
+            })
+        
+        return challenges
+    
+    def _upsert_progress(self, user_id: int, definition: ChallengeDefinition, bucket: str, value: int):
+        """Atomically apply an event to a progress row, creating it on first use"""
+        if self._update_progress(user_id, definition, bucket, value):
+            return
+        
+        try:
+            with self.db.begin_nested():
+                self.db.add(UserChallengeProgress(
+                    user_id=user_id,
+                    challenge_id=definition.id,
+                    bucket=bucket,
+                    progress=value
+                ))
+        except IntegrityError:
+            # Another writer created this row first, if there is still no row the user or challenge does not exist
+            if not self._update_progress(user_id, definition, bucket, value):
+                raise
+    
+    def _update_progress(self, user_id: int, definition: ChallengeDefinition, bucket: str, value: int) -> bool:
+        if definition.progress_type == "max":
+            progress = case(
+                (UserChallengeProgress.progress < value, value),
+                else_=UserChallengeProgress.progress
+            )
+        else:
+            progress = UserChallengeProgress.progress + value
+        
+        result = self.db.execute(
+            update(UserChallengeProgress).where(
+                UserChallengeProgress.user_id == user_id,
+                UserChallengeProgress.bucket == bucket,
+                UserChallengeProgress.challenge_id == definition.id
+            ).values(
+                progress=progress,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def _mark_completed(self, user_id: int, definition: ChallengeDefinition, bucket: str) -> bool:
+        """Flag completion once, only the writer that flips completed_at credits the reward"""
+        result = self.db.execute(
+            update(UserChallengeProgress).where(
+                UserChallengeProgress.user_id == user_id,
+                UserChallengeProgress.bucket == bucket,
+                UserChallengeProgress.challenge_id == definition.id,
+                UserChallengeProgress.completed_at == None,
+                UserChallengeProgress.progress >= definition.target
+            ).values(
+                completed_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
@@ -0,0 +1,106 @@
+import random
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, update, case
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from app.core.config import settings
+from app.models.social import (
+    CollaborativeStreak, CollaborativeStreakMember, CollaborativeStreakCounterShard
+)
+
+class CollaborativeStreakService:
+    """Contention-free counters for collaborative streak totals"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def add_contribution(
+        self,
+        streak_id: int,
+        user_id: int,
+        trees_count: int,
+        contributed_at: Optional[datetime] = None
+    ):
+        """Add trees to a group total and the member's contribution"""
+        if trees_count <= 0:
+            return
+        
+        contributed_at = contributed_at or datetime.utcnow()
+        
+        self._increment_shard(streak_id, trees_count)
+        
+        # Member rows are per user, an atomic increment is enough
+        self.db.execute(
+            update(CollaborativeStreakMember).where(
+                CollaborativeStreakMember.streak_id == streak_id,
+                CollaborativeStreakMember.user_id == user_id
+            ).values(
+                trees_contributed=CollaborativeStreakMember.trees_contributed + trees_count,
+                last_contribution=case(
+                    (CollaborativeStreakMember.last_contribution == None, contributed_at),
+                    (CollaborativeStreakMember.last_contribution < contributed_at, contributed_at),
+                    else_=CollaborativeStreakMember.last_contribution
+                )
+            ).execution_options(synchronize_session=False)
+        )
+    
+    def get_totals(self, streak_ids: List[int]) -> Dict[int, int]:
+        """Get total trees planted for each streak (base column plus all shards)"""
+        if not streak_ids:
+            return {}
+        
+        rows = self.db.query(
+            CollaborativeStreak.id,
+            CollaborativeStreak.total_trees_planted,
+            func.coalesce(func.sum(CollaborativeStreakCounterShard.trees_planted), 0)
+        ).outerjoin(
+            CollaborativeStreakCounterShard,
+            CollaborativeStreakCounterShard.streak_id == CollaborativeStreak.id
+        ).filter(
+            CollaborativeStreak.id.in_(streak_ids)
+        ).group_by(
+            CollaborativeStreak.id, CollaborativeStreak.total_trees_planted
+        ).all()
+        
+        return {
+            streak_id: (base or 0) + int(sharded)
+            for streak_id, base, sharded in rows
+        }
+    
+    def get_total(self, streak_id: int) -> int:
+        """Get total trees planted for a single streak"""
+        return self.get_totals([streak_id]).get(streak_id, 0)
+    
+    def _increment_shard(self, streak_id: int, trees_count: int):
+        """Atomically add to a randomly chosen shard, creating it on first use"""
+        # Group totals are spread over several rows and summed on read, so
+        # members of a big group never queue on the collaborative_streaks row
+        shard = random.randrange(max(1, settings.COLLABORATIVE_STREAK_COUNTER_SHARDS))
+        
+        if self._update_shard(streak_id, shard, trees_count):
+            return
+        
+        try:
+            with self.db.begin_nested():
+                self.db.add(CollaborativeStreakCounterShard(
+                    streak_id=streak_id,
+                    shard=shard,
+                    trees_planted=trees_count
+                ))
+        except IntegrityError:
+            # Another writer created this shard first, if there is still no row the streak does not exist
+            if not self._update_shard(streak_id, shard, trees_count):
+                raise
+    
+    def _update_shard(self, streak_id: int, shard: int, trees_count: int) -> bool:
+        result = self.db.execute(
+            update(CollaborativeStreakCounterShard).where(
+                CollaborativeStreakCounterShard.streak_id == streak_id,
+                CollaborativeStreakCounterShard.shard == shard
+            ).values(
+                trees_planted=CollaborativeStreakCounterShard.trees_planted + trees_count,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
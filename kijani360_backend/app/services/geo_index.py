@@ -0,0 +1,120 @@
+import heapq
+from typing import Any, Dict, Iterator, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import Float, and_, or_, bindparam, update
+from app.core.geo import GEOHASH_PRECISION, Bounds, cover, coordinate, encode, haversine_km, radius_bounds
+
+# First ring of a radius search, widened 4x at a time until enough results are inside it
+FIRST_RING_KM = 0.5
+
+# Candidate coordinates are read in pages of this many per requested row (at least MIN_CANDIDATE_PAGE)
+CANDIDATE_PAGE_FACTOR = 4
+MIN_CANDIDATE_PAGE = 200
+
+class GeoIndexService:
+    """Radius and bounding-box lookups on models with latitude, longitude and an indexed geohash"""
+    
+    # Queries become a few geohash prefix ranges on the index, then exact distances are checked
+    # in Python. Coordinates stored as Float are also filtered by the box in SQL. Only ids and
+    # coordinates are read while searching, full rows are loaded for the results alone.
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def nearby(self, model, lat: float, lon: float, radius_km: float, *criteria, limit: int = 50) -> List[Tuple[Any, float]]:
+        """Up to limit rows within radius_km, closest first, as (row, distance in km)"""
+        page_size = max(limit * CANDIDATE_PAGE_FACTOR, MIN_CANDIDATE_PAGE)
+        ring = min(FIRST_RING_KM, radius_km)
+        while True:
+            candidates = self._candidates(model, radius_bounds(lat, lon, ring), criteria, page_size)
+            distances = (
+                (haversine_km(lat, lon, coordinate(row_lat), coordinate(row_lon)), row_id)
+                for row_id, row_lat, row_lon in candidates
+            )
+            # Only the closest limit are kept while the pages stream past
+            found = heapq.nsmallest(limit, (item for item in distances if item[0] <= ring))
+            
+            # Everything outside the ring is farther than everything in it
+            if len(found) >= limit or ring >= radius_km:
+                rows = self._load(model, [row_id for _, row_id in found])
+                return [(rows[row_id], distance) for distance, row_id in found if row_id in rows]
+            ring = min(ring * 4, radius_km)
+    
+    def within(self, model, bounds: Bounds, *criteria, limit: int = 500) -> List[Any]:
+        """Up to limit rows inside a (south, west, north, east) box"""
+        south, west, north, east = bounds
+        page_size = max(limit, MIN_CANDIDATE_PAGE)
+        ids = []
+        for row_id, row_lat, row_lon in self._candidates(model, bounds, criteria, page_size):
+            row_lat, row_lon = coordinate(row_lat), coordinate(row_lon)
+            if south <= row_lat <= north and west <= row_lon <= east:
+                ids.append(row_id)
+                if len(ids) >= limit:
+                    break
+        rows = self._load(model, ids)
+        return [rows[row_id] for row_id in ids if row_id in rows]
+    
+    def backfill(self, model, batch_size: int = 5000) -> int:
+        """Compute missing geohashes for rows that have coordinates, one commit per batch"""
+        table = model.__table__
+        statement = update(table).where(table.c.id == bindparam("row_id")).values(geohash=bindparam("cell"))
+        
+        filled = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(model.id, model.latitude, model.longitude).filter(
+                model.id > last_id,
+                model.geohash == None,
+                model.latitude != None,
+                model.longitude != None
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            
+            cells = [{"row_id": row_id, "cell": encode(lat, lon)} for row_id, lat, lon in rows]
+            cells = [cell for cell in cells if cell["cell"] is not None]
+            if cells:
+                self.db.execute(statement, cells)
+            self.db.commit()
+            
+            filled += len(cells)
+            last_id = rows[-1][0]
+        
+        return filled
+    
+    def _candidates(self, model, bounds: Bounds, criteria, page_size: int) -> Iterator[Tuple[int, Any, Any]]:
+        """(id, latitude, longitude) of rows in the geohash cells covering the box, page_size per query"""
+        ranges = [
+            and_(model.geohash >= prefix, model.geohash <= prefix + "z" * (GEOHASH_PRECISION - len(prefix)))
+            for prefix in cover(bounds)
+        ]
+        query = self.db.query(model.id, model.latitude, model.longitude, model.geohash).filter(or_(*ranges), *criteria)
+        
+        if isinstance(model.latitude.type, Float):
+            south, west, north, east = bounds
+            query = query.filter(
+                model.latitude >= south,
+                model.latitude <= north,
+                model.longitude >= west,
+                model.longitude <= east
+            )
+        
+        # Keyset pages in index order, callers stop reading once they have enough
+        after = None
+        while True:
+            paged = query
+            if after is not None:
+                last_cell, last_id = after
+                paged = paged.filter(or_(model.geohash > last_cell, and_(model.geohash == last_cell, model.id > last_id)))
+            page = paged.order_by(model.geohash, model.id).limit(page_size).all()
+            for row_id, row_lat, row_lon, cell in page:
+                yield row_id, row_lat, row_lon
+            if len(page) < page_size:
+                return
+            after = (cell, row_id)
+    
+    def _load(self, model, ids: List[int]) -> Dict[int, Any]:
+        """Full rows for the given ids, by id"""
+        if not ids:
+            return {}
+        return {row.id: row for row in self.db.query(model).filter(model.id.in_(ids)).all()}
@@ -0,0 +1,632 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, update, case, and_, or_, exists, literal
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.user import User
+from app.models.forum import TreePlantingStreak
+from app.models.social import LeaderboardPeriodScore
+from app.services.points_service import PointsService
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("trees", "points", "streak")
+WINDOWS = ("all", "week", "month")
+PERIODS = ("week", "month")
+
+READY_KEY = "leaderboard:ready"
+COUNTIES_KEY = "leaderboard:counties"  # user id -> county the user is ranked under
+
+PERIOD_COLUMNS = {
+    "trees": LeaderboardPeriodScore.trees_planted,
+    "points": LeaderboardPeriodScore.points,
+    "streak": LeaderboardPeriodScore.best_streak
+}
+
+def _key(metric: str, window: str = "all", bucket: Optional[str] = None, county: Optional[str] = None) -> str:
+    key = f"leaderboard:{metric}" if window == "all" else f"leaderboard:{metric}:{window}:{bucket}"
+    return f"{key}:county:{county}" if county else key
+
+def normalize_county(county: Optional[str]) -> Optional[str]:
+    """Canonical form of a free-text county name"""
+    county = (county or "").strip().lower()
+    return county or None
+
+def period_window(window: str, moment: datetime) -> Tuple[str, datetime]:
+    """Name and closing time of the weekly or monthly bucket containing a moment"""
+    day = moment.date()
+    if window == "week":
+        year, week, weekday = day.isocalendar()
+        bucket = f"{year}-W{week:02d}"
+        end = day + timedelta(days=8 - weekday)
+    else:
+        bucket = f"{day.year}-{day.month:02d}"
+        end = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    
+    return bucket, datetime.combine(end, datetime.min.time())
+
+def period_bucket(window: str, moment: datetime) -> Tuple[str, datetime]:
+    """Name and expiry of the weekly or monthly leaderboard bucket containing a moment"""
+    bucket, closes_at = period_window(window, moment)
+    return bucket, closes_at + timedelta(days=settings.LEADERBOARD_BUCKET_RETENTION_DAYS)
+
+def _epoch(moment: datetime) -> int:
+    # Stored datetimes are naive UTC
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+class LeaderboardService:
+    """Leaderboards backed by Redis sorted sets, with SQL window-function fallbacks"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.redis = get_redis()
+    
+    # ============ WRITES ============
+    
+    def record_activity(
+        self,
+        user_id: int,
+        trees: int = 0,
+        points: int = 0,
+        streak: Optional[int] = None,
+        occurred_at: Optional[datetime] = None
+    ):
+        """Add an activity event to the user's weekly and monthly buckets"""
+        self.record_activities(user_id, [(occurred_at or datetime.utcnow(), trees, points, streak)])
+    
+    def record_activities(self, user_id: int, events: List[Tuple[datetime, int, int, Optional[int]]]):
+        """Add (occurred_at, trees, points, streak) events to the user's buckets, one upsert per bucket"""
+        now = datetime.utcnow()
+        
+        totals = {}
+        for occurred_at, trees, points, streak in events:
+            for window in PERIODS:
+                bucket, expires_at = period_bucket(window, occurred_at)
+                if expires_at <= now:
+                    continue  # Late event for a bucket that has already expired
+                
+                bucket_trees, bucket_points, bucket_streak, _ = totals.get((window, bucket), (0, 0, 0, expires_at))
+                totals[(window, bucket)] = (
+                    bucket_trees + (trees or 0),
+                    bucket_points + (points or 0),
+                    max(bucket_streak, streak or 0),
+                    expires_at
+                )
+        
+        if not totals:
+            return
+        
+        county = normalize_county(
+            self.db.query(User.county).filter(User.id == user_id).scalar()
+        )
+        for (window, bucket), (trees, points, streak, expires_at) in totals.items():
+            self._upsert_period_score(user_id, window, bucket, county, trees, points, streak, expires_at)
+    
+    def record_points_bulk(self, totals, occurred_at: Optional[datetime] = None):
+        """Add a (user_id, points) select's points to each user's weekly and monthly buckets, set-based"""
+        occurred_at = occurred_at or datetime.utcnow()
+        totals = totals.subquery()
+        county = select(func.nullif(func.lower(func.trim(User.county)), "")).where(
+            User.id == LeaderboardPeriodScore.user_id
+        ).scalar_subquery()
+        
+        for window in PERIODS:
+            bucket, expires_at = period_bucket(window, occurred_at)
+            in_bucket = (LeaderboardPeriodScore.period == window, LeaderboardPeriodScore.bucket == bucket)
+            
+            # Empty rows for users without one, then a single UPDATE adds the points to new and old rows alike
+            missing = select(
+                totals.c.user_id,
+                literal(window),
+                literal(bucket),
+                func.nullif(func.lower(func.trim(User.county)), ""),
+                literal(0),
+                literal(0),
+                literal(0),
+                literal(expires_at)
+            ).join(User, User.id == totals.c.user_id).where(
+                ~exists().where(LeaderboardPeriodScore.user_id == totals.c.user_id, *in_bucket)
+            )
+            for attempt in range(3):
+                try:
+                    with self.db.begin_nested():
+                        self.db.execute(insert(LeaderboardPeriodScore).from_select(
+                            ["user_id", "period", "bucket", "county", "trees_planted", "points", "best_streak", "expires_at"],
+                            missing
+                        ))
+                    break
+                except IntegrityError:
+                    # A concurrent activity created some of the rows, the others are inserted again
+                    if attempt == 2:
+                        raise
+            
+            self.db.execute(
+                update(LeaderboardPeriodScore).where(
+                    *in_bucket,
+                    LeaderboardPeriodScore.user_id.in_(select(totals.c.user_id))
+                ).values(
+                    county=county,
+                    points=LeaderboardPeriodScore.points + select(totals.c.points).where(
+                        totals.c.user_id == LeaderboardPeriodScore.user_id
+                    ).scalar_subquery(),
+                    updated_at=datetime.utcnow()
+                ).execution_options(synchronize_session=False)
+            )
+    
+    def sync_user(self, user_id: int):
+        """Push a user's current SQL scores to the boards after a write"""
+        if not self.redis:
+            return
+        
+        row = self.db.execute(
+            self._scores_query().where(User.id == user_id)
+        ).first()
+        if not row:
+            return
+        
+        # Called after the write has committed, a Redis outage must not fail the request
+        try:
+            self._push_scores(user_id, row)
+        except Exception as e:
+            logger.warning(f"Leaderboard sync failed for user {user_id}, boards catch up on rebuild: {e}")
+    
+    def _push_scores(self, user_id: int, row):
+        member = str(user_id)
+        county = normalize_county(row.county)
+        previous_county = self.redis.hget(COUNTIES_KEY, member)
+        
+        pipe = self.redis.pipeline(transaction=False)
+        
+        # Moved county, drop the user from the old county's boards
+        if previous_county and previous_county != county:
+            for key in self._county_keys(previous_county):
+                pipe.zrem(key, member)
+        if county:
+            pipe.hset(COUNTIES_KEY, member, county)
+        else:
+            pipe.hdel(COUNTIES_KEY, member)
+        
+        for metric in METRICS:
+            pipe.zadd(_key(metric), {member: getattr(row, metric)})
+            if county:
+                pipe.zadd(_key(metric, county=county), {member: getattr(row, metric)})
+        
+        for period_score in self._current_period_scores([user_id]):
+            for metric, column in PERIOD_COLUMNS.items():
+                score = getattr(period_score, column.key) or 0
+                for board_county in {None, county}:
+                    key = _key(metric, period_score.period, period_score.bucket, board_county)
+                    pipe.zadd(key, {member: score})
+                    pipe.expireat(key, _epoch(period_score.expires_at))
+        
+        pipe.execute()
+    
+    def rebuild(self, chunk_size: int = 5000) -> int:
+        """Rebuild all boards from SQL, swapping them in atomically"""
+        if not self.redis:
+            return 0
+        
+        staged = {}  # board key -> expiry (None for all-time boards)
+        
+        def stage(pipe, key, member, score, expires_at=None):
+            if key not in staged:
+                self.redis.delete(f"{key}:rebuild")
+                staged[key] = expires_at
+            pipe.zadd(f"{key}:rebuild", {member: score})
+        
+        counties_staging = f"{COUNTIES_KEY}:rebuild"
+        self.redis.delete(counties_staging)
+        
+        # All-time boards, national and per county
+        total = 0
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                self._scores_query().where(User.id > last_id).order_by(User.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for row in rows:
+                member = str(row.user_id)
+                county = normalize_county(row.county)
+                if county:
+                    pipe.hset(counties_staging, member, county)
+                for metric in METRICS:
+                    stage(pipe, _key(metric), member, getattr(row, metric))
+                    if county:
+                        stage(pipe, _key(metric, county=county), member, getattr(row, metric))
+            pipe.execute()
+            
+            total += len(rows)
+            last_id = rows[-1].user_id
+        
+        # Current weekly and monthly boards
+        last_id = 0
+        while True:
+            period_scores = self._current_period_query().filter(
+                LeaderboardPeriodScore.id > last_id
+            ).order_by(LeaderboardPeriodScore.id).limit(chunk_size).all()
+            if not period_scores:
+                break
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for period_score in period_scores:
+                member = str(period_score.user_id)
+                for metric, column in PERIOD_COLUMNS.items():
+                    score = getattr(period_score, column.key) or 0
+                    for county in {None, period_score.county}:
+                        key = _key(metric, period_score.period, period_score.bucket, county)
+                        stage(pipe, key, member, score, period_score.expires_at)
+            pipe.execute()
+            
+            last_id = period_scores[-1].id
+        
+        pipe = self.redis.pipeline()
+        for key, expires_at in staged.items():
+            if expires_at:
+                pipe.expireat(f"{key}:rebuild", _epoch(expires_at))
+            pipe.rename(f"{key}:rebuild", key)
+        if self.redis.exists(counties_staging):
+            pipe.rename(counties_staging, COUNTIES_KEY)
+        else:
+            pipe.delete(COUNTIES_KEY)
+        pipe.set(READY_KEY, 1)
+        pipe.execute()
+        
+        # Drop boards that no longer have members (emptied counties, closed buckets)
+        stale = [
+            key for key in self.redis.scan_iter(match="leaderboard:*")
+            if key not in staged and key not in (READY_KEY, COUNTIES_KEY) and not key.endswith(":rebuild")
+        ]
+        if stale:
+            self.redis.delete(*stale)
+        
+        return total
+    
+    def purge_expired(self, batch_size: int = 5000) -> int:
+        """Delete expired weekly and monthly bucket rows in batches"""
+        now = datetime.utcnow()
+        deleted = 0
+        
+        while True:
+            ids = [
+                score_id for (score_id,) in self.db.query(LeaderboardPeriodScore.id).filter(
+                    LeaderboardPeriodScore.expires_at <= now
+                ).limit(batch_size).all()
+            ]
+            if not ids:
+                break
+            
+            self.db.query(LeaderboardPeriodScore).filter(
+                LeaderboardPeriodScore.id.in_(ids)
+            ).delete(synchronize_session=False)
+            self.db.commit()
+            deleted += len(ids)
+        
+        return deleted
+    
+    # ============ READS ============
+    
+    def get_rank(
+        self,
+        user_id: int,
+        metric: str,
+        window: str = "all",
+        county: Optional[str] = None
+    ) -> Optional[int]:
+        """Competition rank (1 + users with a higher score), None if the user is not on the board"""
+        county = normalize_county(county)
+        
+        if self._use_redis():
+            try:
+                key = self._board_key(metric, window, county)
+                score = self.redis.zscore(key, str(user_id))
+                if score is not None:
+                    return self.redis.zcount(key, f"({score}", "+inf") + 1
+            except Exception as e:
+                logger.warning(f"Leaderboard Redis read failed, using SQL: {e}")
+        
+        board = self._board_query(metric, window, county).subquery()
+        ranked = select(
+            board.c.user_id,
+            func.rank().over(order_by=board.c.score.desc()).label("rank")
+        ).subquery()
+        
+        return self.db.execute(
+            select(ranked.c.rank).where(ranked.c.user_id == user_id)
+        ).scalar()
+    
+    def get_top(
+        self,
+        metric: str,
+        limit: int = 10,
+        offset: int = 0,
+        window: str = "all",
+        county: Optional[str] = None
+    ) -> List[Tuple[int, int]]:
+        """Top users as (user_id, score), best first"""
+        county = normalize_county(county)
+        
+        if self._use_redis():
+            try:
+                return [
+                    (int(member), int(score))
+                    for member, score in self.redis.zrevrange(
+                        self._board_key(metric, window, county), offset, offset + limit - 1, withscores=True
+                    )
+                ]
+            except Exception as e:
+                logger.warning(f"Leaderboard Redis read failed, using SQL: {e}")
+        
+        board = self._board_query(metric, window, county).subquery()
+        rows = self.db.execute(
+            select(board.c.user_id, board.c.score).order_by(
+                board.c.score.desc(), board.c.user_id
+            ).offset(offset).limit(limit)
+        ).all()
+        return [(user_id, score or 0) for user_id, score in rows]
+    
+    def get_neighborhood(
+        self,
+        user_id: int,
+        metric: str,
+        radius: int = 5,
+        window: str = "all",
+        county: Optional[str] = None
+    ) -> List[Tuple[int, int, int]]:
+        """Users around a user as (position, user_id, score)"""
+        county = normalize_county(county)
+        
+        if self._use_redis():
+            try:
+                key = self._board_key(metric, window, county)
+                index = self.redis.zrevrank(key, str(user_id))
+                if index is not None:
+                    start = max(0, index - radius)
+                    members = self.redis.zrevrange(key, start, index + radius, withscores=True)
+                    return [
+                        (start + i + 1, int(member), int(score))
+                        for i, (member, score) in enumerate(members)
+                    ]
+            except Exception as e:
+                logger.warning(f"Leaderboard Redis read failed, using SQL: {e}")
+        
+        board = self._board_query(metric, window, county).subquery()
+        positioned = select(
+            board.c.user_id,
+            board.c.score,
+            func.row_number().over(order_by=(board.c.score.desc(), board.c.user_id)).label("position")
+        ).subquery()
+        
+        position = self.db.execute(
+            select(positioned.c.position).where(positioned.c.user_id == user_id)
+        ).scalar()
+        if position is None:
+            return []
+        
+        rows = self.db.execute(
+            select(positioned.c.position, positioned.c.user_id, positioned.c.score).where(
+                positioned.c.position.between(position - radius, position + radius)
+            ).order_by(positioned.c.position)
+        ).all()
+        return [(row.position, row.user_id, row.score or 0) for row in rows]
+    
+    def get_total_users(self, metric: str = "trees", window: str = "all", county: Optional[str] = None) -> int:
+        """Number of users on a board"""
+        county = normalize_county(county)
+        
+        if self._use_redis():
+            try:
+                return self.redis.zcard(self._board_key(metric, window, county))
+            except Exception as e:
+                logger.warning(f"Leaderboard Redis read failed, using SQL: {e}")
+        
+        board = self._board_query(metric, window, county).subquery()
+        return self.db.execute(select(func.count()).select_from(board)).scalar() or 0
+    
+    def get_entries(
+        self,
+        metric: str,
+        limit: int = 10,
+        window: str = "all",
+        county: Optional[str] = None
+    ) -> List[Dict]:
+        """Top-N leaderboard rows with user details"""
+        return self.build_entries(self.get_top(metric, limit, window=window, county=county), window=window)
+    
+    def build_entries(self, ranked: List[Tuple[int, int]], start_rank: int = 1, window: str = "all") -> List[Dict]:
+        """Attach user details to ranked (user_id, score) pairs with keyed queries"""
+        user_ids = [user_id for user_id, _ in ranked]
+        if not user_ids:
+            return []
+        
+        users = {
+            user.id: user
+            for user in self.db.query(User).filter(User.id.in_(user_ids)).all()
+        }
+        
+        if window == "all":
+            balances = PointsService(self.db).get_balances(user_ids)
+            streaks = dict(self.db.query(
+                TreePlantingStreak.user_id,
+                func.max(TreePlantingStreak.current_streak)
+            ).filter(
+                TreePlantingStreak.user_id.in_(user_ids)
+            ).group_by(TreePlantingStreak.user_id).all())
+            scores = {
+                user_id: (user.total_trees_planted or 0, balances.get(user_id, 0), streaks.get(user_id) or 0)
+                for user_id, user in users.items()
+            }
+        else:
+            # Windowed boards show what was earned within the bucket
+            scores = {
+                period_score.user_id: (
+                    period_score.trees_planted or 0,
+                    period_score.points or 0,
+                    period_score.best_streak or 0
+                )
+                for period_score in self._current_period_scores(user_ids, [window])
+            }
+        
+        entries = []
+        for user_id, _ in ranked:
+            user = users.get(user_id)
+            if not user:
+                continue
+            trees, points, streak = scores.get(user_id, (0, 0, 0))
+            entries.append({
+                "rank": start_rank + len(entries),
+                "user_id": user.id,
+                "username": user.username,
+                "avatar": user.profile_image,
+                "trees_planted": trees,
+                "current_streak": streak,
+                "points": points,
+                "location": user.location
+            })
+        
+        return entries
+    
+    # ============ HELPERS ============
+    
+    def _use_redis(self) -> bool:
+        if not self.redis:
+            return False
+        try:
+            return bool(self.redis.exists(READY_KEY))
+        except Exception as e:
+            logger.warning(f"Leaderboard Redis unavailable, using SQL: {e}")
+            return False
+    
+    def _board_key(self, metric: str, window: str, county: Optional[str]) -> str:
+        bucket = period_bucket(window, datetime.utcnow())[0] if window != "all" else None
+        return _key(metric, window, bucket, county)
+    
+    def _county_keys(self, county: str) -> List[str]:
+        """All current board keys for a county"""
+        keys = [_key(metric, county=county) for metric in METRICS]
+        for window in PERIODS:
+            bucket = period_bucket(window, datetime.utcnow())[0]
+            keys.extend(_key(metric, window, bucket, county) for metric in METRICS)
+        return keys
+    
+    def _board_query(self, metric: str, window: str, county: Optional[str]):
+        """(user_id, score) rows for one board"""
+        if window == "all":
+            scores = self._scores_query()
+            if county:
+                scores = scores.where(func.lower(func.trim(User.county)) == county)
+            scores = scores.subquery()
+            return select(scores.c.user_id, getattr(scores.c, metric).label("score"))
+        
+        bucket = period_bucket(window, datetime.utcnow())[0]
+        query = select(
+            LeaderboardPeriodScore.user_id,
+            PERIOD_COLUMNS[metric].label("score")
+        ).where(
+            LeaderboardPeriodScore.period == window,
+            LeaderboardPeriodScore.bucket == bucket
+        )
+        if county:
+            query = query.where(LeaderboardPeriodScore.county == county)
+        return query
+    
+    def _current_period_query(self, windows=PERIODS):
+        now = datetime.utcnow()
+        return self.db.query(LeaderboardPeriodScore).filter(or_(*[
+            and_(
+                LeaderboardPeriodScore.period == window,
+                LeaderboardPeriodScore.bucket == period_bucket(window, now)[0]
+            )
+            for window in windows
+        ]))
+    
+    def _current_period_scores(self, user_ids: List[int], windows=PERIODS) -> List[LeaderboardPeriodScore]:
+        return self._current_period_query(windows).filter(
+            LeaderboardPeriodScore.user_id.in_(user_ids)
+        ).all()
+    
+    def _upsert_period_score(
+        self,
+        user_id: int,
+        window: str,
+        bucket: str,
+        county: Optional[str],
+        trees: int,
+        points: int,
+        streak: int,
+        expires_at: datetime
+    ):
+        """Atomically add to a bucket row, creating it on first use"""
+        if self._update_period_score(user_id, window, bucket, county, trees, points, streak):
+            return
+        
+        try:
+            with self.db.begin_nested():
+                self.db.add(LeaderboardPeriodScore(
+                    user_id=user_id,
+                    period=window,
+                    bucket=bucket,
+                    county=county,
+                    trees_planted=trees,
+                    points=points,
+                    best_streak=streak,
+                    expires_at=expires_at
+                ))
+        except IntegrityError:
+            # Another writer created this bucket row first, if there is still no row the user does not exist
+            if not self._update_period_score(user_id, window, bucket, county, trees, points, streak):
+                raise
+    
+    def _update_period_score(
+        self,
+        user_id: int,
+        window: str,
+        bucket: str,
+        county: Optional[str],
+        trees: int,
+        points: int,
+        streak: int
+    ) -> bool:
+        result = self.db.execute(
+            update(LeaderboardPeriodScore).where(
+                LeaderboardPeriodScore.user_id == user_id,
+                LeaderboardPeriodScore.period == window,
+                LeaderboardPeriodScore.bucket == bucket
+            ).values(
+                county=county,
+                trees_planted=LeaderboardPeriodScore.trees_planted + trees,
+                points=LeaderboardPeriodScore.points + points,
+                best_streak=case(
+                    (LeaderboardPeriodScore.best_streak < streak, streak),
+                    else_=LeaderboardPeriodScore.best_streak
+                ),
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def _scores_query(self):
+        """Per-user trees, points (balance plus ledger tail) and streak scores"""
+        streaks = select(
+            TreePlantingStreak.user_id,
+            func.max(TreePlantingStreak.current_streak).label("current_streak")
+        ).group_by(TreePlantingStreak.user_id).subquery()
+        points_tail = PointsService(self.db).tail_query().subquery()
+        
+        return select(
+            User.id.label("user_id"),
+            User.county.label("county"),
+            func.coalesce(User.total_trees_planted, 0).label("trees"),
+            (func.coalesce(User.points, 0) + func.coalesce(points_tail.c.delta, 0)).label("points"),
+            func.coalesce(streaks.c.current_streak, 0).label("streak")
+        ).outerjoin(
+            streaks, streaks.c.user_id == User.id
+        ).outerjoin(
+            points_tail, points_tail.c.user_id == User.id
+        )
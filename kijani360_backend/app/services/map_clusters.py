@@ -0,0 +1,292 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, func, select, insert, delete, literal, cast, union_all, or_, and_, Float
+from app.core.config import settings
+from app.core.geo import BASE32, GEOHASH_PRECISION, Bounds, cell_bounds, cell_count, cell_width, cover, coordinate, encode
+from app.core.job_queue import job
+from app.models.maps import MapClusterCell, MapClusterDirtyCell
+from app.models.tree import UserTree
+from app.models.social import StreakActivity
+from app.services.geo_index import GeoIndexService
+
+logger = logging.getLogger(__name__)
+
+# Map layer -> (model, filters for the points it shows)
+LAYERS = {
+    "trees": (UserTree, lambda: [UserTree.is_active == True]),
+    "activities": (StreakActivity, lambda: []),
+}
+LAYER_BY_MODEL = {model: layer for layer, (model, _) in LAYERS.items()}
+
+# Layers whose individual points may be sent when zoomed in, activities are often logged at home
+POINT_LAYERS = {"trees"}
+
+# Cells recomputed per statement
+RANGE_CHUNK = 100
+
+# Attributes that move a point in or out of a cell
+TRACKED_ATTRIBUTES = ("latitude", "longitude", "is_active")
+
+def _range(column, prefix: str, precision: int):
+    """Cells of this precision under a prefix, as an index range"""
+    return and_(column >= prefix, column <= prefix + "z" * (precision - len(prefix)))
+
+class MapClusterService:
+    """Pre-aggregated point clusters per geohash cell, for map views at any zoom"""
+    
+    # Every point is counted in its cell at each precision from 1 to MAP_CLUSTER_MAX_PRECISION.
+    # Writes only mark the finest cell dirty; refresh() recomputes dirty cells from the points and
+    # their parents from the level below, so each run costs the change, not the data set.
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.max_precision = settings.MAP_CLUSTER_MAX_PRECISION
+    
+    # ============ WRITES ============
+    
+    def mark_points(self, layer: str, points: Iterable[Dict[str, Any]]):
+        """Mark the cells of points written with Core statements, in the caller's transaction"""
+        self.mark_dirty(layer, (encode(point.get("latitude"), point.get("longitude")) for point in points))
+    
+    def mark_dirty(self, layer: str, cells: Iterable[str]):
+        finest = {cell[:self.max_precision] for cell in cells if cell}
+        if finest:
+            self.db.execute(insert(MapClusterDirtyCell), [
+                {"layer": layer, "cell": cell, "created_at": datetime.utcnow()} for cell in sorted(finest)
+            ])
+    
+    # ============ MAINTENANCE ============
+    
+    def refresh(self, batch_size: int = 1000) -> int:
+        """Recompute clusters for dirty cells, one commit per batch of marks, returns cells recomputed"""
+        refreshed = 0
+        while True:
+            marks = self.db.query(
+                MapClusterDirtyCell.id,
+                MapClusterDirtyCell.layer,
+                MapClusterDirtyCell.cell
+            ).order_by(MapClusterDirtyCell.id).limit(batch_size).all()
+            if not marks:
+                break
+            
+            cells_by_layer: Dict[str, Set[str]] = defaultdict(set)
+            for _, layer, cell in marks:
+                if layer in LAYERS:
+                    cells_by_layer[layer].add(cell)
+            
+            now = datetime.utcnow()
+            for layer, cells in cells_by_layer.items():
+                self._recompute(layer, sorted(cells), now)
+                refreshed += len(cells)
+            
+            # By id, marks committed while this batch ran stay for the next one
+            self.db.execute(
+                delete(MapClusterDirtyCell).where(
+                    MapClusterDirtyCell.id.in_([mark_id for mark_id, _, _ in marks])
+                ).execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            
+            if len(marks) < batch_size:
+                break
+        
+        return refreshed
+    
+    def rebuild(self, layer: str) -> int:
+        """Recompute a layer from scratch with set-based statements, returns finest-level cells"""
+        model, filters = LAYERS[layer]
+        now = datetime.utcnow()
+        
+        self.db.execute(delete(MapClusterDirtyCell).where(MapClusterDirtyCell.layer == layer))
+        self.db.execute(delete(MapClusterCell).where(MapClusterCell.layer == layer))
+        
+        finest = func.substr(model.geohash, 1, self.max_precision)
+        created = self.db.execute(
+            insert(MapClusterCell).from_select(
+                ["layer", "cell", "precision", "point_count", "lat_sum", "lon_sum", "updated_at"],
+                select(
+                    literal(layer),
+                    finest,
+                    literal(self.max_precision),
+                    func.count(model.id),
+                    func.sum(cast(model.latitude, Float)),
+                    func.sum(cast(model.longitude, Float)),
+                    literal(now)
+                ).where(model.geohash != None, *filters()).group_by(finest)
+            )
+        ).rowcount
+        
+        for precision in range(self.max_precision - 1, 0, -1):
+            self.db.execute(insert(MapClusterCell).from_select(
+                ["layer", "cell", "precision", "point_count", "lat_sum", "lon_sum", "updated_at"],
+                self._children_select(layer, precision, now)
+            ))
+        
+        self.db.commit()
+        return created
+    
+    def _recompute(self, layer: str, cells: List[str], now: datetime):
+        """Replace the given finest cells from the points, then their parents level by level"""
+        model, filters = LAYERS[layer]
+        for i in range(0, len(cells), RANGE_CHUNK):
+            chunk = cells[i:i + RANGE_CHUNK]
+            # One index range scan per cell, an OR of ranges can fall back to a full scan
+            rows = self.db.execute(union_all(*[
+                select(
+                    literal(cell),
+                    func.count(model.id),
+                    func.sum(cast(model.latitude, Float)),
+                    func.sum(cast(model.longitude, Float))
+                ).where(_range(model.geohash, cell, GEOHASH_PRECISION), *filters())
+                for cell in chunk
+            ])).all()
+            self._replace(layer, self.max_precision, chunk, [
+                {"cell": cell, "point_count": count, "lat_sum": lat_sum, "lon_sum": lon_sum}
+                for cell, count, lat_sum, lon_sum in rows if count
+            ], now)
+        
+        for precision in range(self.max_precision - 1, 0, -1):
+            cells = sorted({cell[:precision] for cell in cells})
+            for i in range(0, len(cells), RANGE_CHUNK):
+                chunk = cells[i:i + RANGE_CHUNK]
+                rows = self.db.execute(self._children_select(layer, precision, now, chunk)).all()
+                self._replace(layer, precision, chunk, [
+                    {"cell": cell, "point_count": count, "lat_sum": lat_sum, "lon_sum": lon_sum}
+                    for _, cell, _, count, lat_sum, lon_sum, _ in rows
+                ], now)
+    
+    def _children_select(self, layer: str, precision: int, now: datetime, cells: Optional[List[str]] = None):
+        """Cells of this precision summed from the level below, optionally only the given cells"""
+        parent = func.substr(MapClusterCell.cell, 1, precision)
+        criteria = [MapClusterCell.layer == layer, MapClusterCell.precision == precision + 1]
+        if cells is not None:
+            criteria.append(MapClusterCell.cell.in_([cell + char for cell in cells for char in BASE32]))
+        return select(
+            literal(layer),
+            parent,
+            literal(precision),
+            func.sum(MapClusterCell.point_count),
+            func.sum(MapClusterCell.lat_sum),
+            func.sum(MapClusterCell.lon_sum),
+            literal(now)
+        ).where(*criteria).group_by(parent)
+    
+    def _replace(self, layer: str, precision: int, cells: List[str], rows: List[Dict[str, Any]], now: datetime):
+        self.db.execute(
+            delete(MapClusterCell).where(
+                MapClusterCell.layer == layer,
+                MapClusterCell.cell.in_(cells)
+            ).execution_options(synchronize_session=False)
+        )
+        if rows:
+            self.db.execute(insert(MapClusterCell), [
+                dict(row, layer=layer, precision=precision, updated_at=now) for row in rows
+            ])
+    
+    # ============ READS ============
+    
+    def precision_for_zoom(self, zoom: int) -> int:
+        """Finest precision whose cells are still about a quarter of a 256px map tile wide"""
+        target = 360 / (1 << zoom) / 4
+        for precision in range(self.max_precision, 0, -1):
+            if cell_width(precision) >= target:
+                return precision
+        return 1
+    
+    def clusters(self, layer: str, bounds: Bounds, zoom: int) -> Dict[str, Any]:
+        """Clusters in a viewport, at most MAP_CLUSTER_MAX_CELLS of them whatever the data volume"""
+        precision = self.precision_for_zoom(zoom)
+        while precision > 1 and cell_count(bounds, precision) > settings.MAP_CLUSTER_MAX_CELLS:
+            precision -= 1
+        
+        # Covering prefixes are all one length, whole cells at this precision or coarser ones to expand
+        prefixes = sorted({prefix[:precision] for prefix in cover(bounds)})
+        if len(prefixes[0]) == precision:
+            in_view = MapClusterCell.cell.in_(prefixes)
+        else:
+            in_view = or_(*[_range(MapClusterCell.cell, prefix, precision) for prefix in prefixes])
+        cells = self.db.query(MapClusterCell).filter(
+            MapClusterCell.layer == layer,
+            MapClusterCell.precision == precision,
+            in_view
+        ).all()
+        
+        south, west, north, east = bounds
+        clusters = []
+        for cell in cells:
+            cell_south, cell_west, cell_north, cell_east = cell_bounds(cell.cell)
+            if cell.point_count <= 0 or cell_north < south or cell_south > north or cell_east < west or cell_west > east:
+                continue
+            if cell.point_count == 1 and layer not in POINT_LAYERS:
+                # The mean of one point is the point itself, show the cell's centre instead
+                latitude, longitude = (cell_south + cell_north) / 2, (cell_west + cell_east) / 2
+            else:
+                latitude, longitude = cell.lat_sum / cell.point_count, cell.lon_sum / cell.point_count
+            clusters.append({
+                "cell": cell.cell,
+                "count": cell.point_count,
+                "latitude": round(latitude, 6),
+                "longitude": round(longitude, 6)
+            })
+        
+        total = sum(cluster["count"] for cluster in clusters)
+        result = {"layer": layer, "zoom": zoom, "precision": precision, "total": total, "clusters": clusters, "points": []}
+        
+        # Zoomed in far enough, a handful of points are sent as themselves
+        if layer in POINT_LAYERS and precision == self.max_precision and total <= settings.MAP_CLUSTER_POINT_LIMIT:
+            model, filters = LAYERS[layer]
+            rows = GeoIndexService(self.db).within(model, bounds, *filters(), limit=settings.MAP_CLUSTER_POINT_LIMIT)
+            result["clusters"] = []
+            result["total"] = len(rows)
+            result["points"] = [
+                {"id": row.id, "latitude": coordinate(row.latitude), "longitude": coordinate(row.longitude)}
+                for row in rows
+            ]
+        
+        return result
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed_points(session: Session, flush_context):
+    """Dirty-mark the old and new cells of mapped points changed through the ORM"""
+    cells: Dict[str, Set[str]] = defaultdict(set)
+    for instance in chain(session.new, session.dirty, session.deleted):
+        layer = LAYER_BY_MODEL.get(type(instance))
+        if layer is None:
+            continue
+        
+        attrs = inspect(instance).attrs
+        tracked = [name for name in TRACKED_ATTRIBUTES if name in attrs]
+        if instance in session.dirty and not any(attrs[name].history.has_changes() for name in tracked):
+            continue
+        
+        cells[layer].add(encode(instance.latitude, instance.longitude))
+        old_lat = attrs.latitude.history.deleted
+        old_lon = attrs.longitude.history.deleted
+        if old_lat or old_lon:
+            cells[layer].add(encode(
+                old_lat[0] if old_lat else instance.latitude,
+                old_lon[0] if old_lon else instance.longitude
+            ))
+    
+    precision = settings.MAP_CLUSTER_MAX_PRECISION
+    rows = [
+        {"layer": layer, "cell": cell[:precision], "created_at": datetime.utcnow()}
+        for layer, layer_cells in cells.items()
+        for cell in sorted({cell[:precision] for cell in layer_cells if cell})
+    ]
+    if rows:
+        session.connection().execute(insert(MapClusterDirtyCell), rows)
+
+# Safe to retry, dirty marks are removed in the same commit as their recomputed cells
+@job(
+    "maps.refresh_clusters",
+    every_seconds=settings.MAP_CLUSTER_REFRESH_SECONDS
+)
+def refresh_clusters_job(db: Session, payloads):
+    refreshed = MapClusterService(db).refresh()
+    if refreshed:
+        logger.info(f"Recomputed {refreshed} map cluster cells")
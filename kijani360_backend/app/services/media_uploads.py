@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from starlette.requests import Request
+from app.core.config import settings
+from app.core.images import render_variants
+from app.models.media import MediaUpload
+
+# Headers and boundaries around the file part, allowed on top of MAX_FILE_SIZE in Content-Length
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Partial uploads are written here, inside UPLOAD_DIR so finished files are renamed, not copied
+INCOMING_DIR = ".incoming"
+
+class UploadError(Exception):
+    """A rejected upload and the HTTP status to answer it with"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class ReceivedFile(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+class _FilePartWriter:
+    """python-multipart callbacks writing one form field straight to disk, hashing as it goes"""
+    
+    def __init__(self, field: str, file, max_size: int):
+        self.field = field
+        self.file = file
+        self.max_size = max_size
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.found = False
+        self._writing = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+    
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+    
+    def _part_begin(self):
+        self._headers = {}
+    
+    def _header_field_data(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+    
+    def _header_value_data(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+    
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+    
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Only the first part with this name, any others are read past and dropped
+        self._writing = not self.found and options.get(b"name", b"").decode("latin-1") == self.field
+        self.found = self.found or self._writing
+    
+    def _part_data(self, data: bytes, start: int, end: int):
+        if not self._writing:
+            return
+        self.size += end - start
+        if self.size > self.max_size:
+            raise UploadError(413, f"File is larger than {self.max_size} bytes")
+        chunk = data[start:end]
+        self.hash.update(chunk)
+        self.file.write(chunk)
+    
+    def _part_end(self):
+        self._writing = False
+
+async def receive_upload(request: Request, field: str = "file", max_size: Optional[int] = None) -> ReceivedFile:
+    """Stream one file field of a multipart body to a temporary file, never holding it in memory"""
+    max_size = max_size or settings.MAX_FILE_SIZE
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError(400, "Expected a multipart/form-data body")
+    
+    # Refused before reading anything when the client already says it is too big
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_size + MULTIPART_OVERHEAD:
+        raise UploadError(413, f"File is larger than {max_size} bytes")
+    
+    incoming = os.path.join(settings.UPLOAD_DIR, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=incoming, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            writer = _FilePartWriter(field, file, max_size)
+            parser = MultipartParser(options[b"boundary"], writer.callbacks())
+            async for chunk in request.stream():
+                # Parsing and the disk write happen in a thread, the event loop only moves bytes
+                await asyncio.to_thread(parser.write, chunk)
+            parser.finalize()
+    except BaseException:
+        os.remove(path)
+        raise
+    
+    if not writer.found or writer.size == 0:
+        os.remove(path)
+        raise UploadError(400, f"No file in form field '{field}'")
+    return ReceivedFile(path=path, sha256=writer.hash.hexdigest(), size=writer.size)
+
+class ImageProcessPool:
+    """Worker processes that decode and resize images, keeping Pillow's CPU time off the event loop"""
+    
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    async def render(self, source: str, directory: str, stem: str) -> Dict:
+        if self._executor is None:
+            # Spawned rather than forked, the API process has threads (job queue, notification listener)
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor,
+                render_variants,
+                source,
+                directory,
+                stem,
+                settings.IMAGE_VARIANT_WIDTHS,
+                settings.IMAGE_MAX_PIXELS
+            )
+        except BrokenProcessPool:
+            # A worker died (killed for memory, say), later uploads get a fresh pool
+            if self._executor is executor:
+                self._executor = None
+            raise
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+image_pool = ImageProcessPool()
+
+def media_url(path: str) -> str:
+    """Public URL of a file under UPLOAD_DIR"""
+    return f"{settings.UPLOAD_URL.rstrip('/')}/{path}"
+
+class MediaService:
+    """Content-addressed image uploads: one stored original and set of WebP variants per distinct file"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    async def store(self, received: ReceivedFile, user_id: int) -> Tuple[MediaUpload, bool]:
+        """Keep a received file, returns (upload, whether the same content was already stored)"""
+        existing = await asyncio.to_thread(self._by_hash, received.sha256)
+        if existing:
+            os.remove(received.path)
+            return existing, True
+        
+        # Files live under their hash, so uploads of the same content racing each other write identical files
+        prefix = received.sha256[:2]
+        try:
+            rendered = await image_pool.render(
+                received.path,
+                os.path.join(settings.UPLOAD_DIR, prefix),
+                received.sha256
+            )
+        except ValueError as e:
+            raise UploadError(415, str(e))
+        finally:
+            # Moved into place by the worker unless it failed
+            if os.path.exists(received.path):
+                os.remove(received.path)
+        
+        upload = MediaUpload(
+            sha256=received.sha256,
+            uploaded_by=user_id,
+            path=f"{prefix}/{rendered['original']}",
+            content_type=rendered["content_type"],
+            size_bytes=received.size,
+            width=rendered["width"],
+            height=rendered["height"],
+            variants={width: f"{prefix}/{name}" for width, name in rendered["variants"].items()}
+        )
+        return await asyncio.to_thread(self._insert, upload)
+    
+    def urls(self, media_ids: Iterable[int]) -> Dict[int, str]:
+        """Original file URL by upload id, unknown ids are left out"""
+        media_ids = set(media_ids)
+        if not media_ids:
+            return {}
+        return {
+            media_id: media_url(path) for media_id, path in self.db.query(
+                MediaUpload.id,
+                MediaUpload.path
+            ).filter(MediaUpload.id.in_(media_ids)).all()
+        }
+    
+    def _by_hash(self, sha256: str) -> Optional[MediaUpload]:
+        return self.db.query(MediaUpload).filter(MediaUpload.sha256 == sha256).first()
+    
+    def _insert(self, upload: MediaUpload) -> Tuple[MediaUpload, bool]:
+        try:
+            self.db.add(upload)
+            self.db.commit()
+        except IntegrityError:
+            # The same file finished uploading elsewhere first
+            self.db.rollback()
+            return self._by_hash(upload.sha256), True
+        self.db.refresh(upload)
+        return upload, False
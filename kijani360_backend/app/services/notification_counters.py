@@ -0,0 +1,254 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import event, func, select, insert, update, case, or_, exists, literal
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.job_queue import job
+from app.models.notifications import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+# Redis hash with "unread" and "total" fields
+COUNTER_KEY = "notifications:counters:{user_id}"
+COUNTER_CACHE_SECONDS = 60 * 60
+
+# session.info entry holding Redis changes to apply once the transaction commits
+PENDING_CHANGES = "notification_counter_changes"
+
+IN_CLAUSE_CHUNK = 5000
+
+# Only adjust hashes that are loaded, a missing hash is rebuilt from SQL on the next read
+INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'unread', ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'total', ARGV[2])
+end
+return 0
+"""
+
+def _counts_select(now: datetime):
+    """(user_id, unread, total, updated_at) per user straight from the notifications table"""
+    return select(
+        Notification.user_id,
+        func.coalesce(func.sum(case((Notification.is_read == False, 1), else_=0)), 0),
+        func.count(Notification.id),
+        literal(now)
+    ).group_by(Notification.user_id)
+
+class NotificationCounterService:
+    """Per-user unread/total notification counters, in SQL and mirrored to Redis"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # ============ WRITES ============
+    # Call after changing notification rows, in the same transaction
+    
+    def record(self, deltas: Dict[int, Tuple[int, int]]):
+        """Apply per-user (unread, total) changes, one UPDATE per distinct change"""
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta != (0, 0)}
+        if not deltas:
+            return
+        
+        user_ids_by_delta: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for user_id, delta in deltas.items():
+            user_ids_by_delta[delta].append(user_id)
+        
+        for (unread, total), user_ids in user_ids_by_delta.items():
+            for i in range(0, len(user_ids), IN_CLAUSE_CHUNK):
+                self._increment(user_ids[i:i + IN_CLAUSE_CHUNK], unread, total)
+        
+        self._after_commit("increment", deltas)
+    
+    def record_created(self, user_ids: Iterable[int]):
+        """New unread notifications, one per occurrence of a user id"""
+        self.record({user_id: (count, count) for user_id, count in Counter(user_ids).items()})
+    
+    def reset_unread(self, user_id: int):
+        """Everything read for this user"""
+        self.db.execute(
+            update(NotificationCounter).where(
+                NotificationCounter.user_id == user_id
+            ).values(
+                unread_count=0,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        self._after_commit("invalidate", [user_id])
+    
+    # ============ READS ============
+    
+    def get_counts(self, user_id: int) -> Dict[str, int]:
+        """{"unread": n, "total": n}, a single Redis hash read when cached"""
+        client = get_redis()
+        key = COUNTER_KEY.format(user_id=user_id)
+        if client is not None:
+            try:
+                cached = client.hgetall(key)
+                if "unread" in cached and "total" in cached:
+                    return {"unread": int(cached["unread"]), "total": int(cached["total"])}
+            except Exception as e:
+                logger.warning(f"Notification counter cache read failed: {e}")
+        
+        row = self.db.query(NotificationCounter).filter(NotificationCounter.user_id == user_id).first()
+        if row:
+            counts = {"unread": row.unread_count, "total": row.total_count}
+        else:
+            # No counter row yet, reconciliation creates it
+            counted = self.db.execute(
+                _counts_select(datetime.utcnow()).where(Notification.user_id == user_id)
+            ).first()
+            counts = {"unread": int(counted[1]), "total": int(counted[2])} if counted else {"unread": 0, "total": 0}
+        
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                pipe.hset(key, mapping=counts)
+                pipe.expire(key, COUNTER_CACHE_SECONDS)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Notification counter cache write failed: {e}")
+        
+        return counts
+    
+    def get_unread_count(self, user_id: int) -> int:
+        return self.get_counts(user_id)["unread"]
+    
+    # ============ RECONCILIATION ============
+    
+    def reconcile(self, batch_size: int = 10000) -> int:
+        """Rebuild drifted counters from the notifications table, returns the number of rows fixed"""
+        now = datetime.utcnow()
+        
+        # Users with notifications but no counter row yet
+        created = self.db.execute(
+            insert(NotificationCounter).from_select(
+                ["user_id", "unread_count", "total_count", "updated_at"],
+                _counts_select(now).where(
+                    ~exists().where(NotificationCounter.user_id == Notification.user_id)
+                )
+            )
+        ).rowcount
+        self.db.commit()
+        fixed = max(created, 0)
+        
+        unread = select(func.count(Notification.id)).where(
+            Notification.user_id == NotificationCounter.user_id,
+            Notification.is_read == False
+        ).scalar_subquery()
+        total = select(func.count(Notification.id)).where(
+            Notification.user_id == NotificationCounter.user_id
+        ).scalar_subquery()
+        
+        last_user_id = 0
+        while True:
+            user_ids = [
+                user_id for (user_id,) in self.db.query(NotificationCounter.user_id).filter(
+                    NotificationCounter.user_id > last_user_id
+                ).order_by(NotificationCounter.user_id).limit(batch_size).all()
+            ]
+            if not user_ids:
+                break
+            
+            result = self.db.execute(
+                update(NotificationCounter).where(
+                    NotificationCounter.user_id.in_(user_ids),
+                    or_(NotificationCounter.unread_count != unread, NotificationCounter.total_count != total)
+                ).values(
+                    unread_count=unread,
+                    total_count=total,
+                    updated_at=now
+                ).execution_options(synchronize_session=False)
+            )
+            fixed += result.rowcount
+            self.db.commit()
+            
+            # The cache can drift on its own (missed increments), reload it from the fixed rows
+            _apply_cache_changes([("invalidate", user_ids)])
+            last_user_id = user_ids[-1]
+        
+        return fixed
+    
+    # ============ HELPERS ============
+    
+    def _increment(self, user_ids: List[int], unread: int, total: int):
+        result = self.db.execute(
+            update(NotificationCounter).where(
+                NotificationCounter.user_id.in_(user_ids)
+            ).values(
+                unread_count=NotificationCounter.unread_count + unread,
+                total_count=NotificationCounter.total_count + total,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount == len(user_ids):
+            return
+        
+        existing = {
+            user_id for (user_id,) in self.db.query(NotificationCounter.user_id).filter(
+                NotificationCounter.user_id.in_(user_ids)
+            ).all()
+        }
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        if not missing:
+            return
+        
+        try:
+            with self.db.begin_nested():
+                # Seeded from the notifications table, which already reflects this change
+                self.db.execute(
+                    insert(NotificationCounter).from_select(
+                        ["user_id", "unread_count", "total_count", "updated_at"],
+                        _counts_select(datetime.utcnow()).where(Notification.user_id.in_(missing))
+                    )
+                )
+        except IntegrityError:
+            # Another writer created some of these rows first, apply the change to them instead
+            self._increment(missing, unread, total)
+    
+    def _after_commit(self, operation: str, argument):
+        self.db.info.setdefault(PENDING_CHANGES, []).append((operation, argument))
+
+def _apply_cache_changes(changes):
+    """Apply ("increment", {user_id: (unread, total)}) and ("invalidate", [user_id]) to Redis"""
+    client = get_redis()
+    if client is None:
+        return
+    
+    try:
+        pipe = client.pipeline(transaction=False)
+        for operation, argument in changes:
+            if operation == "increment":
+                for user_id, (unread, total) in argument.items():
+                    pipe.eval(INCREMENT_SCRIPT, 1, COUNTER_KEY.format(user_id=user_id), unread, total)
+            elif argument:
+                pipe.delete(*[COUNTER_KEY.format(user_id=user_id) for user_id in argument])
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Notification counter cache update failed, reconciliation will correct it: {e}")
+
+@event.listens_for(Session, "after_commit")
+def _flush_counter_changes(session: Session):
+    changes = session.info.pop(PENDING_CHANGES, None)
+    if changes:
+        _apply_cache_changes(changes)
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_counter_changes(session: Session, transaction):
+    # Savepoints can roll back without losing the outer transaction's changes
+    if transaction.parent is None:
+        session.info.pop(PENDING_CHANGES, None)
+
+@job(
+    "notifications.reconcile_counters",
+    max_retries=0,
+    every_seconds=settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS
+)
+def reconcile_counters_job(db: Session, payloads):
+    fixed = NotificationCounterService(db).reconcile()
+    if fixed:
+        logger.info(f"Reconciled {fixed} notification counters")
@@ -0,0 +1,137 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.job_queue import job
+from app.models.notifications import Notification, NotificationDigestEntry
+from app.schemas.notifications import NotificationType
+from app.services.notification_counters import NotificationCounterService
+from app.services.notification_stream import notification_broker
+
+logger = logging.getLogger(__name__)
+
+# Low-priority types users can take as a daily digest, with (singular, plural) labels for the summary
+DIGEST_LABELS = {
+    NotificationType.POST_LIKE.value: ("like on your posts", "likes on your posts"),
+    NotificationType.FORUM_REPLY.value: ("reply to your forum topics", "replies to your forum topics"),
+}
+DIGEST_TYPES = frozenset(DIGEST_LABELS)
+
+# (user_id, day, type) -> (events, last actor)
+DigestEvents = Dict[Tuple[int, str, str], Tuple[int, Optional[str]]]
+
+class NotificationDigestService:
+    """Holds low-priority events as per-day counts and sends each user one summary per finished day"""
+    
+    def __init__(self, db: Session, batch_size: int = 1000):
+        self.db = db
+        self.batch_size = batch_size
+        self.counters = NotificationCounterService(db)
+    
+    def hold(self, events: DigestEvents, now: datetime):
+        """Add events to their digest rows, in the caller's transaction"""
+        for (user_id, day, notification_type), (count, last_actor) in events.items():
+            if self._increment(user_id, day, notification_type, count, last_actor, now):
+                continue
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(insert(NotificationDigestEntry).values(
+                        user_id=user_id,
+                        day=day,
+                        type=notification_type,
+                        event_count=count,
+                        last_actor=last_actor,
+                        updated_at=now
+                    ))
+            except IntegrityError:
+                # Another worker created the row first
+                self._increment(user_id, day, notification_type, count, last_actor, now)
+    
+    def send_due(self, now: Optional[datetime] = None) -> int:
+        """Turn every day before today into one digest notification per user, returns digests sent"""
+        now = now or datetime.utcnow()
+        today = now.strftime("%Y-%m-%d")
+        
+        sent = 0
+        last_user_id = 0
+        while True:
+            user_ids = [
+                user_id for (user_id,) in self.db.query(NotificationDigestEntry.user_id).filter(
+                    NotificationDigestEntry.day < today,
+                    NotificationDigestEntry.user_id > last_user_id
+                ).distinct().order_by(NotificationDigestEntry.user_id).limit(self.batch_size).all()
+            ]
+            if not user_ids:
+                break
+            
+            entries = self.db.query(NotificationDigestEntry).filter(
+                NotificationDigestEntry.user_id.in_(user_ids),
+                NotificationDigestEntry.day < today
+            ).order_by(NotificationDigestEntry.user_id, NotificationDigestEntry.day).all()
+            
+            digests: Dict[Tuple[int, str], List[NotificationDigestEntry]] = {}
+            for entry in entries:
+                digests.setdefault((entry.user_id, entry.day), []).append(entry)
+            
+            rows = [self._digest_row(user_id, day, day_entries, now) for (user_id, day), day_entries in digests.items()]
+            self.db.execute(insert(Notification), rows)
+            self.db.execute(
+                delete(NotificationDigestEntry).where(
+                    NotificationDigestEntry.id.in_([entry.id for entry in entries])
+                ).execution_options(synchronize_session=False)
+            )
+            self.counters.record_created([row["user_id"] for row in rows])
+            self.db.commit()
+            notification_broker.publish(user_ids)
+            
+            sent += len(rows)
+            last_user_id = user_ids[-1]
+        
+        return sent
+    
+    def _increment(self, user_id: int, day: str, notification_type: str, count: int, last_actor: Optional[str], now: datetime) -> bool:
+        values = {"event_count": NotificationDigestEntry.event_count + count, "updated_at": now}
+        if last_actor:
+            values["last_actor"] = last_actor
+        result = self.db.execute(
+            update(NotificationDigestEntry).where(
+                NotificationDigestEntry.user_id == user_id,
+                NotificationDigestEntry.day == day,
+                NotificationDigestEntry.type == notification_type
+            ).values(**values).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def _digest_row(self, user_id: int, day: str, entries: List[NotificationDigestEntry], now: datetime) -> Dict[str, Any]:
+        parts = []
+        for entry in sorted(entries, key=lambda entry: -entry.event_count):
+            singular, plural = DIGEST_LABELS.get(entry.type, (entry.type, entry.type))
+            parts.append(f"{entry.event_count} {singular if entry.event_count == 1 else plural}")
+        
+        return {
+            "user_id": user_id,
+            "title": "📬 Your Daily Digest",
+            "message": f"On {day} you got " + ", ".join(parts),
+            "type": NotificationType.DAILY_DIGEST.value,
+            "data": {
+                "day": day,
+                "counts": {entry.type: entry.event_count for entry in entries},
+                "last_actors": {entry.type: entry.last_actor for entry in entries if entry.last_actor}
+            },
+            "is_read": False,
+            "created_at": now
+        }
+
+# Safe to retry, entries are deleted in the same commit as their digest
+@job(
+    "notifications.daily_digests",
+    queue="notifications",
+    every_seconds=settings.NOTIFICATION_DIGEST_INTERVAL_MINUTES * 60
+)
+def daily_digests_job(db: Session, payloads):
+    sent = NotificationDigestService(db).send_due()
+    if sent:
+        logger.info(f"Sent {sent} daily notification digests")
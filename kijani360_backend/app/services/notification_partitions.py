@@ -0,0 +1,314 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, delete, text, inspect
+from app.core.config import settings
+from app.core.job_queue import job
+from app.models.notifications import Notification, NotificationPartition
+from app.services.notification_counters import NotificationCounterService
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_TABLE = Notification.__tablename__
+LEGACY_PARTITION = f"{NOTIFICATIONS_TABLE}_legacy"
+# Unique indexes on a partitioned table must include created_at, so each partition enforces one open group itself
+OPEN_GROUP_INDEX = "ix_notifications_open_group"
+# Catches rows no month partition covers yet, so inserts keep working when maintenance falls behind
+DEFAULT_PARTITION = f"{NOTIFICATIONS_TABLE}_default"
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1)
+
+def partition_name(starts_at: datetime) -> str:
+    return f"{NOTIFICATIONS_TABLE}_p{starts_at:%Y_%m}"
+
+class NotificationPartitionService:
+    """Monthly notification partitions: created ahead of time, retention drops whole months"""
+    
+    # On a partitioned Postgres table each month is a real partition. Elsewhere months are id
+    # ranges recorded as they start, so retention still removes whole months by primary key.
+    
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.NOTIFICATION_RETENTION_BATCH_SIZE
+        self.counters = NotificationCounterService(db)
+    
+    def is_native(self) -> bool:
+        """True when notifications is a partitioned Postgres table"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return False
+        return bool(self.db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table)"
+        ), {"table": NOTIFICATIONS_TABLE}).scalar())
+    
+    # ============ MAINTENANCE ============
+    
+    def ensure(self, now: Optional[datetime] = None) -> List[str]:
+        """Create this month's and the next few months' partitions, returns the names created"""
+        now = now or datetime.utcnow()
+        native = self.is_native()
+        existing = self.db.query(NotificationPartition).all()
+        
+        created = []
+        current = month_start(now)
+        first = current
+        if native:
+            self.db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {NOTIFICATIONS_TABLE} DEFAULT"))
+            stray = self.db.execute(text(f"SELECT min(created_at) FROM {DEFAULT_PARTITION}")).scalar()
+            if stray is not None and stray < add_months(current, settings.NOTIFICATION_PARTITIONS_AHEAD + 1):
+                # Their months are created below and the rows moved out, retention only drops real partitions
+                logger.warning(
+                    f"Notifications since {stray:%Y-%m-%d} landed in {DEFAULT_PARTITION}, "
+                    f"partition maintenance fell behind"
+                )
+                first = min(first, month_start(stray))
+        
+        behind = (current.year - first.year) * 12 + current.month - first.month
+        for i in range(-behind, settings.NOTIFICATION_PARTITIONS_AHEAD + 1):
+            starts_at = add_months(current, i)
+            ends_at = add_months(starts_at, 1)
+            if any(p.starts_at < ends_at and p.ends_at > starts_at for p in existing):
+                continue
+            
+            name = partition_name(starts_at)
+            if native:
+                self._create_native(name, starts_at, ends_at)
+            self.db.add(NotificationPartition(name=name, starts_at=starts_at, ends_at=ends_at, is_native=native))
+            created.append(name)
+        self.db.flush()
+        self.ensure_open_groups(native)
+        
+        if not native:
+            # A simulated month starts at the next id after it begins (up to one maintenance interval late)
+            started = self.db.query(NotificationPartition).filter(
+                NotificationPartition.is_native == False,
+                NotificationPartition.first_id == None,
+                NotificationPartition.starts_at <= now
+            ).all()
+            if started:
+                first_id = (self.db.query(func.max(Notification.id)).scalar() or 0) + 1
+                for partition in started:
+                    partition.first_id = first_id
+        
+        self.db.commit()
+        return created
+    
+    def _create_native(self, name: str, starts_at: datetime, ends_at: datetime):
+        """Create one month's partition, moving in any of its rows the default partition caught"""
+        # Bounds are generated dates, DDL does not take bind parameters
+        bounds = f"FROM ('{starts_at:%Y-%m-%d}') TO ('{ends_at:%Y-%m-%d}')"
+        in_range = f"created_at >= '{starts_at:%Y-%m-%d}' AND created_at < '{ends_at:%Y-%m-%d}'"
+        if not self.db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")).scalar():
+            self.db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {NOTIFICATIONS_TABLE} FOR VALUES {bounds}"
+            ))
+            return
+        
+        # A new partition cannot overlap rows still in the default one, fill it detached and attach it
+        self.db.execute(text(f"CREATE TABLE {name} (LIKE {NOTIFICATIONS_TABLE} INCLUDING DEFAULTS)"))
+        self.db.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ))
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    
+    def ensure_open_groups(self, native: bool):
+        """Add the one-open-group unique index where missing, closing duplicate groups older writers left first"""
+        if native:
+            tables = [p.name for p in self.db.query(NotificationPartition).filter(NotificationPartition.is_native == True)]
+            tables.append(DEFAULT_PARTITION)
+        else:
+            tables = [NOTIFICATIONS_TABLE]
+        
+        inspector = inspect(self.db.connection())
+        for table in tables:
+            if any(
+                index["unique"] and index["column_names"] == ["user_id", "group_key"]
+                for index in inspector.get_indexes(table)
+            ):
+                continue
+            
+            # All but the newest unread notification of a group leave it, they stay unread
+            self.db.execute(text(
+                f"UPDATE {table} SET group_key = NULL WHERE is_read = false AND group_key IS NOT NULL "
+                f"AND id NOT IN (SELECT max(id) FROM {table} WHERE is_read = false AND group_key IS NOT NULL "
+                f"GROUP BY user_id, group_key)"
+            ))
+            if native:
+                self.db.execute(text(
+                    f"CREATE UNIQUE INDEX {table}_open_group ON {table} (user_id, group_key) "
+                    f"WHERE is_read = false AND group_key IS NOT NULL"
+                ))
+            else:
+                index = next(index for index in Notification.__table__.indexes if index.name == OPEN_GROUP_INDEX)
+                index.create(bind=self.db.connection())
+            logger.info(f"Added the open notification group index to {table}")
+    
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Remove months entirely past NOTIFICATION_RETENTION_DAYS, returns notifications removed"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+        partitions = self.db.query(NotificationPartition).order_by(NotificationPartition.starts_at).all()
+        
+        removed = 0
+        for index, partition in enumerate(partitions):
+            if partition.ends_at > cutoff:
+                break
+            
+            if partition.is_native:
+                removed += self._drop(partition.name)
+            elif partition.first_id is not None:
+                upper = next((p.first_id for p in partitions[index + 1:] if p.first_id is not None), None)
+                if upper is None:
+                    break
+                removed += self.delete_where(Notification.id >= partition.first_id, Notification.id < upper)
+            
+            self.db.delete(partition)
+            self.db.commit()
+        
+        # Rows written before simulated partitioning started belong to no month, age them out row by row
+        if not self.is_native():
+            first_ids = [p.first_id for p in partitions if p.first_id is not None]
+            criteria = [Notification.created_at < cutoff]
+            if first_ids:
+                criteria.append(Notification.id < min(first_ids))
+            removed += self.delete_where(*criteria)
+        
+        return removed
+    
+    def delete_where(self, *criteria) -> int:
+        """Delete matching notifications in id-ordered batches, one short transaction each"""
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = [
+                notification_id for (notification_id,) in self.db.query(Notification.id).filter(
+                    *criteria,
+                    Notification.id > last_id
+                ).order_by(Notification.id).limit(self.batch_size).all()
+            ]
+            if not ids:
+                break
+            
+            per_user = self.db.query(
+                Notification.user_id,
+                func.sum(case((Notification.is_read == False, 1), else_=0)),
+                func.count(Notification.id)
+            ).filter(Notification.id.in_(ids)).group_by(Notification.user_id).all()
+            
+            self.db.execute(
+                delete(Notification).where(Notification.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            self.counters.record({user_id: (-int(unread or 0), -total) for user_id, unread, total in per_user})
+            self.db.commit()
+            
+            deleted += len(ids)
+            last_id = ids[-1]
+            if len(ids) < self.batch_size:
+                break
+        
+        return deleted
+    
+    def _drop(self, name: str) -> int:
+        """Drop one native partition, adjusting counters in the same transaction"""
+        per_user = self.db.execute(text(
+            f"SELECT user_id, SUM(CASE WHEN is_read = false THEN 1 ELSE 0 END), COUNT(*) FROM {name} GROUP BY user_id"
+        )).all()
+        self.db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        self.counters.record({user_id: (-int(unread or 0), -total) for user_id, unread, total in per_user})
+        return sum(total for _, _, total in per_user)
+    
+    # ============ READS ============
+    
+    def recent_criteria(self, months: Optional[int] = None, now: Optional[datetime] = None) -> list:
+        """Filters limiting a notification query to the most recent monthly partitions"""
+        months = months or settings.NOTIFICATION_LIST_MONTHS
+        floor = add_months(month_start(now or datetime.utcnow()), 1 - months)
+        
+        # Postgres prunes partitions on created_at, the simulated layout needs the id range
+        criteria = [Notification.created_at >= floor]
+        # Only a month created ahead had its first id recorded as it started, one first seen mid-month
+        # (the deploy month) starts at whatever id came next and older rows of that month sit below it
+        first_id = self.db.query(NotificationPartition.first_id).filter(
+            NotificationPartition.is_native == False,
+            NotificationPartition.starts_at == floor,
+            NotificationPartition.created_at < NotificationPartition.starts_at
+        ).scalar()
+        if first_id is not None:
+            criteria.append(Notification.id >= first_id)
+        return criteria
+    
+    # ============ CONVERSION ============
+    
+    def convert_to_partitioned(self, now: Optional[datetime] = None) -> bool:
+        """Turn a plain Postgres notifications table into a partitioned one, existing rows become one partition"""
+        if self.db.get_bind().dialect.name != "postgresql" or self.is_native():
+            return False
+        
+        now = now or datetime.utcnow()
+        # Existing rows include this month's, so native months begin next month
+        bound = add_months(month_start(now), 1)
+        
+        self.db.execute(text(f"LOCK TABLE {NOTIFICATIONS_TABLE} IN ACCESS EXCLUSIVE MODE"))
+        self.db.execute(text(f"UPDATE {NOTIFICATIONS_TABLE} SET created_at = now() WHERE created_at IS NULL"))
+        # Attached partitions need the same NOT NULL constraints as the parent
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+        sequence = self.db.execute(text(f"SELECT pg_get_serial_sequence('{NOTIFICATIONS_TABLE}', 'id')")).scalar()
+        
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} RENAME TO {LEGACY_PARTITION}"))
+        # Free the index names for the partitioned table
+        for (index_name,) in self.db.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+        ), {"table": LEGACY_PARTITION}).all():
+            self.db.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}_legacy"))
+        
+        self.db.execute(text(
+            f"CREATE TABLE {NOTIFICATIONS_TABLE} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (created_at)"
+        ))
+        # The partition key has to be part of the primary key
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} ADD PRIMARY KEY (id, created_at)"))
+        self.db.execute(text(f"ALTER TABLE {NOTIFICATIONS_TABLE} ADD FOREIGN KEY (user_id) REFERENCES users (id)"))
+        if sequence:
+            self.db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {NOTIFICATIONS_TABLE}.id"))
+        self.db.execute(text(
+            f"ALTER TABLE {NOTIFICATIONS_TABLE} ATTACH PARTITION {LEGACY_PARTITION} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{bound:%Y-%m-%d}')"
+        ))
+        for index in Notification.__table__.indexes:
+            if index.name != OPEN_GROUP_INDEX:
+                index.create(bind=self.db.connection())
+        
+        # Earlier simulated months are covered by the legacy partition now
+        self.db.query(NotificationPartition).delete(synchronize_session=False)
+        oldest = self.db.query(func.min(Notification.created_at)).scalar() or now
+        self.db.add(NotificationPartition(
+            name=LEGACY_PARTITION,
+            starts_at=month_start(oldest),
+            ends_at=bound,
+            is_native=True
+        ))
+        self.db.commit()
+        
+        self.ensure(now)
+        return True
+
+# Safe to retry, each step is idempotent
+@job(
+    "notifications.partitions",
+    queue="notifications",
+    every_seconds=settings.NOTIFICATION_PARTITION_MAINTENANCE_SECONDS
+)
+def partition_maintenance_job(db: Session, payloads):
+    service = NotificationPartitionService(db)
+    created = service.ensure()
+    removed = service.expire()
+    if created or removed:
+        logger.info(f"Notification partitions: created {len(created)}, removed {removed} expired notifications")
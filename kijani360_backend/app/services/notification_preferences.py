@@ -0,0 +1,115 @@
+import json
+import logging
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Set
+from sqlalchemy.orm import Session
+from sqlalchemy import Boolean
+from app.core.redis import get_redis
+from app.models.notifications import NotificationPreference
+
+logger = logging.getLogger(__name__)
+
+PREFERENCE_CACHE_KEY = "notifications:preferences:{user_id}"
+PREFERENCE_CACHE_SECONDS = 10 * 60
+
+# Cached for users without a preferences row, read back as DEFAULT_PREFERENCES without parsing
+UNSET = "default"
+
+IN_CLAUSE_CHUNK = 5000
+
+PREFERENCE_FLAGS = tuple(
+    column.name for column in NotificationPreference.__table__.columns
+    if isinstance(column.type, Boolean)
+)
+# Shared by every unset user, read-only so no caller can change it for the others
+DEFAULT_PREFERENCES: Mapping[str, bool] = MappingProxyType({
+    column.name: bool(column.default.arg) for column in NotificationPreference.__table__.columns
+    if column.name in PREFERENCE_FLAGS
+})
+
+class NotificationPreferenceResolver:
+    """Preferences for a set of recipients: cache first, one query for the misses, defaults for unset users"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        # Resolved for this resolver's lifetime, typically one job batch or request
+        self._resolved: Dict[int, Mapping[str, bool]] = {}
+    
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, Mapping[str, bool]]:
+        user_ids = list(dict.fromkeys(user_ids))
+        resolved = {user_id: self._resolved[user_id] for user_id in user_ids if user_id in self._resolved}
+        missing = [user_id for user_id in user_ids if user_id not in resolved]
+        
+        client = get_redis()
+        if missing and client is not None:
+            try:
+                cached = client.mget([PREFERENCE_CACHE_KEY.format(user_id=user_id) for user_id in missing])
+                for user_id, value in zip(missing, cached):
+                    if value == UNSET:
+                        resolved[user_id] = DEFAULT_PREFERENCES
+                    elif value:
+                        resolved[user_id] = json.loads(value)
+                missing = [user_id for user_id in missing if user_id not in resolved]
+            except Exception as e:
+                logger.warning(f"Notification preference cache read failed: {e}")
+        
+        if missing:
+            loaded = self._load(missing)
+            for user_id in missing:
+                resolved[user_id] = loaded.get(user_id, DEFAULT_PREFERENCES)
+            self._cache(missing, loaded, client)
+        
+        self._resolved.update(resolved)
+        return resolved
+    
+    def get(self, user_id: int) -> Mapping[str, bool]:
+        return self.get_many([user_id])[user_id]
+    
+    def allows(self, user_ids: Iterable[int], flag: str) -> List[int]:
+        """The given users that have this preference on, in order"""
+        user_ids = list(user_ids)
+        preferences = self.get_many(user_ids)
+        return [user_id for user_id in user_ids if preferences[user_id][flag]]
+    
+    def opted_out(self, flag: str) -> Set[int]:
+        """Users who turned this preference off, broadcasts filter everyone else in memory"""
+        return {
+            user_id for (user_id,) in self.db.query(NotificationPreference.user_id).filter(
+                getattr(NotificationPreference, flag) == (not DEFAULT_PREFERENCES[flag])
+            ).all()
+        }
+    
+    def invalidate(self, user_id: int):
+        """Drop a user's cached preferences, call after committing a change to them"""
+        self._resolved.pop(user_id, None)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(PREFERENCE_CACHE_KEY.format(user_id=user_id))
+            except Exception as e:
+                logger.warning(f"Notification preference cache invalidation failed: {e}")
+    
+    def _load(self, user_ids: List[int]) -> Dict[int, Dict[str, bool]]:
+        columns = [getattr(NotificationPreference, flag) for flag in PREFERENCE_FLAGS]
+        loaded = {}
+        for i in range(0, len(user_ids), IN_CLAUSE_CHUNK):
+            for user_id, *values in self.db.query(NotificationPreference.user_id, *columns).filter(
+                NotificationPreference.user_id.in_(user_ids[i:i + IN_CLAUSE_CHUNK])
+            ).all():
+                loaded[user_id] = {
+                    flag: DEFAULT_PREFERENCES[flag] if value is None else bool(value)
+                    for flag, value in zip(PREFERENCE_FLAGS, values)
+                }
+        return loaded
+    
+    def _cache(self, user_ids: List[int], loaded: Dict[int, Dict[str, bool]], client):
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                value = json.dumps(loaded[user_id]) if user_id in loaded else UNSET
+                pipe.set(PREFERENCE_CACHE_KEY.format(user_id=user_id), value, ex=PREFERENCE_CACHE_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Notification preference cache write failed: {e}")
@@ -1,14 +1,44 @@
-from typing import Optional, Dict, Any, List
+import csv
+import io
+import json
+import logging
+from typing import Optional, Dict, Any, List, Iterable
 from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from app.models.notifications import Notification, NotificationPreference
 from app.models.user import User
-from app.models.forum import TreePlantingStreak
+from app.models.notifications import Notification
 from app.schemas.notifications import NotificationType
+from app.core.job_queue import job, job_queue
+from app.services.notification_stream import notification_broker
+from app.services.notification_counters import NotificationCounterService
+from app.services.notification_preferences import NotificationPreferenceResolver
+from app.services.notification_partitions import NotificationPartitionService
+from app.services.notification_digest import NotificationDigestService, DIGEST_TYPES
+from app.services.watering_reminders import WateringReminderScheduler
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Column defaults are applied by SQLAlchemy, COPY has to list every column that has one
+NOTIFICATION_COPY_COLUMNS = ("user_id", "title", "message", "type", "data", "is_read", "created_at", "actor_count")
+
+# Actor ids kept on a coalesced notification so repeat actors are not counted twice
+MAX_TRACKED_ACTORS = 50
+
+def coalesced_message(actor: str, actor_count: int, action: str) -> str:
+    """'Amina replied to ...', 'Amina and 12 others replied to ...'"""
+    if actor_count <= 1:
+        return f"{actor} {action}"
+    others = actor_count - 1
+    return f"{actor} and {others} other{'s' if others > 1 else ''} {action}"
 
 class NotificationService:
     def __init__(self, db: Session):
         self.db = db
+        self.counters = NotificationCounterService(db)
+        self.preferences = NotificationPreferenceResolver(db)
     
     def create_notification(
         self,
@@ -28,174 +58,431 @@ class NotificationService:
         )
         
         self.db.add(notification)
+        self.db.flush()
+        self.counters.record_created([user_id])
         self.db.commit()
         self.db.refresh(notification)
+        notification_broker.publish([user_id])
         
         return notification
     
-    def send_watering_reminders(self):
-        """Send watering reminders to users with active streaks"""
-        # Get users with trees that need watering
-        active_streaks = self.db.query(TreePlantingStreak).filter(
-            TreePlantingStreak.is_active == True,
-            TreePlantingStreak.next_watering_date <= datetime.utcnow()
-        ).all()
-        
-        for streak in active_streaks:
-            # Check if user wants watering reminders
-            preferences = self.db.query(NotificationPreference).filter(
-                NotificationPreference.user_id == streak.user_id
-            ).first()
+    def create_notifications_bulk(
+        self,
+        user_ids: Iterable[int],
+        title: str,
+        message: str,
+        notification_type: NotificationType,
+        data: Optional[Dict[str, Any]] = None,
+        chunk_size: int = 5000
+    ) -> Dict[str, int]:
+        """Create the same notification for many users with one multi-row write per chunk"""
+        now = datetime.utcnow()
+        use_copy = self.db.get_bind().dialect.name == "postgresql"
+        
+        created = 0
+        chunk = []
+        for user_id in user_ids:
+            chunk.append(user_id)
+            if len(chunk) >= chunk_size:
+                created += self._write_notifications(chunk, title, message, notification_type, data, now, use_copy)
+                chunk = []
+        if chunk:
+            created += self._write_notifications(chunk, title, message, notification_type, data, now, use_copy)
+        
+        return {"created": created}
+    
+    def _write_notifications(
+        self,
+        user_ids: List[int],
+        title: str,
+        message: str,
+        notification_type: NotificationType,
+        data: Optional[Dict[str, Any]],
+        created_at: datetime,
+        use_copy: bool
+    ) -> int:
+        """Write and commit one chunk of notifications"""
+        if use_copy:
+            # COPY streams the chunk in one round trip on Postgres
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            payload = json.dumps(data) if data is not None else ""
+            for user_id in user_ids:
+                writer.writerow([user_id, title, message, notification_type.value, payload, "f", created_at.isoformat(), 1])
+            buffer.seek(0)
             
-            if preferences and preferences.watering_reminders:
-                self.create_notification(
-                    user_id=streak.user_id,
-                    title="🌱 Time to Water Your Trees!",
-                    message=f"Your {streak.tree_species} needs watering. Keep your streak alive!",
-                    notification_type=NotificationType.WATERING_REMINDER,
-                    data={
-                        "streak_id": streak.id,
-                        "tree_species": streak.tree_species,
-                        "days_overdue": (datetime.utcnow() - streak.next_watering_date).days
-                    }
+            cursor = self.db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY notifications ({', '.join(NOTIFICATION_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
                 )
+            finally:
+                cursor.close()
+        else:
+            self.db.execute(insert(Notification), [
+                {
+                    "user_id": user_id,
+                    "title": title,
+                    "message": message,
+                    "type": notification_type.value,
+                    "data": data,
+                    "is_read": False,
+                    "created_at": created_at
+                }
+                for user_id in user_ids
+            ])
+        
+        self.counters.record_created(user_ids)
+        self.db.commit()
+        notification_broker.publish(user_ids)
+        return len(user_ids)
+    
+    # ============ ENQUEUE ============
+    
+    def send_watering_reminders(self) -> str:
+        """Queue a watering reminder run now, it also runs on a schedule"""
+        return job_queue.enqueue("notifications.watering_reminders")
     
     def send_achievement_notification(
         self,
         user_id: int,
         achievement_name: str,
         achievement_description: str
-    ):
-        """Send achievement unlocked notification"""
-        preferences = self.db.query(NotificationPreference).filter(
-            NotificationPreference.user_id == user_id
-        ).first()
-        
-        if preferences and preferences.achievement_unlocked:
-            self.create_notification(
-                user_id=user_id,
-                title="🏆 Achievement Unlocked!",
-                message=f"Congratulations! You've earned: {achievement_name}",
-                notification_type=NotificationType.ACHIEVEMENT_UNLOCKED,
-                data={
-                    "achievement_name": achievement_name,
-                    "description": achievement_description
-                }
-            )
+    ) -> str:
+        """Queue an achievement unlocked notification"""
+        return job_queue.enqueue("notifications.deliver", {
+            "user_id": user_id,
+            "title": "🏆 Achievement Unlocked!",
+            "message": f"Congratulations! You've earned: {achievement_name}",
+            "type": NotificationType.ACHIEVEMENT_UNLOCKED.value,
+            "data": {
+                "achievement_name": achievement_name,
+                "description": achievement_description
+            },
+            "preference": "achievement_unlocked"
+        })
     
     def send_streak_milestone_notification(
         self,
         user_id: int,
         streak_days: int,
         tree_species: str
-    ):
-        """Send streak milestone notification"""
+    ) -> Optional[str]:
+        """Queue a streak milestone notification"""
         milestones = [7, 14, 30, 60, 100, 365]
         
         if streak_days in milestones:
-            self.create_notification(
-                user_id=user_id,
-                title=f"🔥 {streak_days} Day Streak!",
-                message=f"Amazing! You've maintained your {tree_species} for {streak_days} days straight!",
-                notification_type=NotificationType.STREAK_MILESTONE,
-                data={
+            return job_queue.enqueue("notifications.deliver", {
+                "user_id": user_id,
+                "title": f"🔥 {streak_days} Day Streak!",
+                "message": f"Amazing! You've maintained your {tree_species} for {streak_days} days straight!",
+                "type": NotificationType.STREAK_MILESTONE.value,
+                "data": {
                     "streak_days": streak_days,
                     "tree_species": tree_species,
                     "milestone": True
-                }
-            )
+                },
+                "preference": None
+            })
+        return None
     
     def send_forum_reply_notification(
         self,
         user_id: int,
         topic_title: str,
         replier_username: str,
-        topic_id: int
-    ):
-        """Send notification when someone replies to user's forum topic"""
-        preferences = self.db.query(NotificationPreference).filter(
-            NotificationPreference.user_id == user_id
-        ).first()
-        
-        if preferences and preferences.forum_replies:
-            self.create_notification(
-                user_id=user_id,
-                title="💬 New Reply to Your Topic",
-                message=f"{replier_username} replied to '{topic_title}'",
-                notification_type=NotificationType.FORUM_REPLY,
-                data={
-                    "topic_id": topic_id,
-                    "topic_title": topic_title,
-                    "replier_username": replier_username
-                }
-            )
+        topic_id: int,
+        replier_id: Optional[int] = None
+    ) -> str:
+        """Queue a notification when someone replies to user's forum topic, replies coalesce per topic"""
+        return job_queue.enqueue("notifications.deliver", {
+            "user_id": user_id,
+            "title": "💬 New Reply to Your Topic",
+            "message": f"{replier_username} replied to '{topic_title}'",
+            "type": NotificationType.FORUM_REPLY.value,
+            "data": {
+                "topic_id": topic_id,
+                "topic_title": topic_title,
+                "replier_username": replier_username
+            },
+            "preference": "forum_replies",
+            "group_key": f"forum_reply:topic:{topic_id}",
+            "actor": replier_username,
+            "actor_id": replier_id,
+            "action": f"replied to '{topic_title}'"
+        })
+    
+    def send_like_notification(
+        self,
+        user_id: int,
+        liker_id: int,
+        liker_username: str,
+        target_type: str,
+        target_id: int
+    ) -> str:
+        """Queue a notification when someone likes user's post, likes coalesce per post"""
+        return job_queue.enqueue("notifications.deliver", {
+            "user_id": user_id,
+            "title": "❤️ New Like",
+            "message": f"{liker_username} liked your post",
+            "type": NotificationType.POST_LIKE.value,
+            "data": {
+                "target_type": target_type,
+                "target_id": target_id,
+                "liker_username": liker_username
+            },
+            "preference": None,
+            "group_key": f"like:{target_type}:{target_id}",
+            "actor": liker_username,
+            "actor_id": liker_id,
+            "action": "liked your post"
+        })
     
     def send_community_update(
         self,
         title: str,
         message: str,
         data: Optional[Dict[str, Any]] = None
-    ):
-        """Send community update to all users who opted in"""
-        users_with_preferences = self.db.query(User).join(
-            NotificationPreference,
-            User.id == NotificationPreference.user_id
-        ).filter(
-            NotificationPreference.community_updates == True
-        ).all()
-        
-        for user in users_with_preferences:
-            self.create_notification(
-                user_id=user.id,
-                title=title,
-                message=message,
-                notification_type=NotificationType.COMMUNITY_UPDATE,
-                data=data
-            )
-    
-    def send_push_notification(self, notification_id: int):
-        """Send push notification (placeholder for actual push service integration)"""
+    ) -> str:
+        """Queue a community update for all users who opted in"""
+        return job_queue.enqueue("notifications.community_update", {
+            "title": title,
+            "message": message,
+            "data": data
+        })
+    
+    def send_push_notification(self, notification_id: int) -> str:
+        """Queue a push for an existing notification"""
+        return job_queue.enqueue("notifications.push", {"notification_id": notification_id})
+    
+    def send_push_notifications_bulk(
+        self,
+        user_ids: List[int],
+        title: str,
+        message: str,
+        chunk_size: int = 5000
+    ) -> List[str]:
+        """Queue one push job per chunk of users"""
+        return [
+            job_queue.enqueue("notifications.push", {
+                "user_ids": user_ids[i:i + chunk_size],
+                "title": title,
+                "message": message
+            })
+            for i in range(0, len(user_ids), chunk_size)
+        ]
+    
+    # ============ DELIVERY (run by job handlers) ============
+    
+    def deliver_notifications(self, payloads: List[Dict[str, Any]]) -> int:
+        """Create queued notifications that pass their preference check, merged or held for digests where configured"""
+        preference_user_ids = {
+            payload["user_id"] for payload in payloads
+            if payload.get("preference") or payload["type"] in DIGEST_TYPES
+        }
+        preferences = self.preferences.get_many(preference_user_ids)
+        
+        now = datetime.utcnow()
+        day = now.strftime("%Y-%m-%d")
+        rows = []
+        created_user_ids = []
+        merged_user_ids = set()
+        held: Dict[tuple, tuple] = {}
+        for payload in payloads:
+            user_id = payload["user_id"]
+            flag = payload.get("preference")
+            if flag and not preferences[user_id][flag]:
+                continue
+            
+            # Users on daily digests get low-priority types as one summary per day
+            if payload["type"] in DIGEST_TYPES and preferences[user_id]["daily_digest"]:
+                key = (user_id, day, payload["type"])
+                count, _ = held.get(key, (0, None))
+                held[key] = (count + 1, payload.get("actor"))
+                continue
+            
+            row = {
+                "user_id": user_id,
+                "title": payload["title"],
+                "message": payload["message"],
+                "type": payload["type"],
+                "data": payload.get("data"),
+                "is_read": False,
+                "created_at": now,
+                "group_key": payload.get("group_key"),
+                "actor_count": 1,
+                "updated_at": None
+            }
+            # Grouped events merge into an open notification for the same target, the rest share one insert
+            if not row["group_key"]:
+                rows.append(row)
+            elif self._coalesce(payload, now):
+                merged_user_ids.add(user_id)
+            else:
+                # Written now so later events in this batch merge into it
+                if payload.get("actor_id") is not None:
+                    row["data"] = {**(row["data"] or {}), "actor_ids": [payload["actor_id"]]}
+                if self._open_group(payload, row, now):
+                    created_user_ids.append(user_id)
+                else:
+                    merged_user_ids.add(user_id)
+        
+        if rows:
+            self.db.execute(insert(Notification), rows)
+            created_user_ids.extend(row["user_id"] for row in rows)
+        if held:
+            NotificationDigestService(self.db).hold(held, now)
+        if created_user_ids:
+            self.counters.record_created(created_user_ids)
+        
+        if created_user_ids or merged_user_ids or held:
+            self.db.commit()
+            notification_broker.publish(set(created_user_ids) | merged_user_ids)
+        return len(created_user_ids)
+    
+    def _coalesce(self, payload: Dict[str, Any], now: datetime) -> bool:
+        """Merge an event into the user's open notification for its group, False when there is none"""
+        cutoff = now - timedelta(minutes=settings.NOTIFICATION_COALESCE_WINDOW_MINUTES)
         notification = self.db.query(Notification).filter(
-            Notification.id == notification_id
-        ).first()
+            Notification.user_id == payload["user_id"],
+            Notification.group_key == payload["group_key"],
+            Notification.is_read == False
+        ).order_by(Notification.id.desc()).with_for_update().first()
+        if notification is None:
+            return False
+        if (notification.updated_at or notification.created_at) < cutoff:
+            # Past the window: it stays unread but leaves the group, the next event opens a new one
+            notification.group_key = None
+            self.db.flush()
+            return False
         
-        if not notification:
-            return
+        data = dict(notification.data or {})
+        actor_ids = list(data.get("actor_ids", []))
+        actor_id = payload.get("actor_id")
+        actor_count = notification.actor_count or 1
+        if actor_id is None or actor_id not in actor_ids:
+            actor_count += 1
+            if actor_id is not None:
+                actor_ids = (actor_ids + [actor_id])[-MAX_TRACKED_ACTORS:]
         
-        # Check if user has push notifications enabled
-        preferences = self.db.query(NotificationPreference).filter(
-            NotificationPreference.user_id == notification.user_id
-        ).first()
+        data.update(payload.get("data") or {})
+        data["actor_ids"] = actor_ids
         
-        if preferences and preferences.push_notifications:
-            # Here you would integrate with a push notification service
-            # like Firebase Cloud Messaging, OneSignal, etc.
-            print(f"Sending push notification to user {notification.user_id}: {notification.title}")
+        # Still unread, so the counters do not change
+        notification.data = data
+        notification.actor_count = actor_count
+        notification.message = coalesced_message(payload["actor"], actor_count, payload["action"])
+        notification.updated_at = now
+        self.db.flush()
+        return True
     
-    def cleanup_old_notifications(self, days_old: int = 30):
-        """Clean up old read notifications"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+    def _open_group(self, payload: Dict[str, Any], row: Dict[str, Any], now: datetime) -> bool:
+        """Insert a grouped event's notification, False when a concurrent writer opened the group first and it merged"""
+        try:
+            with self.db.begin_nested():
+                self.db.execute(insert(Notification), [row])
+            return True
+        except IntegrityError:
+            # The open-group unique index held back this insert until the other writer committed
+            if self._coalesce(payload, now):
+                return False
+            raise
+    
+    def deliver_community_update(
+        self,
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        """Create a community update for all users who did not opt out"""
+        # Only ids are needed, read them as a list of scalars instead of User rows
+        opted_out = self.preferences.opted_out("community_updates")
+        user_ids = [
+            user_id for (user_id,) in self.db.query(User.id).filter(
+                User.is_active == True
+            ).order_by(User.id).all()
+            if user_id not in opted_out
+        ]
         
-        self.db.query(Notification).filter(
+        return self.create_notifications_bulk(
+            user_ids,
+            title=title,
+            message=message,
+            notification_type=NotificationType.COMMUNITY_UPDATE,
+            data=data
+        )
+    
+    def deliver_push(self, payloads: List[Dict[str, Any]], chunk_size: int = 5000) -> int:
+        """Send queued pushes, one provider batch per title and chunk of opted-in users"""
+        user_ids_by_title: Dict[str, List[int]] = {}
+        
+        notification_ids = [payload["notification_id"] for payload in payloads if "notification_id" in payload]
+        if notification_ids:
+            for user_id, title in self.db.query(Notification.user_id, Notification.title).filter(
+                Notification.id.in_(notification_ids)
+            ).all():
+                user_ids_by_title.setdefault(title, []).append(user_id)
+        
+        for payload in payloads:
+            if "user_ids" in payload:
+                user_ids_by_title.setdefault(payload["title"], []).extend(payload["user_ids"])
+        
+        sent = 0
+        for title, user_ids in user_ids_by_title.items():
+            for i in range(0, len(user_ids), chunk_size):
+                recipients = self.preferences.allows(user_ids[i:i + chunk_size], "push_notifications")
+                if not recipients:
+                    continue
+                
+                # Here you would hand the whole batch to a push notification service
+                # (e.g. Firebase Cloud Messaging multicast, OneSignal include_player_ids)
+                logger.info(f"Sending push notification batch to {len(recipients)} users: {title}")
+                sent += len(recipients)
+        
+        return sent
+    
+    def cleanup_old_notifications(self, days_old: int = 30) -> int:
+        """Clean up old read notifications, in bounded batches"""
+        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+        return NotificationPartitionService(self.db).delete_where(
             Notification.is_read == True,
             Notification.read_at < cutoff_date
-        ).delete()
-        
-        self.db.commit()
+        )
     
     def get_notification_stats(self, user_id: int) -> Dict[str, int]:
         """Get notification statistics for a user"""
-        total = self.db.query(Notification).filter(
-            Notification.user_id == user_id
-        ).count()
-        
-        unread = self.db.query(Notification).filter(
-            Notification.user_id == user_id,
-            Notification.is_read == False
-        ).count()
+        counts = self.counters.get_counts(user_id)
         
         return {
-            "total_notifications": total,
-            "unread_notifications": unread,
-            "read_notifications": total - unread
-        }
\ No newline at end of file
+            "total_notifications": counts["total"],
+            "unread_notifications": counts["unread"],
+            "read_notifications": counts["total"] - counts["unread"]
+        }
+
+# ============ JOB HANDLERS ============
+
+@job("notifications.deliver", queue="notifications", batch_size=500)
+def deliver_notifications_job(db: Session, payloads: List[Dict[str, Any]]):
+    NotificationService(db).deliver_notifications(payloads)
+
+@job("notifications.push", queue="push", max_retries=5, batch_size=50)
+def push_job(db: Session, payloads: List[Dict[str, Any]]):
+    NotificationService(db).deliver_push(payloads)
+
+# Commits as it goes, a retry after a partial run would duplicate notifications
+@job("notifications.community_update", queue="notifications", max_retries=0)
+def community_update_job(db: Session, payloads: List[Dict[str, Any]]):
+    service = NotificationService(db)
+    for payload in payloads:
+        service.deliver_community_update(payload["title"], payload["message"], payload.get("data"))
+
+# Safe to retry, users are marked as reminded in the same commit as their reminder
+@job(
+    "notifications.watering_reminders",
+    queue="notifications",
+    every_seconds=settings.WATERING_REMINDER_INTERVAL_MINUTES * 60
+)
+def watering_reminders_job(db: Session, payloads: List[Dict[str, Any]]):
+    result = WateringReminderScheduler(db).run()
+    logger.info(f"Sent {result['users']} watering reminders covering {result['trees']} trees")
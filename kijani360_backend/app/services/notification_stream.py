@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+from sqlalchemy import func
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.database.session import SessionLocal
+from app.models.notifications import Notification
+from app.services.notification_counters import NotificationCounterService
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel carrying {"user_ids": [...]} whenever a user's notifications change
+NOTIFICATION_EVENTS_CHANNEL = "notifications:events"
+
+# Notifications sent per wake-up, a reconnect with an old Last-Event-ID catches up in pages
+REPLAY_PAGE_SIZE = 100
+
+# Merged notifications are re-read this far back, covering merges that commit while a read runs
+UPDATE_OVERLAP = timedelta(seconds=5)
+
+class NotificationBroker:
+    """Wakes the streams of users whose notifications changed, across API workers via Redis pub/sub"""
+    
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+    
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if get_redis() is not None:
+            self._stopping.clear()
+            self._listener = threading.Thread(target=self._listen, name="notification-events", daemon=True)
+            self._listener.start()
+    
+    async def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            await asyncio.to_thread(self._listener.join)
+            self._listener = None
+        self.loop = None
+    
+    def publish(self, user_ids: Iterable[int]):
+        """Signal that these users' notifications or unread counts changed, call after commit"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        
+        client = get_redis()
+        if client is not None:
+            try:
+                client.publish(NOTIFICATION_EVENTS_CHANNEL, json.dumps({"user_ids": user_ids}))
+                return
+            except Exception as e:
+                logger.warning(f"Notification event publish failed, waking local streams only: {e}")
+        
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake, user_ids)
+    
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        # One pending wake-up is enough, the stream re-reads everything newer than its cursor
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+    
+    def _wake(self, user_ids: List[int]):
+        for user_id in user_ids:
+            for queue in self._subscribers.get(user_id, ()):
+                if queue.empty():
+                    queue.put_nowait(True)
+    
+    def _listen(self):
+        """Forward pub/sub messages to the event loop until stopped"""
+        while not self._stopping.is_set():
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(NOTIFICATION_EVENTS_CHANNEL)
+                try:
+                    while not self._stopping.is_set():
+                        message = pubsub.get_message(timeout=1.0)
+                        if message is None or self.loop is None:
+                            continue
+                        user_ids = json.loads(message["data"]).get("user_ids", [])
+                        self.loop.call_soon_threadsafe(self._wake, user_ids)
+                finally:
+                    pubsub.close()
+            except Exception as e:
+                logger.warning(f"Notification event listener error, resubscribing: {e}")
+                self._stopping.wait(1.0)
+
+# Global instance
+notification_broker = NotificationBroker()
+
+class NotificationStream:
+    """Events for one connection: new notifications after a cursor, merges into older ones and unread-count changes"""
+    
+    def __init__(self, user_id: int, last_event_id: Optional[int] = None):
+        self.user_id = user_id
+        # Notification events carry the notification id, so Last-Event-ID doubles as the replay cursor
+        self.last_event_id = last_event_id
+        self.unread_count: Optional[int] = None
+        # Coalesced notifications merged after this are re-sent as notification_updated events
+        self.updated_since = datetime.utcnow()
+        self._sent_updates: Dict[int, datetime] = {}
+    
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events until the consumer stops iterating, heartbeats keep idle connections open"""
+        queue = notification_broker.subscribe(self.user_id)
+        try:
+            while True:
+                events, has_more = await asyncio.to_thread(self._load)
+                for event in events:
+                    yield event
+                if has_more:
+                    continue
+                
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield {"event": "heartbeat"}
+        finally:
+            notification_broker.unsubscribe(self.user_id, queue)
+    
+    def _load(self):
+        """Read what changed since the last call, returns (events, more pages pending)"""
+        db = SessionLocal()
+        try:
+            events = []
+            has_more = False
+            
+            checked_at = datetime.utcnow()
+            if self.last_event_id is None:
+                # Fresh connection, start from the newest notification instead of replaying history
+                self.last_event_id = db.query(func.max(Notification.id)).filter(
+                    Notification.user_id == self.user_id
+                ).scalar() or 0
+            else:
+                notifications = db.query(Notification).filter(
+                    Notification.user_id == self.user_id,
+                    Notification.id > self.last_event_id
+                ).order_by(Notification.id).limit(REPLAY_PAGE_SIZE).all()
+                
+                for notification in notifications:
+                    events.append({"id": notification.id, "event": "notification", "data": _notification_data(notification)})
+                if notifications:
+                    self.last_event_id = notifications[-1].id
+                has_more = len(notifications) == REPLAY_PAGE_SIZE
+            
+            # No id on updates, Last-Event-ID only tracks new notifications
+            updated = db.query(Notification).filter(
+                Notification.user_id == self.user_id,
+                Notification.id <= self.last_event_id,
+                Notification.updated_at >= self.updated_since
+            ).order_by(Notification.updated_at).all()
+            for notification in updated:
+                if self._sent_updates.get(notification.id) == notification.updated_at:
+                    continue
+                self._sent_updates[notification.id] = notification.updated_at
+                events.append({"event": "notification_updated", "data": _notification_data(notification)})
+            
+            self.updated_since = checked_at - UPDATE_OVERLAP
+            self._sent_updates = {
+                notification_id: updated_at for notification_id, updated_at in self._sent_updates.items()
+                if updated_at >= self.updated_since
+            }
+            
+            unread_count = NotificationCounterService(db).get_unread_count(self.user_id)
+            if unread_count != self.unread_count:
+                self.unread_count = unread_count
+                events.append({"event": "unread_count", "data": {"unread_count": unread_count}})
+            
+            return events, has_more
+        finally:
+            db.close()
+
+def _notification_data(notification: Notification) -> Dict[str, Any]:
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "data": notification.data,
+        "is_read": notification.is_read,
+        "actor_count": notification.actor_count or 1,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+        "updated_at": notification.updated_at.isoformat() if notification.updated_at else None
+    }
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event for text/event-stream, heartbeats are comments"""
+    if event["event"] == "heartbeat":
+        return ": heartbeat\n\n"
+    
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,177 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, update, delete, case, or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.models.user import User, PointsLedgerEntry, PointsLedgerWatermark, PointsLedgerGap
+
+# (minimum points, level), highest first
+LEVEL_THRESHOLDS = ((1000, 5), (500, 4), (200, 3), (50, 2))
+
+def level_for_points(points: int) -> int:
+    """Level reached with a points balance"""
+    for threshold, level in LEVEL_THRESHOLDS:
+        if points >= threshold:
+            return level
+    return 1
+
+class PointsService:
+    """Append-only points ledger, compacted into users.points"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # ============ WRITES ============
+    
+    def credit(self, user_id: int, delta: int, reason: str, source_id: Optional[int] = None):
+        """Append a single points change"""
+        self.credit_many([(user_id, delta, reason, source_id)])
+    
+    def credit_many(self, entries: List[Tuple[int, int, str, Optional[int]]]):
+        """Append (user_id, delta, reason, source_id) changes with one multi-row insert"""
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, "delta": delta, "reason": reason, "source_id": source_id, "created_at": now}
+            for user_id, delta, reason, source_id in entries
+            if delta
+        ]
+        if rows:
+            self.db.execute(insert(PointsLedgerEntry), rows)
+    
+    def compact(self, batch_size: int = 10000) -> int:
+        """Fold the next batch of settled ledger entries into users.points and level"""
+        watermark = self._lock_watermark()
+        last_entry_id = watermark.last_entry_id or 0
+        late = self._fold_late_entries(batch_size)
+        
+        # Leave recent entries alone, a transaction holding a lower id may not have committed yet
+        settled_before = datetime.utcnow() - timedelta(seconds=settings.POINTS_LEDGER_SETTLE_SECONDS)
+        entry_ids = [
+            entry_id for (entry_id,) in self.db.query(PointsLedgerEntry.id).filter(
+                PointsLedgerEntry.id > last_entry_id
+            ).order_by(PointsLedgerEntry.id).limit(batch_size).all()
+        ]
+        unsettled_id = self.db.query(func.min(PointsLedgerEntry.id)).filter(
+            PointsLedgerEntry.id > last_entry_id,
+            PointsLedgerEntry.created_at >= settled_before
+        ).scalar()
+        if unsettled_id is not None:
+            entry_ids = [entry_id for entry_id in entry_ids if entry_id < unsettled_id]
+        
+        if not entry_ids:
+            if late:
+                self.db.commit()
+            else:
+                self.db.rollback()
+            return late
+        
+        # Ids missing below the new watermark belong to transactions still open (or rolled back),
+        # the settle window makes them rare. They are remembered and folded if they commit later.
+        high_id = entry_ids[-1]
+        visible = set(entry_ids)
+        first_id = last_entry_id + 1 if last_entry_id else entry_ids[0]
+        gaps = [entry_id for entry_id in range(first_id, high_id) if entry_id not in visible]
+        if gaps:
+            self.db.execute(insert(PointsLedgerGap), [{"entry_id": entry_id} for entry_id in gaps])
+        
+        # An entry committing since the ids were read is in the gaps now, it is not folded twice
+        self._fold(
+            PointsLedgerEntry.id > last_entry_id,
+            PointsLedgerEntry.id <= high_id,
+            PointsLedgerEntry.id.notin_(select(PointsLedgerGap.entry_id))
+        )
+        
+        watermark.last_entry_id = high_id
+        watermark.compacted_at = datetime.utcnow()
+        self.db.execute(delete(PointsLedgerGap).where(
+            PointsLedgerGap.created_at < datetime.utcnow() - timedelta(hours=settings.POINTS_LEDGER_GAP_HOURS)
+        ))
+        self.db.commit()
+        
+        return len(entry_ids) + late
+    
+    def _fold_late_entries(self, batch_size: int) -> int:
+        """Fold entries that committed after compaction passed their id, in the caller's transaction"""
+        late_ids = [
+            entry_id for (entry_id,) in self.db.query(PointsLedgerEntry.id).join(
+                PointsLedgerGap, PointsLedgerGap.entry_id == PointsLedgerEntry.id
+            ).limit(batch_size).all()
+        ]
+        if late_ids:
+            self._fold(PointsLedgerEntry.id.in_(late_ids))
+            self.db.execute(delete(PointsLedgerGap).where(PointsLedgerGap.entry_id.in_(late_ids)))
+        return len(late_ids)
+    
+    def _fold(self, *criteria):
+        """Add the matching entries to users.points and level, one set-based UPDATE for every user touched"""
+        batch_delta = select(func.coalesce(func.sum(PointsLedgerEntry.delta), 0)).where(
+            PointsLedgerEntry.user_id == User.id, *criteria
+        ).scalar_subquery()
+        new_points = func.coalesce(User.points, 0) + batch_delta
+        
+        self.db.execute(
+            update(User).where(
+                User.id.in_(select(PointsLedgerEntry.user_id).where(*criteria).distinct())
+            ).values(
+                points=new_points,
+                level=case(
+                    *[(new_points >= threshold, level) for threshold, level in LEVEL_THRESHOLDS],
+                    else_=1
+                )
+            ).execution_options(synchronize_session=False)
+        )
+    
+    # ============ READS ============
+    
+    def get_balance(self, user_id: int) -> int:
+        """Compacted balance plus the un-compacted tail"""
+        return self.get_balances([user_id]).get(user_id, 0)
+    
+    def get_balances(self, user_ids: List[int]) -> Dict[int, int]:
+        """Balances for several users in one query"""
+        if not user_ids:
+            return {}
+        
+        tail = self.tail_query().subquery()
+        rows = self.db.query(
+            User.id,
+            func.coalesce(User.points, 0) + func.coalesce(tail.c.delta, 0)
+        ).outerjoin(tail, tail.c.user_id == User.id).filter(User.id.in_(user_ids)).all()
+        
+        return {user_id: int(points) for user_id, points in rows}
+    
+    def tail_query(self):
+        """Per-user sum of ledger entries not yet compacted: above the watermark or committed late below it"""
+        last_entry_id = select(PointsLedgerWatermark.last_entry_id).where(
+            PointsLedgerWatermark.id == 1
+        ).scalar_subquery()
+        
+        return select(
+            PointsLedgerEntry.user_id,
+            func.sum(PointsLedgerEntry.delta).label("delta")
+        ).where(or_(
+            PointsLedgerEntry.id > func.coalesce(last_entry_id, 0),
+            PointsLedgerEntry.id.in_(select(PointsLedgerGap.entry_id))
+        )).group_by(PointsLedgerEntry.user_id)
+    
+    # ============ HELPERS ============
+    
+    def _lock_watermark(self) -> PointsLedgerWatermark:
+        """Get the watermark row locked for this compaction run, creating it on first use"""
+        watermark = self.db.query(PointsLedgerWatermark).filter(
+            PointsLedgerWatermark.id == 1
+        ).with_for_update().first()
+        if watermark:
+            return watermark
+        
+        try:
+            with self.db.begin_nested():
+                self.db.add(PointsLedgerWatermark(id=1, last_entry_id=0))
+        except IntegrityError:
+            # Another compaction run created it first
+            pass
+        
+        return self.db.query(PointsLedgerWatermark).filter(
+            PointsLedgerWatermark.id == 1
+        ).with_for_update().first()
@@ -0,0 +1,133 @@
+import json
+import threading
+from collections import namedtuple
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app.core.catalog_version import CatalogVersion
+from app.models.tree import TreeSpecies
+
+# Immutable copy of a tree_species row, safe to share across sessions and threads
+Species = namedtuple("Species", [column.name for column in TreeSpecies.__table__.columns])
+
+REGIONS = tuple(
+    column.name[len("survival_rate_"):] for column in TreeSpecies.__table__.columns
+    if column.name.startswith("survival_rate_")
+)
+
+class _CatalogState(NamedTuple):
+    version: str
+    ordered: List[Species]
+    by_id: Dict[int, Species]
+    by_name: Dict[str, Species]
+    by_local_name: Dict[str, Species]
+    # /trees/species response bodies by region (None for all regions, "" for unknown ones), built on first request
+    payloads: Dict[Optional[str], bytes]
+
+def _species_payload(species: Species, region: Optional[str]) -> dict:
+    species_data = {
+        "id": species.id,
+        "name": species.name,
+        "scientific_name": species.scientific_name,
+        "local_name": species.local_name,
+        "growth_rate": species.growth_rate,
+        "mature_height": species.mature_height,
+        "water_requirements": species.water_requirements,
+        "watering_frequency": species.watering_frequency,
+        "benefits": {
+            "timber_value": species.timber_value,
+            "fruit_bearing": species.fruit_bearing,
+            "medicinal_uses": species.medicinal_uses,
+            "erosion_control": species.erosion_control
+        }
+    }
+    
+    # Add regional survival rates
+    if region is not None:
+        species_data["survival_rate"] = getattr(species, f"survival_rate_{region}", None)
+    else:
+        species_data["regional_survival"] = {name: getattr(species, f"survival_rate_{name}") for name in REGIONS}
+    
+    return species_data
+
+class SpeciesCatalog:
+    """Process-wide cache of tree species, indexed by id, name and local name"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Optional[_CatalogState] = None
+        self.version = CatalogVersion("species", TreeSpecies)
+    
+    def ensure_loaded(self, db: Session):
+        """Load on first use, reload when the version stamp has moved (checked at most every 30s)"""
+        state = self._state
+        if state is not None and not self.version.due():
+            return
+        
+        version = self.version.current(db)
+        if state is None or state.version != version:
+            self.load(db, version)
+    
+    def load(self, db: Session, version: Optional[str] = None):
+        """(Re)load the catalog from the tree_species table"""
+        version = version or self.version.current(db)
+        rows = db.query(TreeSpecies).order_by(TreeSpecies.id).all()
+        ordered = [Species(*(getattr(row, field) for field in Species._fields)) for row in rows]
+        
+        by_name: Dict[str, Species] = {}
+        by_local_name: Dict[str, Species] = {}
+        for species in ordered:
+            by_name.setdefault(species.name.lower(), species)
+            if species.local_name:
+                by_local_name.setdefault(species.local_name.lower(), species)
+        
+        with self._lock:
+            self._state = _CatalogState(
+                version=version,
+                ordered=ordered,
+                by_id={species.id: species for species in ordered},
+                by_name=by_name,
+                by_local_name=by_local_name,
+                payloads={}
+            )
+    
+    def invalidate(self):
+        """Drop the cached catalog here and tell other processes to reload, call after changing species"""
+        self.version.bump()
+        with self._lock:
+            self._state = None
+    
+    def get(self, species_id: int) -> Optional[Species]:
+        state = self._state
+        return state.by_id.get(species_id) if state else None
+    
+    def find(self, name: str) -> Optional[Species]:
+        """Look up by English or local name, case-insensitively"""
+        state = self._state
+        if not state:
+            return None
+        key = name.lower()
+        return state.by_name.get(key) or state.by_local_name.get(key)
+    
+    def all(self) -> List[Species]:
+        state = self._state
+        return state.ordered if state else []
+    
+    def species_json(self, region: Optional[str] = None) -> bytes:
+        """The /trees/species response body, serialized once per region"""
+        state = self._state
+        if state is None:
+            return b"[]"
+        
+        # Unknown regions all share one body (survival_rate is None), user input cannot grow the cache
+        key = region.lower() if region else None
+        if key is not None and key not in REGIONS:
+            key = ""
+        
+        body = state.payloads.get(key)
+        if body is None:
+            body = json.dumps([_species_payload(species, key) for species in state.ordered]).encode()
+            state.payloads[key] = body
+        return body
+
+# Global instance
+species_catalog = SpeciesCatalog()
@@ -2,16 +2,18 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from app.models.user import User
 from app.models.forum import TreePlantingStreak
+from app.services.leaderboard_service import LeaderboardService
+from app.services.points_service import PointsService
 
 class StreakService:
     def __init__(self, db: Session):
         self.db = db
     
-    def update_planting_streak(self, user_id: int):
-        """Update user's tree planting streak"""
+    def update_planting_streak(self, user_id: int, trees: int = 1) -> int:
+        """Update user's tree planting streak for one planting of any number of trees, returns points awarded"""
         user = self.db.query(User).filter(User.id == user_id).first()
         if not user:
-            return
+            return 0
         
         # Get or create streak record
         streak = self.db.query(TreePlantingStreak).filter(
@@ -19,7 +21,7 @@ class StreakService:
         ).first()
         
         if not streak:
-            streak = TreePlantingStreak(user_id=user_id)
+            streak = TreePlantingStreak(user_id=user_id, current_streak=0, longest_streak=0, total_trees=0)
             self.db.add(streak)
         
         now = datetime.utcnow()
@@ -41,7 +43,7 @@ class StreakService:
         
         # Update records
         streak.last_planting_date = now
-        streak.total_trees += 1
+        streak.total_trees += trees
         
         # Update longest streak
         if streak.current_streak > streak.longest_streak:
@@ -52,29 +54,24 @@ class StreakService:
         user.longest_streak = streak.longest_streak
         user.total_trees_planted = streak.total_trees
         
-        # Award points
-        user.points += 10  # Base points for planting
+        # Award points through the ledger, users.points is updated by compaction
+        points = 10 * trees  # Base points for planting
+        credits = [(user_id, points, "tree_planted", None)]
         if streak.current_streak > 1:
-            user.points += streak.current_streak * 2  # Bonus for streaks
+            credits.append((user_id, streak.current_streak * 2, "streak_bonus", None))  # Bonus for streaks
+            points += streak.current_streak * 2
+        PointsService(self.db).credit_many(credits)
         
-        # Level up logic
-        self._update_user_level(user)
+        LeaderboardService(self.db).record_activity(
+            user_id,
+            trees=trees,
+            points=points,
+            streak=streak.current_streak,
+            occurred_at=now
+        )
         
         self.db.commit()
-    
-    def _update_user_level(self, user: User):
-        """Update user level based on points"""
-        # Simple leveling system
-        if user.points >= 1000:
-            user.level = 5
-        elif user.points >= 500:
-            user.level = 4
-        elif user.points >= 200:
-            user.level = 3
-        elif user.points >= 50:
-            user.level = 2
-        else:
-            user.level = 1
+        return points
     
     def get_leaderboard(self, limit: int = 10):
         """Get top users by current streak"""
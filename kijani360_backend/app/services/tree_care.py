@@ -1,75 +1,169 @@
+from typing import Any, Dict, List
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, insert, update, case
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from app.models.tree import UserTree, WateringLog
-from app.schemas.tree import TreeCareStats
+from app.core.config import settings
+from app.models.tree import UserTree, TreeCareStatsSnapshot
+from app.schemas.tree import TreeCareStats, UserTreeCreate
+from app.services.species_catalog import species_catalog
+from app.services.streak_service import StreakService
+from app.services.challenge_service import ChallengeService
+from app.services.map_clusters import MapClusterService
+from app.services.watering_history import WateringHistoryService
+
+# Care score weight of a tree by health_status, other statuses count half
+CARE_HEALTH_MULTIPLIERS = {"healthy": 1.0, "sick": 0.5, "dead": 0.0}
 
 class TreeCareService:
     def __init__(self, db: Session):
         self.db = db
     
     def get_user_stats(self, user_id: int) -> TreeCareStats:
-        """Calculate comprehensive tree care statistics for a user"""
-        
-        # Basic counts
-        total_trees = self.db.query(UserTree).filter(UserTree.user_id == user_id).count()
-        active_trees = self.db.query(UserTree).filter(
-            UserTree.user_id == user_id,
-            UserTree.is_active == True
-        ).count()
-        
-        # Total waterings
-        total_waterings = self.db.query(WateringLog).filter(
-            WateringLog.user_id == user_id
-        ).count()
+        """Tree care statistics, read from the user's snapshot and computed only when it was cleared"""
+        return TreeCareStats(**self._snapshot(user_id)["stats"])
+    
+    def invalidate_stats(self, user_id: int):
+        """Clear the user's stats snapshot, in the caller's transaction, after any change to their trees"""
+        if self._bump_snapshot(user_id):
+            return
         
-        # Streak calculations
-        trees = self.db.query(UserTree).filter(
-            UserTree.user_id == user_id,
-            UserTree.is_active == True
-        ).all()
+        # No snapshot yet: an empty one still has to exist, or a computation racing this change inserts stale stats
+        try:
+            with self.db.begin_nested():
+                self.db.execute(insert(TreeCareStatsSnapshot).values(user_id=user_id, stats=None, version=1))
+        except IntegrityError:
+            # A computation stored its snapshot first
+            self._bump_snapshot(user_id)
+    
+    def _bump_snapshot(self, user_id: int) -> bool:
+        result = self.db.execute(
+            update(TreeCareStatsSnapshot).where(
+                TreeCareStatsSnapshot.user_id == user_id
+            ).values(
+                stats=None,
+                version=TreeCareStatsSnapshot.version + 1
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def _snapshot(self, user_id: int) -> Dict[str, Any]:
+        """{"stats": ..., "care_score": ...}, recomputed when missing, cleared or older than the TTL"""
+        now = datetime.utcnow()
+        snapshot = self.db.query(TreeCareStatsSnapshot).filter(TreeCareStatsSnapshot.user_id == user_id).first()
+        # The weekly and monthly watering counts move with time alone, hence the TTL
+        if snapshot and snapshot.stats and snapshot.computed_at > now - timedelta(seconds=settings.TREE_STATS_SNAPSHOT_SECONDS):
+            return snapshot.stats
         
-        streaks = [tree.watering_streak for tree in trees]
-        average_streak = sum(streaks) / len(streaks) if streaks else 0
-        longest_streak = max(streaks) if streaks else 0
+        computed = self._compute_stats(user_id, now)
+        if snapshot:
+            # Skipped when an invalidation landed while computing, the next read recomputes
+            self.db.execute(
+                update(TreeCareStatsSnapshot).where(
+                    TreeCareStatsSnapshot.user_id == user_id,
+                    TreeCareStatsSnapshot.version == snapshot.version
+                ).values(
+                    stats=computed,
+                    computed_at=now
+                ).execution_options(synchronize_session=False)
+            )
+        else:
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(insert(TreeCareStatsSnapshot).values(user_id=user_id, stats=computed, computed_at=now))
+            except IntegrityError:
+                # Another request stored one first, or a change to the trees cleared it while computing
+                pass
+        self.db.commit()
+        return computed
+    
+    def _compute_stats(self, user_id: int, now: datetime) -> Dict[str, Any]:
+        """All statistics in one statement: tree aggregates per health status, watering counts alongside"""
+        active = UserTree.is_active == True
+        streak = func.coalesce(UserTree.watering_streak, 0)
+        history = WateringHistoryService(self.db)
         
-        # Health distribution
-        health_counts = self.db.query(
+        rows = self.db.query(
             UserTree.health_status,
-            func.count(UserTree.id)
-        ).filter(
-            UserTree.user_id == user_id,
-            UserTree.is_active == True
-        ).group_by(UserTree.health_status).all()
-        
-        trees_by_health = {status: count for status, count in health_counts}
-        
-        # Recent watering activity
-        now = datetime.utcnow()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        waterings_this_week = self.db.query(WateringLog).filter(
-            WateringLog.user_id == user_id,
-            WateringLog.watered_at >= week_ago
-        ).count()
+            func.count(UserTree.id),
+            func.sum(case((active, 1), else_=0)),
+            func.sum(case((active, streak), else_=0)),
+            func.max(case((active, streak), else_=None)),
+            # Per-tree care score before the health multiplier: the streak times 10, capped at 100
+            func.sum(case((active, case((streak >= 10, 100), else_=streak * 10)), else_=0)),
+            # Counted from the daily rollups, watering_logs only keeps recent rows
+            history.waterings_since(user_id, now=now),
+            history.waterings_since(user_id, now - timedelta(days=7), now),
+            history.waterings_since(user_id, now - timedelta(days=30), now)
+        ).filter(UserTree.user_id == user_id).group_by(UserTree.health_status).all()
         
-        waterings_this_month = self.db.query(WateringLog).filter(
-            WateringLog.user_id == user_id,
-            WateringLog.watered_at >= month_ago
-        ).count()
+        total_trees = active_trees = streak_total = longest_streak = 0
+        care_total = 0.0
+        trees_by_health = {}
+        total_waterings = waterings_this_week = waterings_this_month = 0
+        for health_status, trees, active_count, streak_sum, streak_max, care_sum, total_w, week_w, month_w in rows:
+            active_count = int(active_count or 0)
+            total_trees += trees
+            active_trees += active_count
+            streak_total += int(streak_sum or 0)
+            longest_streak = max(longest_streak, int(streak_max or 0))
+            care_total += int(care_sum or 0) * CARE_HEALTH_MULTIPLIERS.get(health_status, 0.5)
+            if active_count:
+                trees_by_health[health_status] = active_count
+            total_waterings, waterings_this_week, waterings_this_month = total_w, week_w, month_w
         
-        return TreeCareStats(
+        stats = TreeCareStats(
             user_id=user_id,
             total_trees=total_trees,
             active_trees=active_trees,
             total_waterings=total_waterings,
-            average_streak=round(average_streak, 1),
+            average_streak=round(streak_total / active_trees, 1) if active_trees else 0,
             longest_streak=longest_streak,
             trees_by_health=trees_by_health,
             waterings_this_week=waterings_this_week,
             waterings_this_month=waterings_this_month
         )
+        return {
+            "stats": stats.model_dump(),
+            "care_score": round(care_total / active_trees, 1) if active_trees else 0.0
+        }
+    
+    def plant_trees(self, user_id: int, trees: List[UserTreeCreate]) -> Dict[str, Any]:
+        """Plant a batch of trees with one multi-row insert, species must already be in the catalog"""
+        species_catalog.ensure_loaded(self.db)
+        
+        rows = []
+        native = 0
+        for tree in trees:
+            species = species_catalog.get(tree.species_id)
+            native += bool(species.is_native)
+            rows.append({
+                "user_id": user_id,
+                "species_id": tree.species_id,
+                "name": tree.name,
+                "planting_date": tree.planting_date,
+                "location": tree.location,
+                "latitude": tree.latitude,
+                "longitude": tree.longitude,
+                "next_watering_due": tree.planting_date + timedelta(days=species.watering_frequency)
+            })
+        
+        # Ids are assigned in VALUES order, sorting them restores the request's order
+        tree_ids = sorted(self.db.execute(insert(UserTree).returning(UserTree.id), rows).scalars())
+        MapClusterService(self.db).mark_points("trees", rows)
+        self.invalidate_stats(user_id)
+        
+        # Challenge filters look at the native flag, so native and other trees are two events
+        challenge_service = ChallengeService(self.db)
+        completed = challenge_service.record_event(user_id, "trees_planted", native, attributes={"native_species": True})
+        completed += challenge_service.record_event(user_id, "trees_planted", len(rows) - native, attributes={"native_species": False})
+        
+        # One streak step, points entry and leaderboard update for the whole batch, commits everything
+        points = StreakService(self.db).update_planting_streak(user_id, trees=len(rows))
+        
+        # Everything credited to the ledger: planting points, streak bonus and completed challenges
+        points += sum(definition.reward_points for definition in completed)
+        return {"tree_ids": tree_ids, "points_awarded": points}
     
     def get_overdue_trees(self, user_id: int):
         """Get trees that need watering"""
@@ -82,20 +176,4 @@ class TreeCareService:
     
     def calculate_care_score(self, user_id: int) -> float:
         """Calculate a care score based on watering consistency"""
-        trees = self.db.query(UserTree).filter(
-            UserTree.user_id == user_id,
-            UserTree.is_active == True
-        ).all()
-        
-        if not trees:
-            return 0.0
-        
-        total_score = 0
-        for tree in trees:
-            # Score based on streak and health
-            streak_score = min(tree.watering_streak * 10, 100)
-            health_multiplier = {"healthy": 1.0, "sick": 0.5, "dead": 0.0}.get(tree.health_status, 0.5)
-            tree_score = streak_score * health_multiplier
-            total_score += tree_score
-        
-        return round(total_score / len(trees), 1)
\ No newline at end of file
+        return self._snapshot(user_id)["care_score"]
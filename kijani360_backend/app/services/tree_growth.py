@@ -0,0 +1,327 @@
+import logging
+import math
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.job_queue import job
+from app.models.tree import UserTree, TreeMeasurementChunk, SpeciesGrowthCurve
+
+logger = logging.getLogger(__name__)
+
+# Health is stored as a code per reading, 0 when the reading did not include it
+HEALTH_CODES = {"healthy": 1, "sick": 2, "dead": 3}
+HEALTH_NAMES = {code: name for name, code in HEALTH_CODES.items()}
+
+# Sizes are stored in whole millimetres, -1 when the reading did not include them
+MISSING = -1
+
+# Chunk arrays in storage order: name, dtype. Times are seconds since the start of the month.
+CHUNK_ARRAYS = (("times", "<u4"), ("height", "<i4"), ("girth", "<i4"), ("health", "u1"))
+
+def _month(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _seconds(moment: datetime) -> int:
+    return int(np.datetime64(moment, "s").astype(np.int64))
+
+def _millimetres(cm: Optional[float]) -> int:
+    return MISSING if cm is None else max(0, round(cm * 10))
+
+def encode_chunk(readings: Dict[str, np.ndarray]) -> bytes:
+    """Pack one month of readings sorted by time, times and sizes as deltas from the previous reading"""
+    # Growth is slow, so deltas are mostly zero or tiny and compress far better than the values
+    parts = []
+    for name, dtype in CHUNK_ARRAYS:
+        values = readings[name].astype(np.int64)
+        if name != "health":
+            values = np.diff(values, prepend=0)
+        parts.append(values.astype(dtype).tobytes())
+    return zlib.compress(b"".join(parts))
+
+def decode_chunk(data: bytes, count: int) -> Dict[str, np.ndarray]:
+    """Inverse of encode_chunk, int64 arrays of absolute values"""
+    return decode_chunks([count], [data])
+
+def decode_chunks(counts: List[int], datas: List[bytes]) -> Dict[str, np.ndarray]:
+    """Many chunks at once, their readings end to end, with NumPy work per batch rather than per chunk"""
+    counts = np.array(counts, dtype=np.int64)
+    buffer = np.frombuffer(b"".join(zlib.decompress(data) for data in datas), dtype=np.uint8)
+    
+    # Byte layout of chunk i: each array in turn, counts[i] values long
+    width = sum(np.dtype(dtype).itemsize for _, dtype in CHUNK_ARRAYS)
+    chunk_starts = np.repeat(np.cumsum(counts * width) - counts * width, counts)
+    firsts = np.cumsum(counts) - counts
+    position = np.arange(counts.sum()) - np.repeat(firsts, counts)
+    
+    readings = {}
+    array_offset = np.zeros(len(position), dtype=np.int64)
+    for name, dtype in CHUNK_ARRAYS:
+        size = np.dtype(dtype).itemsize
+        starts = chunk_starts + array_offset + position * size
+        values = buffer[starts[:, None] + np.arange(size)].view(dtype).ravel().astype(np.int64)
+        array_offset += np.repeat(counts * size, counts)
+        if name != "health":
+            # Running sums restart at each chunk, every chunk's first delta is from zero
+            totals = np.cumsum(values)
+            values = totals - np.repeat(totals[firsts] - values[firsts], counts) if len(values) else values
+        readings[name] = values
+    return readings
+
+class TreeGrowthService:
+    """Height, girth and health readings per tree, stored as one packed chunk per tree-month"""
+    
+    # A month holds a handful of readings even for closely watched trees, so rewriting its chunk on
+    # each reading is cheap, while years of history stay a few rows per tree instead of one per reading.
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # ============ WRITES ============
+    
+    def record(self, tree: UserTree, readings: List[Dict[str, Any]]):
+        """Add readings (measured_at, height, girth, health_status) to a tree, in the caller's transaction"""
+        by_month: Dict[datetime, List[Dict[str, Any]]] = {}
+        for reading in readings:
+            if reading.get("health_status") not in HEALTH_CODES:
+                reading = dict(reading, health_status=None)
+            if reading.get("height") is None and reading.get("girth") is None and reading["health_status"] is None:
+                continue
+            measured_at = reading.get("measured_at") or datetime.utcnow()
+            if measured_at.tzinfo is not None:
+                measured_at = measured_at.astimezone(timezone.utc).replace(tzinfo=None)
+            by_month.setdefault(_month(measured_at), []).append(dict(reading, measured_at=measured_at))
+        if not by_month:
+            return
+        
+        latest = self.db.query(TreeMeasurementChunk.last_at).filter(
+            TreeMeasurementChunk.user_tree_id == tree.id
+        ).order_by(TreeMeasurementChunk.month.desc()).limit(1).scalar()
+        
+        for month, month_readings in sorted(by_month.items()):
+            self._append(tree.id, month, month_readings)
+        
+        # The tree's own fields keep showing its most recent reading
+        newest = max((reading for month_readings in by_month.values() for reading in month_readings), key=lambda r: r["measured_at"])
+        if latest is None or newest["measured_at"] >= latest:
+            if newest.get("height") is not None:
+                tree.height = newest["height"]
+            if newest.get("health_status") is not None:
+                tree.health_status = newest["health_status"]
+    
+    def _append(self, tree_id: int, month: datetime, readings: List[Dict[str, Any]]):
+        added = {
+            "times": np.array([_seconds(r["measured_at"]) - _seconds(month) for r in readings], dtype=np.int64),
+            "height": np.array([_millimetres(r.get("height")) for r in readings], dtype=np.int64),
+            "girth": np.array([_millimetres(r.get("girth")) for r in readings], dtype=np.int64),
+            "health": np.array([HEALTH_CODES.get(r.get("health_status"), 0) for r in readings], dtype=np.int64),
+        }
+        
+        for attempt in range(2):
+            # Row lock on PostgreSQL, so concurrent readings for one tree-month are not lost
+            chunk = self.db.query(TreeMeasurementChunk).filter(
+                TreeMeasurementChunk.user_tree_id == tree_id,
+                TreeMeasurementChunk.month == month
+            ).with_for_update().first()
+            
+            merged = added
+            if chunk:
+                current = decode_chunk(chunk.data, chunk.reading_count)
+                merged = {name: np.concatenate((current[name], added[name])) for name in current}
+            order = np.argsort(merged["times"], kind="stable")
+            merged = {name: values[order] for name, values in merged.items()}
+            
+            values = {
+                "reading_count": len(order),
+                "first_at": month + np.timedelta64(int(merged["times"][0]), "s").item(),
+                "last_at": month + np.timedelta64(int(merged["times"][-1]), "s").item(),
+                "data": encode_chunk(merged)
+            }
+            if chunk:
+                for name, value in values.items():
+                    setattr(chunk, name, value)
+                return
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(insert(TreeMeasurementChunk).values(user_tree_id=tree_id, month=month, **values))
+                return
+            except IntegrityError:
+                # Another request started this month's chunk first, merge into it instead
+                if attempt:
+                    raise
+    
+    # ============ READS ============
+    
+    def series(self, tree_id: int, start: datetime, end: datetime, points: int) -> Dict[str, Any]:
+        """Readings between start and end, averaged into at most `points` evenly spaced buckets"""
+        chunks = self.db.query(
+            TreeMeasurementChunk.month,
+            TreeMeasurementChunk.reading_count,
+            TreeMeasurementChunk.data
+        ).filter(
+            TreeMeasurementChunk.user_tree_id == tree_id,
+            TreeMeasurementChunk.month >= _month(start),
+            TreeMeasurementChunk.month <= end
+        ).order_by(TreeMeasurementChunk.month).all()
+        
+        readings = self._decode(chunks)
+        in_range = (readings["times"] >= _seconds(start)) & (readings["times"] <= _seconds(end))
+        readings = {name: values[in_range] for name, values in readings.items()}
+        
+        result = {"tree_id": tree_id, "start": start, "end": end, "resolution_seconds": 0, "readings": []}
+        if len(readings["times"]) <= points:
+            buckets = np.arange(len(readings["times"]))
+        else:
+            step = math.ceil((_seconds(end) - _seconds(start) + 1) / points)
+            buckets = (readings["times"] - _seconds(start)) // step
+            result["resolution_seconds"] = step
+        result["readings"] = self._downsample(readings, buckets)
+        return result
+    
+    def _decode(self, chunks: List[Tuple[datetime, int, bytes]]) -> Dict[str, np.ndarray]:
+        """Readings of (month, reading_count, data) rows end to end, times as epoch seconds"""
+        if not chunks:
+            return {name: np.zeros(0, dtype=np.int64) for name, _ in CHUNK_ARRAYS}
+        months, counts, datas = zip(*chunks)
+        readings = decode_chunks(counts, datas)
+        readings["times"] += np.repeat(np.array(months, dtype="datetime64[s]").astype(np.int64), counts)
+        return readings
+    
+    def _downsample(self, readings: Dict[str, np.ndarray], buckets: np.ndarray) -> List[Dict[str, Any]]:
+        """Mean time and sizes per bucket, the last recorded health status in it"""
+        if not len(buckets):
+            return []
+        used, index = np.unique(buckets, return_inverse=True)
+        counts = np.bincount(index)
+        times = np.bincount(index, weights=readings["times"]) / counts
+        
+        sizes = {}
+        for name in ("height", "girth"):
+            present = readings[name] != MISSING
+            totals = np.bincount(index[present], weights=readings[name][present], minlength=len(used))
+            found = np.bincount(index[present], minlength=len(used))
+            sizes[name] = np.where(found > 0, totals / np.maximum(found, 1) / 10, np.nan)
+        
+        # Readings are in time order, so the highest position per bucket is its latest
+        last_health = np.full(len(used), -1)
+        recorded = np.flatnonzero(readings["health"] > 0)
+        np.maximum.at(last_health, index[recorded], recorded)
+        
+        return [
+            {
+                "measured_at": datetime.utcfromtimestamp(round(times[i])),
+                "height": None if np.isnan(sizes["height"][i]) else round(float(sizes["height"][i]), 1),
+                "girth": None if np.isnan(sizes["girth"][i]) else round(float(sizes["girth"][i]), 1),
+                "health_status": HEALTH_NAMES.get(int(readings["health"][last_health[i]])) if last_health[i] >= 0 else None,
+                "readings": int(counts[i])
+            }
+            for i in range(len(used))
+        ]
+    
+    def growth_curve(self, species_id: int) -> List[SpeciesGrowthCurve]:
+        return self.db.query(SpeciesGrowthCurve).filter(
+            SpeciesGrowthCurve.species_id == species_id
+        ).order_by(SpeciesGrowthCurve.age_bucket).all()
+    
+    # ============ GROWTH CURVES ============
+    
+    def rebuild_growth_curves(self, batch_size: Optional[int] = None) -> int:
+        """Recompute every species' growth curve from all measurements, returns the rows written"""
+        batch_size = batch_size or settings.GROWTH_CURVE_BATCH_SIZE
+        bucket_days = settings.GROWTH_CURVE_BUCKET_DAYS
+        age_buckets = math.ceil(settings.GROWTH_CURVE_MAX_AGE_YEARS * 365 / bucket_days)
+        species_count = (self.db.query(func.max(UserTree.species_id)).scalar() or 0) + 1
+        
+        # Per (species, age bucket) cell: trees, sum and sum of squares of their mean size, for height and girth
+        totals = {name: np.zeros((3, species_count * age_buckets)) for name in ("height", "girth")}
+        
+        last_id = 0
+        while True:
+            trees = self.db.query(UserTree.id, UserTree.species_id, UserTree.planting_date).filter(
+                UserTree.id > last_id
+            ).order_by(UserTree.id).limit(batch_size).all()
+            if not trees:
+                break
+            self._accumulate(trees, totals, age_buckets, bucket_days)
+            if len(trees) < batch_size:
+                break
+            last_id = trees[-1][0]
+        
+        now = datetime.utcnow()
+        stats = {}
+        for name, (count, total, squares) in totals.items():
+            mean = total / np.maximum(count, 1)
+            std = np.sqrt(np.maximum(squares / np.maximum(count, 1) - mean ** 2, 0))
+            stats[name] = (count, mean / 10, std / 10)
+        
+        rows = []
+        for cell in np.flatnonzero(totals["height"][0] + totals["girth"][0]).tolist():
+            height_count, height_mean, height_std = (values[cell] for values in stats["height"])
+            girth_count, girth_mean, girth_std = (values[cell] for values in stats["girth"])
+            rows.append({
+                "species_id": cell // age_buckets,
+                "age_bucket": cell % age_buckets,
+                "bucket_days": bucket_days,
+                "tree_count": int(height_count),
+                "mean_height": round(float(height_mean), 1) if height_count else None,
+                "std_height": round(float(height_std), 1) if height_count else None,
+                "girth_tree_count": int(girth_count),
+                "mean_girth": round(float(girth_mean), 1) if girth_count else None,
+                "std_girth": round(float(girth_std), 1) if girth_count else None,
+                "computed_at": now
+            })
+        
+        # Replaced in one transaction, readers see the old curves or the new ones
+        self.db.execute(delete(SpeciesGrowthCurve))
+        if rows:
+            self.db.execute(insert(SpeciesGrowthCurve), rows)
+        self.db.commit()
+        return len(rows)
+    
+    def _accumulate(self, trees, totals: Dict[str, np.ndarray], age_buckets: int, bucket_days: int):
+        """Add one batch of trees' readings to the running per-species, per-age totals"""
+        position = {tree_id: i for i, (tree_id, _, _) in enumerate(trees)}
+        species = np.array([species_id for _, species_id, _ in trees], dtype=np.int64)
+        planted = np.array([planting_date for _, _, planting_date in trees], dtype="datetime64[s]").astype(np.int64)
+        
+        chunks = self.db.query(
+            TreeMeasurementChunk.user_tree_id,
+            TreeMeasurementChunk.month,
+            TreeMeasurementChunk.reading_count,
+            TreeMeasurementChunk.data
+        ).filter(TreeMeasurementChunk.user_tree_id.in_(list(position))).all()
+        if not chunks:
+            return
+        
+        tree_index = np.repeat([position[tree_id] for tree_id, _, _, _ in chunks], [count for _, _, count, _ in chunks])
+        readings = self._decode([(month, count, data) for _, month, count, data in chunks])
+        
+        age_bucket = (readings["times"] - planted[tree_index]) // (bucket_days * 86400)
+        valid = (age_bucket >= 0) & (age_bucket < age_buckets)
+        
+        for name in ("height", "girth"):
+            present = valid & (readings[name] != MISSING)
+            if not present.any():
+                continue
+            # Each tree's readings within an age bucket are averaged first, so it counts once
+            tree_cells, inverse = np.unique(tree_index[present] * age_buckets + age_bucket[present], return_inverse=True)
+            tree_means = np.bincount(inverse, weights=readings[name][present]) / np.bincount(inverse)
+            cells = species[tree_cells // age_buckets] * age_buckets + tree_cells % age_buckets
+            
+            size = totals[name].shape[1]
+            totals[name][0] += np.bincount(cells, minlength=size)[:size]
+            totals[name][1] += np.bincount(cells, weights=tree_means, minlength=size)[:size]
+            totals[name][2] += np.bincount(cells, weights=tree_means ** 2, minlength=size)[:size]
+
+# Safe to retry, curves are rebuilt from scratch
+@job(
+    "trees.growth_curves",
+    every_seconds=settings.GROWTH_CURVE_INTERVAL_HOURS * 60 * 60
+)
+def growth_curves_job(db: Session, payloads):
+    rows = TreeGrowthService(db).rebuild_growth_curves()
+    logger.info(f"Growth curves: {rows} species age buckets")
@@ -0,0 +1,321 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import Date, cast, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.job_queue import job
+from app.models.tree import WateringLog, WateringDailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Archive file columns: name, dtype. Missing numbers are NaN, missing text is "".
+ARCHIVE_COLUMNS = (
+    ("id", "i8"),
+    ("user_tree_id", "i8"),
+    ("user_id", "i8"),
+    ("watered_at", "datetime64[s]"),
+    ("amount", "f8"),
+    ("method", "U"),
+    ("notes", "U"),
+    ("temperature", "f8"),
+    ("humidity", "f8"),
+    ("rainfall", "f8"),
+)
+
+def _day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _months(start: datetime, end: datetime) -> List[datetime]:
+    months = []
+    month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= end:
+        months.append(month)
+        month = month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+    return months
+
+class WateringHistoryService:
+    """Watering history across daily rollups, recent raw logs and the columnar archive of older logs"""
+    
+    # watering_logs only keeps WATERING_LOG_HOT_DAYS of rows. Counts and totals come from the daily
+    # rollups, which are updated with every watering; older raw logs are in compressed .npz files
+    # under WATERING_ARCHIVE_DIR, one per month and tree shard, and read back only for a tree's history.
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # ============ WRITES ============
+    
+    def add_to_rollup(self, user_id: int, tree_id: int, watered_at: datetime, liters: Optional[float]):
+        """Count a new watering in its day's rollup, in the caller's transaction"""
+        day = watered_at.date()
+        if self._update_rollup(user_id, tree_id, day, liters or 0.0):
+            return
+        
+        try:
+            with self.db.begin_nested():
+                self.db.add(WateringDailyRollup(
+                    user_id=user_id,
+                    user_tree_id=tree_id,
+                    day=day,
+                    waterings=1,
+                    liters=liters or 0.0
+                ))
+        except IntegrityError:
+            # Another watering created this day's row first
+            self._update_rollup(user_id, tree_id, day, liters or 0.0)
+    
+    def _update_rollup(self, user_id: int, tree_id: int, day: date, liters: float) -> bool:
+        result = self.db.execute(
+            update(WateringDailyRollup).where(
+                WateringDailyRollup.user_id == user_id,
+                WateringDailyRollup.user_tree_id == tree_id,
+                WateringDailyRollup.day == day
+            ).values(
+                waterings=WateringDailyRollup.waterings + 1,
+                liters=WateringDailyRollup.liters + liters,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def rebuild_rollups(self) -> int:
+        """Recompute rollups for every day that still has raw logs, archived days are left as they are"""
+        oldest = self.db.query(func.min(WateringLog.watered_at)).scalar()
+        if oldest is None:
+            return 0
+        
+        day = self._log_day()
+        self.db.execute(delete(WateringDailyRollup).where(WateringDailyRollup.day >= oldest.date()))
+        created = self.db.execute(
+            insert(WateringDailyRollup).from_select(
+                ["user_id", "user_tree_id", "day", "waterings", "liters", "updated_at"],
+                select(
+                    WateringLog.user_id,
+                    WateringLog.user_tree_id,
+                    day,
+                    func.count(WateringLog.id),
+                    func.coalesce(func.sum(WateringLog.amount), 0.0),
+                    func.now()
+                ).where(WateringLog.watered_at >= _day_start(oldest)).group_by(
+                    WateringLog.user_id,
+                    WateringLog.user_tree_id,
+                    day
+                )
+            )
+        ).rowcount
+        self.db.commit()
+        return created
+    
+    def ensure_rollups(self) -> int:
+        """Rebuild the rollups when a raw log's day has none (first archive run after an upgrade), returns rows built"""
+        missing = self.db.query(
+            select(WateringLog.id).where(
+                ~select(WateringDailyRollup.id).where(
+                    WateringDailyRollup.user_id == WateringLog.user_id,
+                    WateringDailyRollup.user_tree_id == WateringLog.user_tree_id,
+                    WateringDailyRollup.day == self._log_day()
+                ).exists()
+            ).exists()
+        ).scalar()
+        if not missing:
+            return 0
+        
+        built = self.rebuild_rollups()
+        logger.info(f"Rebuilt {built} daily watering rollups from watering_logs")
+        return built
+    
+    def _log_day(self):
+        if self.db.get_bind().dialect.name == "postgresql":
+            return cast(WateringLog.watered_at, Date)
+        return func.date(WateringLog.watered_at)
+    
+    # ============ READS ============
+    
+    def hot_cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """Raw logs before this have been (or are about to be) archived"""
+        return _day_start((now or datetime.utcnow()) - timedelta(days=settings.WATERING_LOG_HOT_DAYS))
+    
+    def waterings_since(self, user_id: int, since: Optional[datetime] = None, now: Optional[datetime] = None):
+        """Scalar subquery counting a user's waterings since a moment (all of them without one)"""
+        rollup_days = select(func.coalesce(func.sum(WateringDailyRollup.waterings), 0)).where(
+            WateringDailyRollup.user_id == user_id
+        )
+        if since is None:
+            return rollup_days.scalar_subquery()
+        
+        first_day = _day_start(since)
+        if since == first_day or since < self.hot_cutoff(now):
+            # A whole first day, or one whose raw logs may be archived already, counts from its rollup
+            return rollup_days.where(WateringDailyRollup.day >= first_day.date()).scalar_subquery()
+        
+        # Whole days from the rollups, the part of the first day from the raw logs
+        partial_day = select(func.count(WateringLog.id)).where(
+            WateringLog.user_id == user_id,
+            WateringLog.watered_at >= since,
+            WateringLog.watered_at < first_day + timedelta(days=1)
+        )
+        return (
+            rollup_days.where(WateringDailyRollup.day > first_day.date()).scalar_subquery()
+            + partial_day.scalar_subquery()
+        )
+    
+    def daily(self, user_id: int, start: date, end: date, tree_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Waterings and liters per day between start and end, over all of a user's trees or one of them"""
+        query = self.db.query(
+            WateringDailyRollup.day,
+            func.sum(WateringDailyRollup.waterings),
+            func.sum(WateringDailyRollup.liters)
+        ).filter(
+            WateringDailyRollup.user_id == user_id,
+            WateringDailyRollup.day >= start,
+            WateringDailyRollup.day <= end
+        )
+        if tree_id is not None:
+            query = query.filter(WateringDailyRollup.user_tree_id == tree_id)
+        
+        return [
+            {"day": day, "waterings": int(waterings), "liters": round(float(liters or 0), 2)}
+            for day, waterings, liters in query.group_by(WateringDailyRollup.day).order_by(WateringDailyRollup.day).all()
+        ]
+    
+    def logs(self, tree_id: int, start: datetime, end: datetime, limit: int = 500) -> List[Dict[str, Any]]:
+        """A tree's raw watering logs, newest first, from the table and the archive alike"""
+        columns = [getattr(WateringLog, name) for name, _ in ARCHIVE_COLUMNS]
+        rows = [
+            dict(zip((name for name, _ in ARCHIVE_COLUMNS), row))
+            for row in self.db.query(*columns).filter(
+                WateringLog.user_tree_id == tree_id,
+                WateringLog.watered_at >= start,
+                WateringLog.watered_at <= end
+            ).order_by(WateringLog.watered_at.desc()).limit(limit).all()
+        ]
+        
+        cutoff = self.hot_cutoff()
+        if start < cutoff and len(rows) < limit:
+            # Rows archived but not yet deleted are in both, the table's copy wins
+            seen = {row["id"] for row in rows if row["watered_at"] < cutoff}
+            archived = self._read_archive(tree_id, start, min(end, cutoff), limit - len(rows), seen)
+            rows.extend(sorted(archived, key=lambda row: row["watered_at"], reverse=True)[:limit - len(rows)])
+        
+        return rows
+    
+    def _read_archive(self, tree_id: int, start: datetime, end: datetime, limit: int, skip_ids: set) -> List[Dict[str, Any]]:
+        """Archived rows newest month first, stopping after the month that reaches limit"""
+        shard = tree_id % settings.WATERING_ARCHIVE_SHARDS
+        rows = []
+        for month in reversed(_months(start, end)):
+            if len(rows) >= limit:
+                break
+            path = self._archive_path(month, shard)
+            if not os.path.exists(path):
+                continue
+            with np.load(path, allow_pickle=False) as archive:
+                columns = {name: archive[name] for name, _ in ARCHIVE_COLUMNS}
+            match = (
+                (columns["user_tree_id"] == tree_id)
+                & (columns["watered_at"] >= np.datetime64(start, "s"))
+                & (columns["watered_at"] <= np.datetime64(end, "s"))
+                & ~np.isin(columns["id"], list(skip_ids))
+            )
+            for i in np.flatnonzero(match):
+                rows.append({name: self._from_archive(name, columns[name][i]) for name, _ in ARCHIVE_COLUMNS})
+        return rows
+    
+    def _from_archive(self, name: str, value):
+        if name == "watered_at":
+            return value.astype(datetime)
+        if name in ("method", "notes"):
+            return str(value) or None
+        if name in ("id", "user_tree_id", "user_id"):
+            return int(value)
+        return None if np.isnan(value) else float(value)
+    
+    # ============ ARCHIVAL ============
+    
+    def archive(self, now: Optional[datetime] = None, batch_size: Optional[int] = None) -> int:
+        """Move raw logs older than the hot horizon to the archive files, one commit per batch"""
+        batch_size = batch_size or settings.WATERING_ARCHIVE_BATCH_SIZE
+        cutoff = self.hot_cutoff(now)
+        
+        # Archived days are only counted by their rollups, never delete logs that are not rolled up
+        self.ensure_rollups()
+        columns = [getattr(WateringLog, name) for name, _ in ARCHIVE_COLUMNS]
+        
+        archived = 0
+        while True:
+            rows = self.db.query(*columns).filter(
+                WateringLog.watered_at < cutoff
+            ).order_by(WateringLog.id).limit(batch_size).all()
+            if not rows:
+                break
+            
+            groups = defaultdict(list)
+            for row in rows:
+                groups[(row.watered_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0), row.user_tree_id % settings.WATERING_ARCHIVE_SHARDS)].append(row)
+            for (month, shard), group in groups.items():
+                self._append_archive(self._archive_path(month, shard), group)
+            
+            # Files are written before the rows go, a failed run leaves rows that merge in again by id
+            self.db.execute(
+                delete(WateringLog).where(
+                    WateringLog.id <= rows[-1].id,
+                    WateringLog.watered_at < cutoff
+                ).execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            
+            archived += len(rows)
+            if len(rows) < batch_size:
+                break
+        
+        return archived
+    
+    def _archive_path(self, month: datetime, shard: int) -> str:
+        return os.path.join(settings.WATERING_ARCHIVE_DIR, month.strftime("%Y-%m"), f"{shard:03d}.npz")
+    
+    def _append_archive(self, path: str, rows):
+        """Merge rows into an archive file, replaced atomically"""
+        columns = {
+            "id": np.array([row.id for row in rows], dtype="i8"),
+            "user_tree_id": np.array([row.user_tree_id for row in rows], dtype="i8"),
+            "user_id": np.array([row.user_id for row in rows], dtype="i8"),
+            "watered_at": np.array([row.watered_at for row in rows], dtype="datetime64[s]"),
+            "method": np.array([row.method or "" for row in rows], dtype="U"),
+            "notes": np.array([row.notes or "" for row in rows], dtype="U"),
+        }
+        for name in ("amount", "temperature", "humidity", "rainfall"):
+            columns[name] = np.array([getattr(row, name) for row in rows], dtype="f8")  # None becomes NaN
+        
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as archive:
+                existing = {name: archive[name] for name, _ in ARCHIVE_COLUMNS}
+            columns = {name: np.concatenate((existing[name], columns[name])) for name in existing}
+        
+        # Sorted by tree, so a tree's rows sit together and compress well; duplicate ids are dropped
+        _, unique = np.unique(columns["id"], return_index=True)
+        order = unique[np.lexsort((columns["watered_at"][unique], columns["user_tree_id"][unique]))]
+        columns = {name: values[order] for name, values in columns.items()}
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + ".part"
+        with open(partial, "wb") as file:
+            np.savez_compressed(file, **columns)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(partial, path)
+
+# Safe to retry, archive files are merged by log id. Workers claim it as soon as they start, so the
+# first run after an upgrade builds the rollups once instead of every API process checking at boot.
+@job(
+    "trees.archive_watering_logs",
+    every_seconds=settings.WATERING_ARCHIVE_INTERVAL_HOURS * 60 * 60
+)
+def archive_watering_logs_job(db: Session, payloads):
+    archived = WateringHistoryService(db).archive()
+    if archived:
+        logger.info(f"Archived {archived} watering logs")
@@ -0,0 +1,199 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update, and_, or_
+from app.core.config import settings
+from app.models.user import UserPreferences
+from app.models.tree import UserTree
+from app.models.notifications import Notification, NotificationPreference
+from app.schemas.notifications import NotificationType
+from app.services.notification_counters import NotificationCounterService
+from app.services.notification_stream import notification_broker
+from app.services.species_catalog import species_catalog
+
+logger = logging.getLogger(__name__)
+
+# UserPreferences defaults, for users who never saved preferences
+DEFAULT_TIMEZONE = "Africa/Nairobi"
+DEFAULT_REMINDER_TIME = "08:00"
+
+# Trees listed in a reminder's data, the message carries the full count
+MAX_TREES_PER_REMINDER = 20
+
+class WateringReminderScheduler:
+    """One reminder per user with due trees, sent at their local reminder_time"""
+    
+    def __init__(self, db: Session, page_size: int = 5000, batch_size: int = 1000):
+        self.db = db
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.counters = NotificationCounterService(db)
+    
+    def run(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Remind every user whose reminder time has passed today and who was not reminded yet"""
+        now = now or datetime.utcnow()
+        
+        totals = {"buckets": 0, "users": 0, "trees": 0}
+        for offset, timezones in self._timezone_buckets(now).items():
+            users, trees = self._run_bucket(now, offset, timezones)
+            totals["buckets"] += 1
+            totals["users"] += users
+            totals["trees"] += trees
+        
+        return totals
+    
+    def _timezone_buckets(self, now: datetime) -> Dict[timedelta, List[str]]:
+        """Timezones in use, grouped by their current UTC offset so each group is one query"""
+        names = {name for (name,) in self.db.query(UserPreferences.timezone).distinct().all() if name}
+        names.add(DEFAULT_TIMEZONE)
+        
+        buckets: Dict[timedelta, List[str]] = {}
+        for name in sorted(names):
+            try:
+                zone = ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.warning(f"Skipping watering reminders for unknown timezone '{name}'")
+                continue
+            offset = now.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset()
+            buckets.setdefault(offset, []).append(name)
+        
+        return buckets
+    
+    def _run_bucket(self, now: datetime, offset: timedelta, timezones: List[str]):
+        """Stream due trees for one offset in (user_id, tree id) keyset pages, returns (users, trees)"""
+        local_now = now + offset
+        local_day_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        earliest = max(local_now - timedelta(hours=settings.WATERING_REMINDER_CATCHUP_HOURS), local_day_start)
+        
+        reminder_time = func.coalesce(UserPreferences.reminder_time, DEFAULT_REMINDER_TIME)
+        due = self.db.query(
+            UserTree.user_id,
+            UserTree.id,
+            UserTree.name,
+            UserTree.species_id,
+            UserTree.next_watering_due
+        ).outerjoin(
+            UserPreferences, UserPreferences.user_id == UserTree.user_id
+        ).outerjoin(
+            NotificationPreference, NotificationPreference.user_id == UserTree.user_id
+        ).filter(
+            UserTree.is_active == True,
+            UserTree.next_watering_due <= now,
+            func.coalesce(UserPreferences.timezone, DEFAULT_TIMEZONE).in_(timezones),
+            # HH:MM strings compare in time order
+            reminder_time <= local_now.strftime("%H:%M"),
+            reminder_time >= earliest.strftime("%H:%M"),
+            func.coalesce(UserPreferences.watering_reminders, True) == True,
+            func.coalesce(NotificationPreference.watering_reminders, True) == True,
+            # At most one reminder per local day
+            or_(
+                UserPreferences.last_watering_reminder_at == None,
+                UserPreferences.last_watering_reminder_at < local_day_start - offset
+            )
+        )
+        
+        # Species names come from the catalog instead of a join
+        species_catalog.ensure_loaded(self.db)
+        
+        users = trees = 0
+        reminders: List[Dict[str, Any]] = []
+        current: Optional[Dict[str, Any]] = None
+        last_user_id, last_tree_id = 0, 0
+        
+        while True:
+            rows = due.filter(
+                or_(
+                    UserTree.user_id > last_user_id,
+                    and_(UserTree.user_id == last_user_id, UserTree.id > last_tree_id)
+                )
+            ).order_by(UserTree.user_id, UserTree.id).limit(self.page_size).all()
+            
+            for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+                # A user's trees can span pages, keep adding to the open reminder
+                if current is None or current["user_id"] != user_id:
+                    if current is not None:
+                        reminders.append(current)
+                    current = {"user_id": user_id, "count": 0, "trees": [], "most_overdue": now}
+                
+                for _, tree_id, tree_name, species_id, next_watering_due in user_rows:
+                    current["count"] += 1
+                    current["most_overdue"] = min(current["most_overdue"], next_watering_due)
+                    if len(current["trees"]) < MAX_TREES_PER_REMINDER:
+                        species = species_catalog.get(species_id)
+                        current["trees"].append((tree_id, tree_name or (species.name if species else "tree")))
+            
+            if len(reminders) >= self.batch_size:
+                users += len(reminders)
+                trees += sum(reminder["count"] for reminder in reminders)
+                self._send(reminders, now)
+                reminders = []
+            
+            if len(rows) < self.page_size:
+                break
+            last_user_id, last_tree_id = rows[-1][0], rows[-1][1]
+        
+        if current is not None:
+            reminders.append(current)
+        if reminders:
+            users += len(reminders)
+            trees += sum(reminder["count"] for reminder in reminders)
+            self._send(reminders, now)
+        
+        return users, trees
+    
+    def _send(self, reminders: List[Dict[str, Any]], now: datetime):
+        """Insert one batch of reminders, mark the users reminded and commit"""
+        rows = []
+        for reminder in reminders:
+            if reminder["count"] == 1:
+                message = f"Your {reminder['trees'][0][1]} needs watering. Keep your streak alive!"
+            else:
+                message = f"{reminder['count']} of your trees need watering. Keep your streaks alive!"
+            
+            rows.append({
+                "user_id": reminder["user_id"],
+                "title": "🌱 Time to Water Your Trees!",
+                "message": message,
+                "type": NotificationType.WATERING_REMINDER.value,
+                "data": {
+                    "tree_ids": [tree_id for tree_id, _ in reminder["trees"]],
+                    "tree_count": reminder["count"],
+                    "days_overdue": (now - reminder["most_overdue"]).days
+                },
+                "is_read": False,
+                "created_at": now
+            })
+        
+        user_ids = [reminder["user_id"] for reminder in reminders]
+        self.db.execute(insert(Notification), rows)
+        self.counters.record_created(user_ids)
+        self._mark_reminded(user_ids, now)
+        self.db.commit()
+        notification_broker.publish(user_ids)
+    
+    def _mark_reminded(self, user_ids: List[int], reminded_at: datetime):
+        result = self.db.execute(
+            update(UserPreferences).where(
+                UserPreferences.user_id.in_(user_ids)
+            ).values(
+                last_watering_reminder_at=reminded_at
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount >= len(user_ids):
+            return
+        
+        # Users on default preferences get a row to carry the marker
+        existing = {
+            user_id for (user_id,) in self.db.query(UserPreferences.user_id).filter(
+                UserPreferences.user_id.in_(user_ids)
+            ).all()
+        }
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        if missing:
+            self.db.execute(insert(UserPreferences), [
+                {"user_id": user_id, "last_watering_reminder_at": reminded_at}
+                for user_id in missing
+            ])
@@ -0,0 +1,263 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, text, update
+from app.core.config import settings
+from app.core.job_queue import job
+from app.models.tree import UserTree
+from app.services.species_catalog import species_catalog
+from app.services.weather_service import weather_service
+
+logger = logging.getLogger(__name__)
+
+# Water a tree needs per day by TreeSpecies.water_requirements, in mm of rain
+DAILY_NEED_MM = {"low": 2.0, "medium": 4.0, "high": 6.0}
+DEFAULT_DAILY_NEED_MM = DAILY_NEED_MM["medium"]
+DEFAULT_WATERING_FREQUENCY = 3
+
+# Established trees go longer between waterings, up to 1.5x the species interval after two years
+AGE_STRETCH_PER_YEAR = 0.25
+AGE_STRETCH_MAX_YEARS = 2.0
+
+# (south, west, north, east) in degrees
+Bounds = Tuple[float, float, float, float]
+
+class RainfallSource:
+    """Rainfall per weather grid cell, the base class reports none (plain species schedule)"""
+    
+    def rainfall(self, centers: np.ndarray, now: datetime) -> np.ndarray:
+        """(n, 2) array of [recent, forecast] mm for (n, 2) [lat, lon] cell centers"""
+        return np.zeros((len(centers), 2))
+
+class OpenWeatherRainfallSource(RainfallSource):
+    """Forecast rain from OpenWeather's 5 day forecast, one throttled request per forecast cell"""
+    
+    # The free endpoints have no rainfall history, so only the forecast half is filled in. Runs are
+    # nightly, so during a rainy spell each night's forecast keeps pushing watering back anyway.
+    # Forecasts are asked for on the coarser WATERING_FORECAST_GRID_DEGREES grid, which every weather
+    # cell inside shares, and requests are spaced to stay under the per-minute quota. A 429 waits
+    # out Retry-After and asks again rather than scheduling the cell as if no rain were coming.
+    
+    RATE_LIMIT_RETRIES = 3
+    
+    def __init__(self, client: Optional[httpx.Client] = None):
+        self.client = client
+        self.grid_degrees = settings.WATERING_FORECAST_GRID_DEGREES
+        self.interval = 60.0 / settings.OPENWEATHER_REQUESTS_PER_MINUTE
+        self._next_request_at = 0.0
+        # Forecast cell -> forecast mm, so each cell is requested once however many chunks touch it
+        self._forecasts: Dict[Tuple[int, int], float] = {}
+    
+    def rainfall(self, centers: np.ndarray, now: datetime) -> np.ndarray:
+        amounts = np.zeros((len(centers), 2))
+        if not len(centers):
+            return amounts
+        cells = np.floor((centers + [90, 180]) / self.grid_degrees).astype(np.int64)
+        keys = [tuple(cell) for cell in cells.tolist()]
+        missing = sorted(set(keys) - self._forecasts.keys())
+        if missing:
+            horizon = (now + timedelta(days=settings.WATERING_RAIN_FORECAST_DAYS)).timestamp()
+            client = self.client or httpx.Client(timeout=10)
+            try:
+                for row, column in missing:
+                    lat = (row + 0.5) * self.grid_degrees - 90
+                    lon = (column + 0.5) * self.grid_degrees - 180
+                    self._forecasts[(row, column)] = self._forecast(client, lat, lon, horizon)
+            finally:
+                if client is not self.client:
+                    client.close()
+        amounts[:, 1] = [self._forecasts[key] for key in keys]
+        return amounts
+    
+    def _forecast(self, client: httpx.Client, lat: float, lon: float, horizon: float) -> float:
+        """Forecast mm up to horizon at one point, 0 if OpenWeather can't be reached"""
+        try:
+            for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+                self._throttle()
+                response = client.get(
+                    f"{weather_service.base_url}/forecast",
+                    params={"lat": lat, "lon": lon, "appid": weather_service.api_key, "units": "metric"}
+                )
+                if response.status_code != 429 or attempt == self.RATE_LIMIT_RETRIES:
+                    break
+                retry_after = response.headers.get("Retry-After", "")
+                time.sleep(float(retry_after) if retry_after.isdigit() else 60.0)
+            response.raise_for_status()
+            return sum(
+                item.get("rain", {}).get("3h", 0) for item in response.json()["list"]
+                if item["dt"] <= horizon
+            )
+        except Exception as e:
+            logger.warning(f"Rain forecast for ({lat:.2f}, {lon:.2f}) failed, scheduling without it: {e}")
+            return 0.0
+    
+    def _throttle(self):
+        """Wait until the next request fits under OPENWEATHER_REQUESTS_PER_MINUTE"""
+        now = time.monotonic()
+        if self._next_request_at > now:
+            time.sleep(self._next_request_at - now)
+            now = self._next_request_at
+        self._next_request_at = now + self.interval
+
+def default_rainfall_source() -> RainfallSource:
+    return OpenWeatherRainfallSource() if weather_service.api_key else RainfallSource()
+
+class WateringScheduleEngine:
+    """Recomputes next_watering_due from species needs, tree age and rainfall, in NumPy chunks"""
+    
+    # A tree is due a species interval (stretched with age) after it was last watered or planted.
+    # Rain in its weather cell, recent or forecast, counts as that many days of its daily need and
+    # moves the due date past today by up to WATERING_MAX_RAIN_DELAY_DAYS. Only the inputs decide
+    # the result, so runs are repeatable and a failed one can simply run again.
+    
+    def __init__(self, db: Session, source: Optional[RainfallSource] = None, chunk_size: Optional[int] = None):
+        self.db = db
+        self.source = source or default_rainfall_source()
+        self.chunk_size = chunk_size or settings.WATERING_SCHEDULE_CHUNK_SIZE
+        self.grid_degrees = settings.WATERING_WEATHER_GRID_DEGREES
+        # Cell key -> [recent, forecast] mm for this run, bounded by the grid rather than the tree count
+        self._rain: Dict[int, np.ndarray] = {}
+    
+    def run(self, bounds: Optional[Bounds] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Reschedule every active tree (within bounds if given), one commit per chunk"""
+        now = now or datetime.utcnow()
+        species_catalog.ensure_loaded(self.db)
+        frequency, daily_need = self._species_arrays()
+        
+        trees = self.db.query(
+            UserTree.id,
+            UserTree.species_id,
+            UserTree.latitude,
+            UserTree.longitude,
+            UserTree.planting_date,
+            UserTree.last_watered,
+            UserTree.next_watering_due
+        ).filter(UserTree.is_active == True)
+        if bounds is not None:
+            south, west, north, east = bounds
+            trees = trees.filter(
+                UserTree.latitude >= south,
+                UserTree.latitude <= north,
+                UserTree.longitude >= west,
+                UserTree.longitude <= east
+            )
+        
+        totals = {"trees": 0, "updated": 0}
+        last_id = 0
+        while True:
+            rows = trees.filter(UserTree.id > last_id).order_by(UserTree.id).limit(self.chunk_size).all()
+            if not rows:
+                break
+            
+            ids, due, changed = self._schedule_chunk(rows, frequency, daily_need, now)
+            if changed.any():
+                self._write(ids[changed].tolist(), due[changed].astype("datetime64[us]").tolist(), now)
+            self.db.commit()
+            
+            totals["trees"] += len(rows)
+            totals["updated"] += int(changed.sum())
+            if len(rows) < self.chunk_size:
+                break
+            last_id = rows[-1][0]
+        
+        return totals
+    
+    def _write(self, ids: List[int], due: List[datetime], now: datetime):
+        """Write back one chunk's changed due dates"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            # One statement joining against the arrays, instead of a round trip per tree
+            self.db.execute(text(
+                f"UPDATE {UserTree.__tablename__} SET next_watering_due = changed.due, updated_at = :now "
+                f"FROM unnest(CAST(:ids AS integer[]), CAST(:due AS timestamp[])) AS changed (id, due) "
+                f"WHERE {UserTree.__tablename__}.id = changed.id"
+            ), {"ids": ids, "due": due, "now": now})
+        else:
+            trees = UserTree.__table__
+            self.db.execute(
+                update(trees).where(trees.c.id == bindparam("tree_id")).values(
+                    next_watering_due=bindparam("due"),
+                    updated_at=now
+                ),
+                [{"tree_id": tree_id, "due": next_due} for tree_id, next_due in zip(ids, due)]
+            )
+    
+    def _species_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Watering frequency (days) and daily need (mm) indexed by species id"""
+        species = species_catalog.all()
+        size = max((s.id for s in species), default=0) + 1
+        frequency = np.full(size, float(DEFAULT_WATERING_FREQUENCY))
+        daily_need = np.full(size, DEFAULT_DAILY_NEED_MM)
+        for s in species:
+            frequency[s.id] = s.watering_frequency or DEFAULT_WATERING_FREQUENCY
+            daily_need[s.id] = DAILY_NEED_MM.get((s.water_requirements or "").lower(), DEFAULT_DAILY_NEED_MM)
+        return frequency, daily_need
+    
+    def _schedule_chunk(self, rows, frequency: np.ndarray, daily_need: np.ndarray, now: datetime):
+        """Returns (ids, new due dates, mask of rows whose due date changed)"""
+        ids, species_ids, lat, lon, planted, watered, current = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        species_ids = np.array(species_ids, dtype=np.int64)
+        lat = np.array(lat, dtype=float)
+        lon = np.array(lon, dtype=float)
+        planted = np.array(planted, dtype="datetime64[s]")
+        watered = np.array(watered, dtype="datetime64[s]")
+        current = np.array(current, dtype="datetime64[s]")
+        today = np.datetime64(now, "s")
+        
+        # Species added since the catalog loaded fall back to the defaults
+        known = species_ids < len(frequency)
+        species_ids = np.where(known, species_ids, 0)
+        interval = np.where(known, frequency[species_ids], float(DEFAULT_WATERING_FREQUENCY))
+        need = np.where(known, daily_need[species_ids], DEFAULT_DAILY_NEED_MM)
+        
+        age_years = np.clip((today - planted) / np.timedelta64(365, "D"), 0, AGE_STRETCH_MAX_YEARS)
+        interval = interval * (1 + AGE_STRETCH_PER_YEAR * age_years)
+        
+        anchor = np.where(np.isnat(watered), planted, watered)
+        due = anchor + (interval * 86400).astype("timedelta64[s]")
+        
+        rain_days = np.minimum(self._rainfall(lat, lon, now).sum(axis=1) / need, settings.WATERING_MAX_RAIN_DELAY_DAYS)
+        rained = rain_days > 0
+        rain_due = np.maximum(due, today) + (rain_days * 86400).astype("timedelta64[s]")
+        due = np.where(rained, rain_due, due)
+        
+        changed = np.isnat(current) | (np.abs(due - current) >= np.timedelta64(60, "s"))
+        return ids, due, changed
+    
+    def _rainfall(self, lat: np.ndarray, lon: np.ndarray, now: datetime) -> np.ndarray:
+        """[recent, forecast] mm per tree, zero for trees without coordinates"""
+        rain = np.zeros((len(lat), 2))
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        if not located.any():
+            return rain
+        
+        columns = int(np.ceil(360 / self.grid_degrees))
+        row = np.floor((lat[located] + 90) / self.grid_degrees).astype(np.int64)
+        column = np.floor((lon[located] + 180) / self.grid_degrees).astype(np.int64)
+        cells, inverse = np.unique(row * columns + column, return_inverse=True)
+        
+        missing = np.array([cell for cell in cells.tolist() if cell not in self._rain], dtype=np.int64)
+        if len(missing):
+            centers = np.column_stack((
+                (missing // columns + 0.5) * self.grid_degrees - 90,
+                (missing % columns + 0.5) * self.grid_degrees - 180
+            ))
+            for cell, amounts in zip(missing.tolist(), self.source.rainfall(centers, now)):
+                self._rain[cell] = amounts
+        
+        rain[located] = np.array([self._rain[cell] for cell in cells.tolist()])[inverse]
+        return rain
+
+# Safe to retry, due dates are recomputed from scratch
+@job(
+    "trees.watering_schedule",
+    queue="default",
+    every_seconds=settings.WATERING_SCHEDULE_INTERVAL_HOURS * 60 * 60
+)
+def watering_schedule_job(db: Session, payloads):
+    result = WateringScheduleEngine(db).run()
+    logger.info(f"Watering schedule: {result['updated']} of {result['trees']} trees rescheduled")
@@ -0,0 +1,26 @@
+import sys
+from app.database.session import SessionLocal
+from app.services.achievement_backfill import AchievementBackfill
+from app.services.leaderboard_service import LeaderboardService
+
+def backfill_achievements(achievement_ids=None):
+    """Award achievements to all users who already qualify for them"""
+    db = SessionLocal()
+    
+    try:
+        total = AchievementBackfill(db).run(achievement_ids)
+        print(f"Successfully backfilled {total} achievement awards!")
+        
+        # Points were credited through the ledger, refresh the Redis boards
+        if total and LeaderboardService(db).rebuild():
+            print("Rebuilt leaderboards")
+        
+    except Exception as e:
+        print(f"Error backfilling achievements: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # Optional achievement ids, e.g. python -m app.utils.backfill_achievements 12 13
+    backfill_achievements([int(arg) for arg in sys.argv[1:]] or None)
@@ -0,0 +1,25 @@
+from app.database.session import SessionLocal
+from app.models.tree import UserTree
+from app.models.nursery import Nursery
+from app.models.social import CommunityEvent, StreakActivity
+from app.services.geo_index import GeoIndexService
+
+def backfill_geohashes():
+    """Compute geohashes for rows saved before geospatial indexing, safe to run again"""
+    db = SessionLocal()
+    
+    try:
+        service = GeoIndexService(db)
+        for model in (UserTree, Nursery, CommunityEvent, StreakActivity):
+            filled = service.backfill(model)
+            print(f"{model.__tablename__}: {filled} geohashes computed")
+        print("Successfully backfilled geohashes!")
+        
+    except Exception as e:
+        print(f"Error backfilling geohashes: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_geohashes()
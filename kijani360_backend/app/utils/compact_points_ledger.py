@@ -0,0 +1,28 @@
+from app.database.session import SessionLocal
+from app.services.points_service import PointsService
+
+def compact_points_ledger():
+    """Fold settled points ledger entries into users.points"""
+    db = SessionLocal()
+    
+    try:
+        service = PointsService(db)
+        
+        total = 0
+        while True:
+            compacted = service.compact()
+            if not compacted:
+                break
+            total += compacted
+            print(f"Compacted {total} ledger entries so far...")
+        
+        print(f"Successfully compacted {total} points ledger entries!")
+        
+    except Exception as e:
+        print(f"Error compacting points ledger: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    compact_points_ledger()
@@ -0,0 +1,23 @@
+from app.database.session import SessionLocal
+from app.services.notification_partitions import NotificationPartitionService
+
+def partition_notifications():
+    """Convert the Postgres notifications table to monthly partitions and create upcoming months"""
+    db = SessionLocal()
+    
+    try:
+        service = NotificationPartitionService(db)
+        if service.convert_to_partitioned():
+            print("Successfully converted notifications to a partitioned table!")
+        else:
+            created = service.ensure()
+            print(f"Notification partitions up to date ({len(created)} created)")
+        
+    except Exception as e:
+        print(f"Error partitioning notifications: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    partition_notifications()
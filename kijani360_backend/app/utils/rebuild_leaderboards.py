@@ -0,0 +1,27 @@
+from app.database.session import SessionLocal
+from app.services.leaderboard_service import LeaderboardService
+
+def rebuild_leaderboards():
+    """Purge expired leaderboard buckets and rebuild the Redis leaderboards from SQL"""
+    db = SessionLocal()
+    
+    try:
+        service = LeaderboardService(db)
+        
+        purged = service.purge_expired()
+        print(f"Purged {purged} expired weekly/monthly leaderboard rows")
+        
+        if not service.redis:
+            print("Redis is not available. Leaderboards will be served from SQL.")
+            return
+        
+        total = service.rebuild()
+        print(f"Successfully rebuilt leaderboards for {total} users!")
+        
+    except Exception as e:
+        print(f"Error rebuilding leaderboards: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_leaderboards()
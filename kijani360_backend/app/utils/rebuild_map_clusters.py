@@ -0,0 +1,22 @@
+from app.database.session import SessionLocal
+from app.services.map_clusters import LAYERS, MapClusterService
+
+def rebuild_map_clusters():
+    """Recompute every map cluster from the points, run once after adding geohashes"""
+    db = SessionLocal()
+    
+    try:
+        service = MapClusterService(db)
+        for layer in LAYERS:
+            cells = service.rebuild(layer)
+            print(f"{layer}: {cells} cells at the finest level")
+        print("Successfully rebuilt map clusters!")
+        
+    except Exception as e:
+        print(f"Error rebuilding map clusters: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_map_clusters()
@@ -0,0 +1,18 @@
+from app.database.session import SessionLocal
+from app.services.watering_history import WateringHistoryService
+
+def rebuild_watering_rollups():
+    """Recompute daily watering rollups from the raw logs still in watering_logs"""
+    db = SessionLocal()
+    
+    try:
+        total = WateringHistoryService(db).rebuild_rollups()
+        print(f"Successfully rebuilt {total} daily watering rollups!")
+        
+    except Exception as e:
+        print(f"Error rebuilding watering rollups: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_watering_rollups()
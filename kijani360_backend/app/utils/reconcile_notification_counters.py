@@ -0,0 +1,19 @@
+from app.database.session import SessionLocal
+from app.services.notification_counters import NotificationCounterService
+
+def reconcile_notification_counters():
+    """Rebuild unread/total notification counters from the notifications table"""
+    db = SessionLocal()
+    
+    try:
+        fixed = NotificationCounterService(db).reconcile()
+        print(f"Successfully reconciled notification counters ({fixed} corrected)!")
+        
+    except Exception as e:
+        print(f"Error reconciling notification counters: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    reconcile_notification_counters()
@@ -0,0 +1,13 @@
+from app.services.species_catalog import species_catalog
+
+def refresh_species_catalog():
+    """Make every API worker reload tree species, run after editing the tree_species table"""
+    try:
+        species_catalog.invalidate()
+        print("Species catalog version bumped, workers reload within 30 seconds!")
+        
+    except Exception as e:
+        print(f"Error refreshing species catalog: {e}")
+
+if __name__ == "__main__":
+    refresh_species_catalog()
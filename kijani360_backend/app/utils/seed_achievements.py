@@ -1,6 +1,9 @@
 from sqlalchemy.orm import Session
 from app.models.forum import Achievement
 from app.database.session import SessionLocal
+from app.services.achievement_engine import achievement_catalog
+from app.services.achievement_backfill import AchievementBackfill
+from app.services.leaderboard_service import LeaderboardService
 
 def seed_achievements():
     """Seed initial achievements into the database"""
@@ -133,6 +136,38 @@ def seed_achievements():
             "points_reward": 200
         },
         
+        # Forum Achievements
+        {
+            "name": "First Post",
+            "description": "Make your first forum post",
+            "icon": "💬",
+            "criteria_type": "forum_posts",
+            "criteria_value": 1,
+            "badge_color": "#0ea5e9",
+            "rarity": "common",
+            "points_reward": 15
+        },
+        {
+            "name": "Active Member",
+            "description": "Make 10 forum posts",
+            "icon": "🗣️",
+            "criteria_type": "forum_posts",
+            "criteria_value": 10,
+            "badge_color": "#0284c7",
+            "rarity": "rare",
+            "points_reward": 75
+        },
+        {
+            "name": "Community Leader",
+            "description": "Make 50 forum posts",
+            "icon": "📣",
+            "criteria_type": "forum_posts",
+            "criteria_value": 50,
+            "badge_color": "#0369a1",
+            "rarity": "epic",
+            "points_reward": 200
+        },
+        
         # Special Achievements
         {
             "name": "Early Adopter",
@@ -167,20 +202,29 @@ def seed_achievements():
     ]
     
     try:
-        # Check if achievements already exist
-        existing_count = db.query(Achievement).count()
-        if existing_count > 0:
-            print(f"Achievements already exist ({existing_count} found). Skipping seed.")
+        # Only achievements not in the table yet (matched by name), existing rows are left as they are
+        existing_names = {name for (name,) in db.query(Achievement.name).all()}
+        new_achievements = [
+            Achievement(**ach_data) for ach_data in achievements_data
+            if ach_data["name"] not in existing_names
+        ]
+        if not new_achievements:
+            print(f"All {len(achievements_data)} achievements already exist. Nothing to seed.")
             return
         
-        # Create achievements
-        for ach_data in achievements_data:
-            achievement = Achievement(**ach_data)
-            db.add(achievement)
-        
+        db.add_all(new_achievements)
         db.commit()
-        print(f"Successfully seeded {len(achievements_data)} achievements!")
+        achievement_catalog.invalidate()
+        print(f"Successfully seeded {len(new_achievements)} new achievements!")
         
+        # Existing users may already qualify for the new ones
+        awarded = AchievementBackfill(db).run([achievement.id for achievement in new_achievements])
+        print(f"Backfilled {awarded} achievement awards for existing users")
+        
+        # Points were credited through the ledger, refresh the Redis boards
+        if awarded and LeaderboardService(db).rebuild():
+            print("Rebuilt leaderboards")
+    
     except Exception as e:
         print(f"Error seeding achievements: {e}")
         db.rollback()
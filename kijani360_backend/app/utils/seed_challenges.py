@@ -0,0 +1,76 @@
+import json
+from app.models.forum import Challenge
+from app.database.session import SessionLocal
+from app.services.challenge_service import challenge_catalog
+
+def seed_challenges():
+    """Seed initial challenges into the database"""
+    db = SessionLocal()
+    
+    challenges_data = [
+        {
+            "title": "Plant Native Species",
+            "description": "Plant 3 native Kenyan tree species this week",
+            "icon": "🌳",
+            "metric": "trees_planted",
+            "progress_type": "count",
+            "target": 3,
+            "period": "week",
+            "filters": json.dumps({"native_species": True}),
+            "reward_points": 100
+        },
+        {
+            "title": "Community Helper",
+            "description": "Help 5 community members with tree advice",
+            "icon": "🤝",
+            "metric": "forum_posts",
+            "progress_type": "count",
+            "target": 5,
+            "period": "week",
+            "reward_points": 75
+        },
+        {
+            "title": "Streak Keeper",
+            "description": "Maintain your watering streak for 7 days",
+            "icon": "💧",
+            "metric": "watering_streak",
+            "progress_type": "max",
+            "target": 7,
+            "period": "week",
+            "reward_points": 150
+        },
+        {
+            "title": "Monthly Planter",
+            "description": "Plant 20 trees this month",
+            "icon": "📅",
+            "metric": "trees_planted",
+            "progress_type": "count",
+            "target": 20,
+            "period": "month",
+            "reward_points": 200
+        }
+    ]
+    
+    try:
+        # Check if challenges already exist
+        existing_count = db.query(Challenge).count()
+        if existing_count > 0:
+            print(f"Challenges already exist ({existing_count} found). Skipping seed.")
+            return
+        
+        # Create challenges
+        for challenge_data in challenges_data:
+            db.add(Challenge(**challenge_data))
+        
+        db.commit()
+        challenge_catalog.invalidate()
+        print(f"Successfully seeded {len(challenges_data)} challenges!")
+        
+    except Exception as e:
+        print(f"Error seeding challenges: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    seed_challenges()
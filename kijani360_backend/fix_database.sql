@@ -21,6 +21,78 @@ UPDATE watering_streaks
 SET last_activity_date = created_at 
 WHERE last_activity_date IS NULL;
 
+-- Offline activity sync (client-generated ids for idempotent retries)
+ALTER TABLE streak_activities 
+ADD COLUMN IF NOT EXISTS client_id VARCHAR;
+
+CREATE UNIQUE INDEX IF NOT EXISTS unique_activity_client_id 
+ON streak_activities (user_id, client_id);
+
+-- Native species flag (used by challenge filters)
+ALTER TABLE tree_species 
+ADD COLUMN IF NOT EXISTS is_native BOOLEAN DEFAULT FALSE;
+
+-- Award lookups (achievement engine and backfill)
+CREATE INDEX IF NOT EXISTS ix_user_achievements_user_achievement 
+ON user_achievements (user_id, achievement_id);
+
+-- Per-user notification reads (live stream cursor, unread counts)
+CREATE INDEX IF NOT EXISTS ix_notifications_user_id_id 
+ON notifications (user_id, id);
+
+-- Watering reminder scheduler
+CREATE INDEX IF NOT EXISTS ix_user_trees_next_watering_due 
+ON user_trees (next_watering_due);
+
+ALTER TABLE user_preferences 
+ADD COLUMN IF NOT EXISTS last_watering_reminder_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_user_preferences_user_id 
+ON user_preferences (user_id);
+
+-- Notification coalescing and daily digests
+ALTER TABLE notifications 
+ADD COLUMN IF NOT EXISTS group_key VARCHAR(100),
+ADD COLUMN IF NOT EXISTS actor_count INTEGER DEFAULT 1,
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_notifications_user_id_group_key 
+ON notifications (user_id, group_key);
+
+ALTER TABLE notification_preferences 
+ADD COLUMN IF NOT EXISTS daily_digest BOOLEAN DEFAULT FALSE;
+
+-- Geospatial lookups (fill existing rows with app/utils/backfill_geohashes.py)
+ALTER TABLE user_trees 
+ADD COLUMN IF NOT EXISTS geohash VARCHAR(9);
+
+ALTER TABLE nurseries 
+ADD COLUMN IF NOT EXISTS geohash VARCHAR(9);
+
+ALTER TABLE community_events 
+ADD COLUMN IF NOT EXISTS geohash VARCHAR(9);
+
+ALTER TABLE streak_activities 
+ADD COLUMN IF NOT EXISTS geohash VARCHAR(9);
+
+CREATE INDEX IF NOT EXISTS ix_user_trees_geohash 
+ON user_trees (geohash);
+
+CREATE INDEX IF NOT EXISTS ix_nurseries_geohash 
+ON nurseries (geohash);
+
+CREATE INDEX IF NOT EXISTS ix_community_events_geohash 
+ON community_events (geohash);
+
+CREATE INDEX IF NOT EXISTS ix_streak_activities_geohash 
+ON streak_activities (geohash);
+
+CREATE INDEX IF NOT EXISTS ix_watering_logs_user_watered_at 
+ON watering_logs (user_id, watered_at);
+
+CREATE INDEX IF NOT EXISTS ix_watering_logs_tree_watered_at 
+ON watering_logs (user_tree_id, watered_at);
+
 -- Show table structure to verify
 \d tree_planting_streaks;
 \d users;
\ No newline at end of file
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+KijaniCare360 Background Job Worker
+
+Usage: python run_worker.py [queue ...]   (defaults to every configured queue)
+"""
+import logging
+import signal
+import sys
+from pathlib import Path
+
+# Add the app directory to Python path
+app_dir = Path(__file__).parent
+sys.path.insert(0, str(app_dir))
+
+from app.core.config import settings
+from app.core.job_queue import JobWorker
+
+def main():
+    """Run a job worker until interrupted"""
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    try:
+        worker = JobWorker(sys.argv[1:] or None)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    print(f"🌱 Starting KijaniCare360 job worker {worker.worker_id}...")
+    print(f"📬 Queues: {', '.join(worker.queues)}")
+    print("-" * 60)
+    
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    print("\n🌳 KijaniCare360 job worker stopped gracefully.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Tests run against a throwaway SQLite database, set before the app reads its settings
+_db_dir = tempfile.mkdtemp(prefix="kijani360-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("REDIS_URL", "")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from sqlalchemy import event
+from app.database.session import Base, SessionLocal, engine
+from app.models import user, social, tree, forum, notifications, nursery, maps, media
+from app.models.user import User
+
+@event.listens_for(engine, "connect")
+def _enable_foreign_keys(connection, record):
+    # SQLite only checks foreign keys when asked, Postgres always does
+    connection.execute("PRAGMA foreign_keys=ON")
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def make_user(db):
+    def make(username: str, **fields) -> User:
+        user = User(email=f"{username}@example.com", username=username, hashed_password="x", **fields)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    return make
@@ -0,0 +1,39 @@
+from datetime import datetime
+from app.models.forum import Achievement, UserAchievement
+from app.models.social import LeaderboardPeriodScore
+from app.services.achievement_backfill import AchievementBackfill
+from app.services.leaderboard_service import LeaderboardService, period_bucket
+from app.services.points_service import PointsService
+
+def _period_points(db, user_id: int) -> dict:
+    db.expire_all()
+    return {
+        score.period: score.points
+        for score in db.query(LeaderboardPeriodScore).filter_by(user_id=user_id).all()
+    }
+
+def test_backfilled_points_reach_the_period_boards(db, make_user):
+    db.add_all([
+        Achievement(name="First Tree", description="1 tree", criteria_type="trees_planted", criteria_value=1, points_reward=10),
+        Achievement(name="Ten Trees", description="10 trees", criteria_type="trees_planted", criteria_value=10, points_reward=50),
+        Achievement(name="Badge Only", description="5 trees", criteria_type="trees_planted", criteria_value=5, points_reward=0),
+    ])
+    db.commit()
+    veteran = make_user("veteran", total_trees_planted=12, county=" Nakuru ")
+    active = make_user("active", total_trees_planted=3)
+    newcomer = make_user("newcomer", total_trees_planted=0)
+    # Already on this week's and month's boards
+    LeaderboardService(db).record_activity(active.id, trees=3, points=30)
+    db.commit()
+    
+    assert AchievementBackfill(db, report=lambda message: None).run(chunk_size=2) == 4
+    
+    assert db.query(UserAchievement).count() == 4
+    assert _period_points(db, veteran.id) == {"week": 60, "month": 60}
+    assert _period_points(db, active.id) == {"week": 40, "month": 40}
+    assert _period_points(db, newcomer.id) == {}
+    assert PointsService(db).get_balance(veteran.id) == 60
+    
+    bucket, _ = period_bucket("week", datetime.utcnow())
+    score = db.query(LeaderboardPeriodScore).filter_by(user_id=veteran.id, period="week").one()
+    assert (score.bucket, score.county, score.trees_planted) == (bucket, "nakuru", 0)
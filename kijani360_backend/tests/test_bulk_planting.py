@@ -0,0 +1,84 @@
+import time
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from app.api.v1.endpoints import trees
+from app.core.security import create_access_token
+from app.database.session import engine
+from app.models.forum import Challenge
+from app.models.tree import TreeSpecies, UserTree
+from app.models.user import PointsLedgerEntry
+from app.services.challenge_service import challenge_catalog
+from app.services.species_catalog import species_catalog
+
+# The bulk endpoint's target: a 1,000-tree school event well under a second
+BULK_TREES = 1000
+BULK_SECONDS = 1.0
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(trees.router, prefix="/api/v1/trees")
+    return TestClient(app)
+
+def _auth(user) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+def _trees(count: int) -> list:
+    now = datetime.utcnow().isoformat()
+    return [
+        {"species_id": 1 + i % 4, "planting_date": now, "name": f"Tree {i}", "latitude": -1.29, "longitude": 36.82}
+        for i in range(count)
+    ]
+
+def _setup(db):
+    db.add_all([TreeSpecies(name=f"Species {i}", watering_frequency=2 + i, is_native=i % 2 == 0) for i in range(4)])
+    db.commit()
+    species_catalog.invalidate()
+    challenge_catalog.invalidate()
+
+def _ledger_total(db, user_id: int) -> int:
+    return db.query(func.coalesce(func.sum(PointsLedgerEntry.delta), 0)).filter(PointsLedgerEntry.user_id == user_id).scalar()
+
+def test_bulk_planting_benchmark(db, make_user):
+    _setup(db)
+    user = make_user("school")
+    client = _client()
+    client.post("/api/v1/trees/plant/bulk", json={"trees": _trees(1)}, headers=_auth(user))  # Warm up imports and caches
+    
+    statements = []
+    count = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        response = client.post("/api/v1/trees/plant/bulk", json={"trees": _trees(BULK_TREES)}, headers=_auth(user))
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    
+    print(f"\n{BULK_TREES} trees planted in {elapsed * 1000:.0f}ms with {len(statements)} statements")
+    assert response.status_code == 200
+    assert response.json()["planted"] == BULK_TREES
+    assert db.query(UserTree).filter(UserTree.user_id == user.id).count() == BULK_TREES + 1
+    # Statements do not grow with the batch, the trees are one multi-row insert
+    assert len(statements) < 60
+    assert elapsed < BULK_SECONDS
+
+def test_bulk_planting_returns_all_points_credited(db, make_user):
+    _setup(db)
+    db.add(Challenge(title="Plant 5", metric="trees_planted", target=5, period="week", reward_points=50))
+    db.commit()
+    challenge_catalog.invalidate()
+    user = make_user("club")
+    client = _client()
+    
+    awarded = []
+    for _ in range(2):
+        before = _ledger_total(db, user.id)
+        response = client.post("/api/v1/trees/plant/bulk", json={"trees": _trees(3)}, headers=_auth(user))
+        assert response.status_code == 200
+        awarded.append(response.json()["points_awarded"])
+        assert awarded[-1] == _ledger_total(db, user.id) - before
+    
+    # 30 for the trees each time; the second batch adds a streak bonus (2 x 2) and completes the challenge
+    assert awarded == [30, 30 + 4 + 50]
@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.models.forum import Challenge, UserChallengeProgress
+from app.services.challenge_service import ChallengeService, challenge_catalog
+
+@pytest.fixture
+def challenge(db):
+    challenge = Challenge(title="Water 3", metric="trees_watered", target=3, period="week", reward_points=20)
+    db.add(challenge)
+    db.commit()
+    challenge_catalog.invalidate()
+    return challenge
+
+def test_progress_accumulates_until_completed(db, make_user, challenge):
+    user = make_user("waterer")
+    service = ChallengeService(db)
+    
+    assert service.record_event(user.id, "trees_watered", 2) == []
+    assert [definition.id for definition in service.record_event(user.id, "trees_watered", 2)] == [challenge.id]
+    db.commit()
+    
+    assert db.query(UserChallengeProgress.progress).filter_by(user_id=user.id).scalar() == 4
+
+def test_progress_for_missing_user_raises(db, challenge):
+    with pytest.raises(IntegrityError):
+        ChallengeService(db).record_event(404, "trees_watered", 1)
+    db.rollback()
+    
+    assert db.query(UserChallengeProgress).count() == 0
@@ -0,0 +1,84 @@
+import threading
+import time
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.models.social import CollaborativeStreak, CollaborativeStreakMember, CollaborativeStreakCounterShard
+from app.services.collaborative_streak_service import CollaborativeStreakService
+
+def _streak_with_members(db, make_user, members: int):
+    users = [make_user(f"member{i}") for i in range(members)]
+    streak = CollaborativeStreak(name="School 500", created_by=users[0].id, total_trees_planted=7)
+    db.add(streak)
+    db.flush()
+    db.add_all([CollaborativeStreakMember(streak_id=streak.id, user_id=user.id) for user in users])
+    db.commit()
+    return streak, users
+
+def test_concurrent_contributions_are_not_lost(db, make_user):
+    streak, users = _streak_with_members(db, make_user, 10)
+    per_user = 20
+    errors = []
+    
+    def contribute(user_id: int):
+        session = SessionLocal()
+        try:
+            for _ in range(per_user):
+                # SQLite has one writer at a time, a locked database is retried like a serialization failure
+                for _ in range(100):
+                    try:
+                        CollaborativeStreakService(session).add_contribution(streak.id, user_id, 2)
+                        session.commit()
+                        break
+                    except OperationalError:
+                        session.rollback()
+                        time.sleep(0.01)
+                else:
+                    errors.append(user_id)
+        finally:
+            session.close()
+    
+    threads = [threading.Thread(target=contribute, args=(user.id,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert CollaborativeStreakService(db).get_total(streak.id) == 7 + len(users) * per_user * 2
+    db.expire_all()
+    contributed = {member.user_id: member.trees_contributed for member in db.query(CollaborativeStreakMember).all()}
+    assert contributed == {user.id: per_user * 2 for user in users}
+    shards = db.query(CollaborativeStreakCounterShard).filter_by(streak_id=streak.id).count()
+    assert 1 <= shards <= settings.COLLABORATIVE_STREAK_COUNTER_SHARDS
+
+def test_shard_created_by_another_writer_is_incremented(db, make_user, monkeypatch):
+    streak, users = _streak_with_members(db, make_user, 1)
+    monkeypatch.setattr(settings, "COLLABORATIVE_STREAK_COUNTER_SHARDS", 1)
+    db.add(CollaborativeStreakCounterShard(streak_id=streak.id, shard=0, trees_planted=5))
+    db.commit()
+    
+    # The first update misses, as if the other writer's shard had not committed yet
+    service = CollaborativeStreakService(db)
+    real_update = service._update_shard
+    calls = []
+    def update_shard(*args):
+        calls.append(args)
+        return False if len(calls) == 1 else real_update(*args)
+    monkeypatch.setattr(service, "_update_shard", update_shard)
+    
+    service.add_contribution(streak.id, users[0].id, 3)
+    db.commit()
+    
+    assert len(calls) == 2
+    assert CollaborativeStreakService(db).get_total(streak.id) == 7 + 5 + 3
+
+def test_contribution_to_missing_streak_raises(db, make_user):
+    user = make_user("lost")
+    
+    with pytest.raises(IntegrityError):
+        CollaborativeStreakService(db).add_contribution(404, user.id, 3)
+    db.rollback()
+    
+    assert db.query(CollaborativeStreakCounterShard).count() == 0
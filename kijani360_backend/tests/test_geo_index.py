@@ -0,0 +1,42 @@
+import random
+from app.core.geo import encode, haversine_km
+from app.models.nursery import Nursery
+from app.services import geo_index
+from app.services.geo_index import GeoIndexService
+
+CENTER = (-1.29, 36.82)
+
+def _nurseries(db, owner, count: int):
+    rng = random.Random(3)
+    for i in range(count):
+        lat, lon = CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3)
+        db.add(Nursery(
+            name=f"Nursery {i}", owner_id=owner.id, phone_number="0700000000", county="Nairobi",
+            latitude=lat, longitude=lon, geohash=encode(lat, lon), is_active=True
+        ))
+    db.commit()
+    return db.query(Nursery).all()
+
+def test_nearby_matches_a_full_scan_across_candidate_pages(db, make_user, monkeypatch):
+    nurseries = _nurseries(db, make_user("owner"), 1500)
+    # Many small pages, as a dense area would need
+    monkeypatch.setattr(geo_index, "MIN_CANDIDATE_PAGE", 7)
+    
+    for limit, radius_km in [(5, 2), (20, 25), (100, 50)]:
+        nearby = GeoIndexService(db).nearby(Nursery, *CENTER, radius_km, Nursery.is_active == True, limit=limit)
+        
+        expected = sorted((haversine_km(*CENTER, n.latitude, n.longitude), n.id) for n in nurseries)
+        expected = [nursery_id for distance, nursery_id in expected if distance <= radius_km][:limit]
+        assert [nursery.id for nursery, _ in nearby] == expected
+
+def test_within_stops_at_limit(db, make_user, monkeypatch):
+    nurseries = _nurseries(db, make_user("owner"), 1500)
+    monkeypatch.setattr(geo_index, "MIN_CANDIDATE_PAGE", 7)
+    south, west, north, east = bounds = (-1.3, 36.8, -1.2, 36.9)
+    inside = {n.id for n in nurseries if south <= n.latitude <= north and west <= n.longitude <= east}
+    
+    some = GeoIndexService(db).within(Nursery, bounds, limit=20)
+    every = GeoIndexService(db).within(Nursery, bounds, limit=len(nurseries))
+    
+    assert len(some) == 20 and {n.id for n in some} <= inside
+    assert {n.id for n in every} == inside
@@ -0,0 +1,30 @@
+import io
+import pytest
+from PIL import Image
+from app.core.images import render_variants
+
+def _encoded(image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), "green").save(buffer, image_format)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+def test_truncated_image_is_rejected_as_unreadable(tmp_path, image_format):
+    data = _encoded(image_format)
+    source = tmp_path / "upload"
+    # The header survives, the pixel data is cut off
+    source.write_bytes(data[:len(data) // 2])
+    
+    with pytest.raises(ValueError, match="truncated or corrupt"):
+        render_variants(str(source), str(tmp_path / "media"), "stem", [320, 640], 10 ** 8)
+    
+    assert not (tmp_path / "media").exists()
+
+def test_variants_are_written_for_a_valid_image(tmp_path):
+    source = tmp_path / "upload"
+    source.write_bytes(_encoded("JPEG"))
+    
+    rendered = render_variants(str(source), str(tmp_path / "media"), "stem", [320, 640, 1280], 10 ** 8)
+    
+    assert rendered["variants"] == {"320": "stem_320.webp", "640": "stem_640.webp"}
+    assert (tmp_path / "media" / "stem.jpg").exists()
@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.models.social import LeaderboardPeriodScore
+from app.services.leaderboard_service import LeaderboardService
+
+def test_activity_is_added_to_weekly_and_monthly_buckets(db, make_user):
+    user = make_user("planter")
+    
+    LeaderboardService(db).record_activity(user.id, trees=2, points=20)
+    LeaderboardService(db).record_activity(user.id, trees=1, points=10, streak=4)
+    db.commit()
+    
+    scores = db.query(LeaderboardPeriodScore).filter_by(user_id=user.id).all()
+    assert sorted(score.period for score in scores) == ["month", "week"]
+    assert {(score.trees_planted, score.points, score.best_streak) for score in scores} == {(3, 30, 4)}
+
+def test_activity_for_missing_user_raises(db):
+    with pytest.raises(IntegrityError):
+        LeaderboardService(db).record_activity(404, trees=1, points=10)
+    db.rollback()
+    
+    assert db.query(LeaderboardPeriodScore).count() == 0
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.models.notifications import Notification
+from app.services.notification_partitions import NotificationPartitionService, OPEN_GROUP_INDEX
+from app.services.notification_service import NotificationService
+
+def _like(user_id: int, liker_id: int, liker: str) -> dict:
+    return {
+        "user_id": user_id,
+        "title": "❤️ New Like",
+        "message": f"{liker} liked your post",
+        "type": "post_like",
+        "data": {"target_type": "post", "target_id": 7},
+        "preference": None,
+        "group_key": "like:post:7",
+        "actor": liker,
+        "actor_id": liker_id,
+        "action": "liked your post"
+    }
+
+def _open(user_id: int, created_at: datetime, actor_id: int = 99) -> Notification:
+    return Notification(
+        user_id=user_id, title="❤️ New Like", message="someone liked your post", type="post_like",
+        data={"actor_ids": [actor_id]}, is_read=False, created_at=created_at, group_key="like:post:7"
+    )
+
+def test_first_events_racing_merge_into_one_notification(db, make_user, monkeypatch):
+    owner = make_user("owner")
+    service = NotificationService(db)
+    
+    # The other writer commits its notification after this one found no open group
+    real_coalesce = service._coalesce
+    calls = []
+    def coalesce(payload, now):
+        calls.append(payload)
+        if len(calls) == 1:
+            other = SessionLocal()
+            other.add(_open(owner.id, now))
+            other.commit()
+            other.close()
+            return False
+        return real_coalesce(payload, now)
+    monkeypatch.setattr(service, "_coalesce", coalesce)
+    
+    assert service.deliver_notifications([_like(owner.id, 2, "amina")]) == 0
+    
+    notifications = db.query(Notification).filter_by(user_id=owner.id).all()
+    assert len(notifications) == 1
+    assert notifications[0].actor_count == 2
+    assert notifications[0].message == "amina and 1 other liked your post"
+
+def test_open_group_index_rejects_a_second_open_notification(db, make_user):
+    owner = make_user("owner")
+    db.add(_open(owner.id, datetime.utcnow()))
+    db.commit()
+    
+    db.add(_open(owner.id, datetime.utcnow()))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+def test_event_after_the_window_opens_a_new_notification(db, make_user):
+    owner = make_user("owner")
+    stale = _open(owner.id, datetime.utcnow() - timedelta(minutes=settings.NOTIFICATION_COALESCE_WINDOW_MINUTES + 1))
+    db.add(stale)
+    db.commit()
+    
+    assert NotificationService(db).deliver_notifications([_like(owner.id, 2, "amina")]) == 1
+    
+    db.expire_all()
+    assert stale.group_key is None
+    assert stale.is_read == False
+    current = db.query(Notification).filter_by(group_key="like:post:7").one()
+    assert current.id != stale.id
+
+def test_missing_index_is_added_after_closing_duplicate_groups(db, make_user):
+    owner = make_user("owner")
+    db.execute(text(f"DROP INDEX {OPEN_GROUP_INDEX}"))
+    older, newer = _open(owner.id, datetime.utcnow()), _open(owner.id, datetime.utcnow())
+    db.add_all([older, newer])
+    db.commit()
+    
+    NotificationPartitionService(db).ensure()
+    
+    db.expire_all()
+    assert older.group_key is None
+    assert newer.group_key == "like:post:7"
+    db.add(_open(owner.id, datetime.utcnow()))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
@@ -0,0 +1,48 @@
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import notifications
+from app.core.security import create_access_token
+from app.models.notifications import Notification, NotificationPartition
+from app.services.notification_partitions import NotificationPartitionService, add_months, month_start, partition_name
+
+def _list(user) -> list:
+    app = FastAPI()
+    app.include_router(notifications.router, prefix="/api/v1/notifications")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    response = TestClient(app).get("/api/v1/notifications/", headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def _notify(db, user, count: int, created_at: datetime):
+    db.add_all([
+        Notification(user_id=user.id, title="🌳", message=f"Note {i}", type="system_alert", is_read=False, created_at=created_at)
+        for i in range(count)
+    ])
+    db.commit()
+
+def test_existing_notifications_stay_listed_after_first_ensure(db, make_user):
+    user = make_user("reader")
+    _notify(db, user, 3, datetime.utcnow())
+    assert len(_list(user)) == 3
+    
+    NotificationPartitionService(db).ensure()
+    _notify(db, user, 1, datetime.utcnow())
+    
+    assert len(_list(user)) == 4
+
+def test_month_created_ahead_bounds_listing_by_id(db, make_user):
+    user = make_user("reader")
+    now = datetime.utcnow()
+    floor = add_months(month_start(now), 1 - 3)
+    # Partitioning was running before the floor month began, so its first id is exact
+    db.add(NotificationPartition(
+        name=partition_name(floor), starts_at=floor, ends_at=add_months(floor, 1),
+        first_id=5, is_native=False, created_at=add_months(floor, -1)
+    ))
+    db.commit()
+    
+    criteria = NotificationPartitionService(db).recent_criteria(now=now)
+    
+    assert len(criteria) == 2
+    assert criteria[1].right.value == 5
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.core.config import settings
+from app.models.user import PointsLedgerEntry, PointsLedgerGap, User
+from app.services.points_service import PointsService
+
+SETTLED = datetime.utcnow() - timedelta(hours=1)
+
+def _entry(db, entry_id: int, user_id: int, delta: int):
+    db.execute(insert(PointsLedgerEntry), [
+        {"id": entry_id, "user_id": user_id, "delta": delta, "reason": "tree_planted", "created_at": SETTLED}
+    ])
+    db.commit()
+
+def _points(db, user_id: int) -> int:
+    db.expire_all()
+    return db.query(User.points).filter(User.id == user_id).scalar() or 0
+
+def test_entry_committing_below_the_watermark_is_folded_later(db, make_user):
+    user = make_user("planter", points=0)
+    service = PointsService(db)
+    _entry(db, 1, user.id, 10)
+    _entry(db, 3, user.id, 30)
+    
+    # Id 2 belongs to a transaction that has not committed yet
+    assert service.compact() == 2
+    assert _points(db, user.id) == 40
+    assert [gap.entry_id for gap in db.query(PointsLedgerGap).all()] == [2]
+    
+    # It commits after the watermark passed it, and counts straight away
+    _entry(db, 2, user.id, 20)
+    assert service.get_balance(user.id) == 60
+    
+    assert service.compact() == 1
+    assert _points(db, user.id) == 60
+    assert service.get_balance(user.id) == 60
+    assert db.query(PointsLedgerGap).count() == 0
+
+def test_ids_that_never_commit_are_forgotten(db, make_user):
+    user = make_user("planter", points=0)
+    service = PointsService(db)
+    _entry(db, 1, user.id, 5)
+    _entry(db, 4, user.id, 5)
+    service.compact()
+    assert db.query(PointsLedgerGap).count() == 2
+    
+    # Rolled back long ago, the next compaction drops them
+    db.query(PointsLedgerGap).update({PointsLedgerGap.created_at: datetime.utcnow() - timedelta(hours=settings.POINTS_LEDGER_GAP_HOURS + 1)})
+    db.commit()
+    _entry(db, 5, user.id, 5)
+    service.compact()
+    
+    assert db.query(PointsLedgerGap).count() == 0
+    assert _points(db, user.id) == 15
+    assert service.get_balance(user.id) == 15
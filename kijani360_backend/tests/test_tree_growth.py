@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.models.tree import SpeciesGrowthCurve, TreeMeasurementChunk, TreeSpecies, UserTree
+from app.services.tree_growth import MISSING, TreeGrowthService, decode_chunk, decode_chunks, encode_chunk
+
+PLANTED = datetime(2025, 1, 1)
+
+def _month_readings(rng, count: int) -> dict:
+    times = np.sort(rng.choice(28 * 86400, size=count, replace=False))
+    height = rng.integers(0, 5000, size=count)
+    girth = rng.integers(0, 800, size=count)
+    # Readings that left out a size, including the first and last of the month
+    height[rng.random(count) < 0.3] = MISSING
+    girth[[0, -1]] = MISSING
+    return {"times": times, "height": height, "girth": girth, "health": rng.integers(0, 4, size=count)}
+
+def test_chunks_round_trip_end_to_end():
+    rng = np.random.default_rng(7)
+    months = [_month_readings(rng, count) for count in (5, 1, 12, 3, 40)]
+    
+    decoded = decode_chunks([len(m["times"]) for m in months], [encode_chunk(m) for m in months])
+    
+    for name in ("times", "height", "girth", "health"):
+        np.testing.assert_array_equal(decoded[name], np.concatenate([m[name] for m in months]))
+    single = decode_chunk(encode_chunk(months[2]), 12)
+    np.testing.assert_array_equal(single["height"], months[2]["height"])
+
+@pytest.fixture
+def tree(db, make_user):
+    db.add(TreeSpecies(id=1, name="Neem", watering_frequency=3))
+    db.commit()
+    tree = UserTree(user_id=make_user("grower").id, species_id=1, planting_date=PLANTED)
+    db.add(tree)
+    db.commit()
+    return tree
+
+def _record(db, tree, *readings):
+    TreeGrowthService(db).record(tree, [
+        {"measured_at": PLANTED + timedelta(days=days), "height": height, "girth": girth, "health_status": health}
+        for days, height, girth, health in readings
+    ])
+    db.commit()
+
+def test_readings_recorded_out_of_order_are_kept_sorted(db, tree):
+    _record(db, tree, (40, 52.0, None, "healthy"), (33, 50.0, 3.1, None))
+    _record(db, tree, (35, 51.0, None, "sick"), (20, 40.0, 2.5, "healthy"), (45, None, 3.4, None))
+    
+    chunks = db.query(TreeMeasurementChunk).order_by(TreeMeasurementChunk.month).all()
+    assert [(chunk.month.month, chunk.reading_count) for chunk in chunks] == [(1, 1), (2, 4)]
+    assert (chunks[1].first_at, chunks[1].last_at) == (PLANTED + timedelta(days=33), PLANTED + timedelta(days=45))
+    
+    series = TreeGrowthService(db).series(tree.id, PLANTED, PLANTED + timedelta(days=60), points=10)
+    assert [(r["measured_at"], r["height"], r["girth"], r["health_status"]) for r in series["readings"]] == [
+        (PLANTED + timedelta(days=20), 40.0, 2.5, "healthy"),
+        (PLANTED + timedelta(days=33), 50.0, 3.1, None),
+        (PLANTED + timedelta(days=35), 51.0, None, "sick"),
+        (PLANTED + timedelta(days=40), 52.0, None, "healthy"),
+        (PLANTED + timedelta(days=45), None, 3.4, None),
+    ]
+    # The tree shows its newest reading, not the last one sent
+    assert (tree.height, tree.health_status) == (52.0, "healthy")
+
+def test_downsampled_buckets_average_present_sizes(db, tree):
+    _record(db, tree,
+        (0, 10.0, None, "healthy"), (1, 12.0, 2.0, "sick"), (2, None, 4.0, None),
+        (10, 20.0, None, None), (11, 24.0, None, None),
+    )
+    
+    series = TreeGrowthService(db).series(tree.id, PLANTED, PLANTED + timedelta(days=20, seconds=-1), points=2)
+    
+    assert series["resolution_seconds"] == 10 * 86400
+    assert [(r["readings"], r["height"], r["girth"], r["health_status"]) for r in series["readings"]] == [
+        (3, 11.0, 3.0, "sick"),
+        (2, 22.0, None, None),
+    ]
+    assert series["readings"][0]["measured_at"] == PLANTED + timedelta(days=1)
+
+def test_growth_curves_average_each_tree_once(db, tree, make_user):
+    other = UserTree(user_id=make_user("neighbour").id, species_id=1, planting_date=PLANTED)
+    db.add(other)
+    db.commit()
+    # First 30-day age bucket: the first tree twice (mean 20), the other once; then only the other
+    _record(db, tree, (1, 10.0, None, None), (5, 30.0, 4.0, None))
+    _record(db, other, (2, 40.0, None, None), (35, 60.0, 6.0, None))
+    
+    assert TreeGrowthService(db).rebuild_growth_curves(batch_size=1) == 2
+    
+    curves = [
+        (c.species_id, c.age_bucket, c.tree_count, c.mean_height, c.std_height, c.girth_tree_count, c.mean_girth)
+        for c in TreeGrowthService(db).growth_curve(1)
+    ]
+    assert curves == [(1, 0, 2, 30.0, 10.0, 1, 4.0), (1, 1, 1, 60.0, 0.0, 1, 6.0)]
+    assert db.query(SpeciesGrowthCurve).count() == 2
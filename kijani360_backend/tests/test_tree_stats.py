@@ -0,0 +1,44 @@
+from datetime import datetime
+from app.database.session import SessionLocal
+from app.models.tree import TreeCareStatsSnapshot, TreeSpecies, UserTree
+from app.services.tree_care import TreeCareService
+
+def _plant(db, user_id: int):
+    db.add(UserTree(user_id=user_id, species_id=1, planting_date=datetime.utcnow()))
+    TreeCareService(db).invalidate_stats(user_id)
+    db.commit()
+
+def test_change_racing_the_first_computation_is_not_hidden(db, make_user, monkeypatch):
+    user = make_user("planter")
+    db.add(TreeSpecies(id=1, name="Neem", watering_frequency=3))
+    db.commit()
+    _plant(db, user.id)
+    db.query(TreeCareStatsSnapshot).delete()
+    db.commit()
+    
+    # A second tree is planted while the first read computes, before it stores anything
+    service = TreeCareService(db)
+    real_compute = service._compute_stats
+    def compute_then_plant(user_id, now):
+        computed = real_compute(user_id, now)
+        other = SessionLocal()
+        _plant(other, user_id)
+        other.close()
+        return computed
+    monkeypatch.setattr(service, "_compute_stats", compute_then_plant)
+    
+    assert service.get_user_stats(user.id).total_trees == 1
+    
+    db.expire_all()
+    assert db.query(TreeCareStatsSnapshot).filter_by(user_id=user.id).one().stats is None
+    assert TreeCareService(db).get_user_stats(user.id).total_trees == 2
+
+def test_invalidation_creates_an_empty_snapshot(db, make_user):
+    user = make_user("planter")
+    
+    TreeCareService(db).invalidate_stats(user.id)
+    TreeCareService(db).invalidate_stats(user.id)
+    db.commit()
+    
+    snapshot = db.query(TreeCareStatsSnapshot).filter_by(user_id=user.id).one()
+    assert (snapshot.stats, snapshot.version) == (None, 2)
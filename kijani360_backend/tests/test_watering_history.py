@@ -0,0 +1,112 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.models.tree import TreeSpecies, UserTree, WateringDailyRollup, WateringLog
+from app.services.watering_history import WateringHistoryService
+
+NOW = datetime.utcnow().replace(microsecond=0)
+
+@pytest.fixture
+def garden(db, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "WATERING_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "WATERING_ARCHIVE_BATCH_SIZE", 7)
+    db.add(TreeSpecies(id=1, name="Neem", watering_frequency=3))
+    db.commit()
+    user = make_user("gardener")
+    trees = [UserTree(user_id=user.id, species_id=1, planting_date=NOW - timedelta(days=400)) for _ in range(2)]
+    db.add_all(trees)
+    db.commit()
+    return user, trees
+
+def _water(db, user, trees, days_ago: list) -> list:
+    """One watering per entry, as the endpoint records it: the raw log and its day's rollup"""
+    service = WateringHistoryService(db)
+    for i, days in enumerate(days_ago):
+        tree = trees[i % len(trees)]
+        watered_at = NOW - timedelta(days=days, hours=i % 5)
+        amount = None if i % 4 == 0 else 1.5 * i
+        db.add(WateringLog(user_tree_id=tree.id, user_id=user.id, watered_at=watered_at, amount=amount, method="manual" if i % 2 else None))
+        service.add_to_rollup(user.id, tree.id, watered_at, amount)
+    db.commit()
+    return db.query(WateringLog).all()
+
+def _rollups(db) -> dict:
+    return {(r.user_tree_id, r.day): (r.waterings, round(r.liters, 6)) for r in db.query(WateringDailyRollup).all()}
+
+def _expected_rollups(logs) -> dict:
+    counts, liters = Counter(), Counter()
+    for log in logs:
+        key = (log.user_tree_id, log.watered_at.date())
+        counts[key] += 1
+        liters[key] += log.amount or 0.0
+    return {key: (counts[key], round(liters[key], 6)) for key in counts}
+
+def test_rollups_match_raw_logs_and_rebuild(db, garden):
+    user, trees = garden
+    logs = _water(db, user, trees, [0, 0, 1, 1, 1, 3, 10, 10, 40])
+    expected = _expected_rollups(logs)
+    service = WateringHistoryService(db)
+    
+    assert _rollups(db) == expected
+    assert service.ensure_rollups() == 0
+    
+    # As right after an upgrade: raw logs but no rollups
+    db.query(WateringDailyRollup).delete()
+    db.commit()
+    assert service.ensure_rollups() == len(expected)
+    assert _rollups(db) == expected
+
+def test_archive_then_read_returns_the_same_rows(db, garden):
+    user, trees = garden
+    logs = _water(db, user, trees, [0, 2, 30, 89, 91, 95, 120, 150, 150, 200, 260, 300, 320, 330])
+    service = WateringHistoryService(db)
+    start = NOW - timedelta(days=365)
+    before = {tree.id: service.logs(tree.id, start, NOW) for tree in trees}
+    rollups = _rollups(db)
+    cold = sum(1 for log in logs if log.watered_at < service.hot_cutoff())
+    
+    assert service.archive() == cold
+    
+    assert db.query(WateringLog).count() == len(logs) - cold
+    assert {tree.id: service.logs(tree.id, start, NOW) for tree in trees} == before
+    # A limit stops at the newest rows, wherever they are stored
+    assert service.logs(trees[0].id, start, NOW, limit=4) == before[trees[0].id][:4]
+    # Counts keep coming from the rollups
+    assert _rollups(db) == rollups
+
+def test_archive_rerun_after_a_failure_leaves_no_duplicates(db, garden, monkeypatch):
+    user, trees = garden
+    _water(db, user, trees, [100 + 3 * i for i in range(20)])
+    service = WateringHistoryService(db)
+    start = NOW - timedelta(days=365)
+    before = {tree.id: service.logs(tree.id, start, NOW) for tree in trees}
+    
+    # The first batch's files are written, then the run dies before its rows are deleted
+    real_append = service._append_archive
+    appended = []
+    def append_then_fail(path, rows):
+        real_append(path, rows)
+        appended.append(path)
+        if len(appended) == 2:
+            raise OSError("disk full")
+    monkeypatch.setattr(service, "_append_archive", append_then_fail)
+    with pytest.raises(OSError):
+        service.archive()
+    db.rollback()
+    assert db.query(WateringLog).count() == 20
+    # Rows in both the table and a file are read once
+    assert {tree.id: service.logs(tree.id, start, NOW) for tree in trees} == before
+    
+    monkeypatch.setattr(service, "_append_archive", real_append)
+    assert service.archive() == 20
+    
+    assert {tree.id: service.logs(tree.id, start, NOW) for tree in trees} == before
+    ids = []
+    for directory, _, files in os.walk(settings.WATERING_ARCHIVE_DIR):
+        for name in files:
+            with np.load(os.path.join(directory, name)) as archive:
+                ids.extend(archive["id"].tolist())
+    assert sorted(ids) == sorted(row["id"] for rows in before.values() for row in rows)
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+import httpx
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.models.tree import TreeSpecies, UserTree
+from app.services.species_catalog import species_catalog
+from app.services import watering_schedule
+from app.services.watering_schedule import OpenWeatherRainfallSource, RainfallSource, WateringScheduleEngine
+
+NOW = datetime(2026, 3, 10, 6, 0)
+
+# Nairobi gets rain in the stub, Mombasa stays dry
+WET = (-1.29, 36.82)
+DRY = (-4.04, 39.67)
+
+class StubRainfallSource(RainfallSource):
+    """Fixed [recent, forecast] mm for cells near given points, dry everywhere else"""
+    
+    def __init__(self, rain):
+        self.rain = rain
+        self.requested = []
+    
+    def rainfall(self, centers: np.ndarray, now: datetime) -> np.ndarray:
+        self.requested.extend(map(tuple, centers.tolist()))
+        amounts = np.zeros((len(centers), 2))
+        for i, (lat, lon) in enumerate(centers):
+            for (rain_lat, rain_lon), mm in self.rain.items():
+                if abs(lat - rain_lat) <= settings.WATERING_WEATHER_GRID_DEGREES and abs(lon - rain_lon) <= settings.WATERING_WEATHER_GRID_DEGREES:
+                    amounts[i] = mm
+        return amounts
+
+@pytest.fixture
+def grower(db, make_user):
+    db.add(TreeSpecies(id=1, name="Neem", watering_frequency=4, water_requirements="Medium"))
+    db.add(TreeSpecies(id=2, name="Mango", watering_frequency=2, water_requirements="High"))
+    db.commit()
+    species_catalog.invalidate()
+    return make_user("grower")
+
+def _tree(db, user, species_id=1, location=DRY, planted_days_ago=10, watered_days_ago=1):
+    latitude, longitude = location if location else (None, None)
+    tree = UserTree(
+        user_id=user.id,
+        species_id=species_id,
+        planting_date=NOW - timedelta(days=planted_days_ago),
+        last_watered=NOW - timedelta(days=watered_days_ago) if watered_days_ago is not None else None,
+        latitude=latitude,
+        longitude=longitude
+    )
+    db.add(tree)
+    db.commit()
+    return tree
+
+def _run(db, rain=None, **kwargs):
+    source = StubRainfallSource(rain or {})
+    result = WateringScheduleEngine(db, source=source, **kwargs).run(now=NOW)
+    db.expire_all()
+    return result, source
+
+def _days_after(moment: datetime, due: datetime) -> float:
+    return round((due - moment).total_seconds() / 86400, 3)
+
+def test_dry_cell_follows_species_interval(db, grower):
+    tree = _tree(db, grower, planted_days_ago=0, watered_days_ago=None)
+    
+    result, _ = _run(db)
+    
+    assert result == {"trees": 1, "updated": 1}
+    assert tree.next_watering_due == NOW + timedelta(days=4)
+
+def test_rain_pushes_due_date_past_today(db, grower):
+    wet = _tree(db, grower, location=WET, watered_days_ago=3)
+    dry = _tree(db, grower, location=DRY, watered_days_ago=3)
+    
+    # 6mm recent + 6mm forecast over a 4mm daily need is three days of water
+    _run(db, rain={WET: (6.0, 6.0)})
+    
+    # Ten days old, stretched by a quarter per year
+    interval = 4 * (1 + 0.25 * 10 / 365)
+    assert _days_after(NOW - timedelta(days=3), dry.next_watering_due) == round(interval, 3)
+    assert _days_after(dry.next_watering_due, wet.next_watering_due) == 3
+
+def test_rain_delay_is_capped(db, grower, monkeypatch):
+    monkeypatch.setattr(settings, "WATERING_MAX_RAIN_DELAY_DAYS", 5)
+    tree = _tree(db, grower, location=WET, watered_days_ago=30)
+    
+    _run(db, rain={WET: (200.0, 0.0)})
+    
+    # Overdue before the rain, so the delay counts from today
+    assert tree.next_watering_due == NOW + timedelta(days=5)
+
+def test_older_trees_are_watered_less_often(db, grower):
+    young = _tree(db, grower, planted_days_ago=0, watered_days_ago=0)
+    established = _tree(db, grower, planted_days_ago=365, watered_days_ago=0)
+    old = _tree(db, grower, planted_days_ago=5 * 365, watered_days_ago=0)
+    
+    _run(db)
+    
+    assert _days_after(NOW, young.next_watering_due) == 4
+    assert _days_after(NOW, established.next_watering_due) == 5
+    # Stretch stops growing after two years
+    assert _days_after(NOW, old.next_watering_due) == 6
+
+def test_unknown_species_uses_defaults(db, grower):
+    species_catalog.ensure_loaded(db)
+    # Added after the catalog loaded, as if by another process a moment ago
+    db.add(TreeSpecies(id=9, name="Baobab", watering_frequency=20, water_requirements="Low"))
+    db.commit()
+    dry = _tree(db, grower, species_id=9, planted_days_ago=0, watered_days_ago=None)
+    wet = _tree(db, grower, species_id=9, location=WET, planted_days_ago=0, watered_days_ago=None)
+    
+    _run(db, rain={WET: (8.0, 0.0)})
+    
+    assert dry.next_watering_due == NOW + timedelta(days=3)
+    # Default medium need, 8mm is two days
+    assert wet.next_watering_due == NOW + timedelta(days=3 + 2)
+
+def test_trees_without_coordinates_ignore_rain(db, grower):
+    tree = _tree(db, grower, species_id=2, location=None, planted_days_ago=0, watered_days_ago=None)
+    located = _tree(db, grower, species_id=2, location=WET, planted_days_ago=0, watered_days_ago=None)
+    
+    _, source = _run(db, rain={WET: (12.0, 0.0)})
+    
+    assert tree.next_watering_due == NOW + timedelta(days=2)
+    assert located.next_watering_due == NOW + timedelta(days=2 + 2)
+    # Only the located tree's cell was asked for
+    assert len(source.requested) == 1
+
+def test_rerun_is_stable_and_cells_are_fetched_once(db, grower):
+    trees = [_tree(db, grower, location=WET, watered_days_ago=day) for day in range(5)]
+    
+    result, source = _run(db, rain={WET: (4.0, 0.0)}, chunk_size=2)
+    assert result == {"trees": 5, "updated": 5}
+    assert len(source.requested) == 1
+    due = [tree.next_watering_due for tree in trees]
+    
+    result, _ = _run(db, rain={WET: (4.0, 0.0)}, chunk_size=2)
+    assert result == {"trees": 5, "updated": 0}
+    assert [tree.next_watering_due for tree in trees] == due
+
+def test_openweather_forecasts_coarse_cells_throttled_and_retried(monkeypatch):
+    clock = {"now": 0.0}
+    waits = []
+    def sleep(seconds):
+        waits.append(seconds)
+        clock["now"] += seconds
+    monkeypatch.setattr(watering_schedule.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(watering_schedule.time, "sleep", sleep)
+    
+    requested = []
+    def forecast(request):
+        requested.append((float(request.url.params["lat"]), float(request.url.params["lon"])))
+        if len(requested) == 1:
+            return httpx.Response(429, headers={"Retry-After": "5"})
+        rain = 4.0 if requested[-1][0] < -1 else 0.0
+        return httpx.Response(200, json={"list": [
+            {"dt": int((NOW + timedelta(hours=3)).timestamp()), "rain": {"3h": rain}},
+            {"dt": int((NOW + timedelta(days=10)).timestamp()), "rain": {"3h": 50.0}}
+        ]})
+    source = OpenWeatherRainfallSource(client=httpx.Client(transport=httpx.MockTransport(forecast)))
+    
+    # Three weather cells in one forecast cell, one in another
+    amounts = source.rainfall(np.array([[-1.375, 36.875], [-1.125, 36.625], [-1.875, 36.125], [0.125, 37.125]]), NOW)
+    
+    np.testing.assert_array_equal(amounts, [[0, 4], [0, 4], [0, 4], [0, 0]])
+    assert requested == [(-1.5, 36.5), (-1.5, 36.5), (0.5, 37.5)]
+    # The 429's Retry-After (longer than the spacing), then spacing to stay under the per-minute quota
+    interval = 60 / settings.OPENWEATHER_REQUESTS_PER_MINUTE
+    assert waits == [5, pytest.approx(interval)]
+    # A later chunk in the same cells is answered without asking again
+    source.rainfall(np.array([[-1.625, 36.375]]), NOW)
+    assert len(requested) == 3